@@ -0,0 +1,119 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+from app.domain.ports.storage import AsyncStoragePort
+from app.infra.cache.blob_cache import BlobCache, CacheEntry
+
+_Stream = Tuple[AsyncIterator[bytes], int, datetime]
+
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+    if data:
+        yield data
+
+
+async def _aclose(chunks: AsyncIterator[bytes]) -> None:
+    aclose = getattr(chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+class CachedStorage:
+    """Read-through cache in front of any async storage adapter.
+
+    Whole-object reads fill the cache; concurrent misses for one key share a
+    single backend fetch. Ranged reads are served from the cache when the
+    object is already there and go straight to the backend otherwise.
+
+    Ids can be deleted and re-created by other processes, whose deletes
+    don't reach this cache (or its disk tier, which outlives restarts):
+    readers that know the blob's version use ``versioned`` so an old copy
+    is never matched.
+    """
+
+    def __init__(
+        self,
+        inner: AsyncStoragePort,
+        cache: BlobCache,
+        namespace: str,
+        version: Optional[str] = None,
+    ):
+        self.inner = inner
+        self.cache = cache
+        self.namespace = namespace
+        self.version = version
+
+    def versioned(self, version: str) -> "CachedStorage":
+        return CachedStorage(self.inner, self.cache, self.namespace, version)
+
+    def _key(self, blob_id: str) -> str:
+        if self.version is None:
+            return f"{self.namespace}:{blob_id}"
+        return f"{self.namespace}:{blob_id}@{self.version}"
+
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        return await self.inner.save(blob_id, data)
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        return await self.inner.save_stream(blob_id, chunks, size)
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+        chunks, size, created_at = await self.get_stream(blob_id)
+        data = b"".join([chunk async for chunk in chunks])
+        return data, len(data), created_at
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> _Stream:
+        key = self._key(blob_id)
+        if not self.cache.is_oversize(key):
+            entry = await self.cache.get(key)
+            if entry is None and offset == 0 and length is None:
+                entry, opened = await self._fill(blob_id, key)
+                if opened is not None:
+                    return opened
+            if entry is not None:
+                end = len(entry.data) if length is None else offset + length
+                return _once(entry.data[offset:end]), len(entry.data), entry.created_at
+        return await self.inner.get_stream(blob_id, offset, length)
+
+    async def open_file(self, blob_id: str) -> Optional[Tuple[Any, str, int, datetime]]:
+        # A local file is served by the kernel; caching it would only copy it.
+        open_file = getattr(self.inner, "open_file", None)
+        if open_file is None:
+            return None
+        return await open_file(blob_id)
+
+    async def _fill(
+        self, blob_id: str, key: str
+    ) -> Tuple[Optional[CacheEntry], Optional[_Stream]]:
+        # An object too large to cache is handed back still open to the
+        # caller that fetched it; coalesced callers open their own stream.
+        opened: List[_Stream] = []
+
+        async def load() -> Optional[CacheEntry]:
+            epoch = self.cache.epoch
+            chunks, size, created_at = await self.inner.get_stream(blob_id)
+            if size > self.cache.max_item_bytes:
+                self.cache.mark_oversize(key)
+                opened.append((chunks, size, created_at))
+                return None
+            try:
+                data = b"".join([chunk async for chunk in chunks])
+            finally:
+                await _aclose(chunks)
+            return await self.cache.put(key, data, created_at, epoch)
+
+        entry = await self.cache.single_flight(key, load)
+        if opened:
+            return None, opened[0]
+        if entry is None:
+            return None, await self.inner.get_stream(blob_id)
+        return entry, None
+
+    async def delete(self, blob_id: str) -> None:
+        await self.inner.delete(blob_id)
+        await self.cache.invalidate(self._key(blob_id))
@@ -1,41 +1,171 @@
 from __future__ import annotations
-from typing import Tuple
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.infra.repositories.blob_data.models import BlobDataModel
+from app.domain.ports.storage import CHUNK_SIZE
+from app.infra.repositories.blob_data.models import BlobChunkModel, BlobDataModel
 from app.infra.errors import NotFound, Conflict
 
+DEFAULT_CHUNK_SIZE = 256 * 1024
+# Chunk rows are inserted in batches of about this many bytes.
+_INSERT_BATCH_BYTES = 4 * 1024 * 1024
+
 
 def _iso(dt: datetime) -> str:
     return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
+async def _aiter_split(data: bytes, size: int) -> AsyncIterator[bytes]:
+    view = memoryview(data)
+    for i in range(0, len(data), size):
+        yield bytes(view[i : i + size])
+
+
+async def _rechunk(chunks: AsyncIterable[bytes], size: int) -> AsyncIterator[bytes]:
+    buf = bytearray()
+    async for chunk in chunks:
+        buf += chunk
+        if len(buf) >= size:
+            view = memoryview(buf)
+            pos = 0
+            while len(buf) - pos >= size:
+                yield bytes(view[pos : pos + size])
+                pos += size
+            view.release()
+            del buf[:pos]
+    if buf:
+        yield bytes(buf)
+
+
 class DbBlobStorage:
-    def __init__(self, session: Session):
+    """Blobs as fixed-size rows in ``blob_chunks``, so neither writes nor
+    reads ever hold more than a batch of chunks in memory."""
+
+    def __init__(self, session: AsyncSession, chunk_size: int = DEFAULT_CHUNK_SIZE):
         self.session = session
+        self.chunk_size = chunk_size
+
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, str]:
+        return await self.save_stream(blob_id, _aiter_split(data, self.chunk_size))
 
-    def save(self, blob_id: str, data: bytes) -> Tuple[int, str]:
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, str]:
         now = datetime.now(timezone.utc)
         try:
-            with self.session.begin_nested():
-                if self.session.get(BlobDataModel, blob_id) is not None:
-                    raise Conflict(f"Blob '{blob_id}' already exists")
-
-                self.session.add(BlobDataModel(id=blob_id, data=data, created_at=now))
-                self.session.flush()
+            async with self.session.begin_nested():
+                await self.session.execute(
+                    insert(BlobDataModel).values(
+                        id=blob_id, chunk_size=self.chunk_size, created_at=now
+                    )
+                )
         except IntegrityError:
             raise Conflict(f"Blob '{blob_id}' already exists")
 
-        return len(data), _iso(now)
+        per_batch = max(1, _INSERT_BATCH_BYTES // self.chunk_size)
+        rows: List[Dict] = []
+        seq = total = 0
+        async for chunk in _rechunk(chunks, self.chunk_size):
+            rows.append({"blob_id": blob_id, "seq": seq, "data": chunk})
+            seq += 1
+            total += len(chunk)
+            if len(rows) == per_batch:
+                await self.session.execute(insert(BlobChunkModel), rows)
+                rows = []
+        if rows:
+            await self.session.execute(insert(BlobChunkModel), rows)
+
+        await self.session.execute(
+            update(BlobDataModel).where(BlobDataModel.id == blob_id).values(size=total)
+        )
+        return total, _iso(now)
 
-    def get(self, blob_id: str) -> Tuple[bytes, int, str]:
-        row = self.session.get(BlobDataModel, blob_id)
+    async def get(self, blob_id: str) -> Tuple[bytes, int, str]:
+        chunks, size, created_at = await self.get_stream(blob_id)
+        data = b"".join([chunk async for chunk in chunks])
+        return data, size, created_at
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, str]:
+        row = (
+            await self.session.execute(
+                select(
+                    BlobDataModel.size,
+                    BlobDataModel.chunk_size,
+                    func.length(BlobDataModel.data),
+                    BlobDataModel.created_at,
+                ).where(BlobDataModel.id == blob_id)
+            )
+        ).first()
         if row is None:
             raise NotFound(f"Blob '{blob_id}' not found")
-        return row.data, len(row.data), _iso(row.created_at)
+        size, chunk_size, inline_size, created_at = row
+        if chunk_size is None:
+            size = inline_size or 0
+        end = size if length is None else min(size, offset + length)
+        if chunk_size is None:
+            chunks = self._iter_inline(blob_id, offset, end)
+        else:
+            chunks = self._iter_chunks(blob_id, chunk_size, offset, end)
+        return chunks, size, _iso(created_at)
+
+    async def _iter_chunks(
+        self, blob_id: str, chunk_size: int, offset: int, end: int
+    ) -> AsyncIterator[bytes]:
+        # The response body may be streamed after the request session was
+        # closed; in that case the chunk reads open their own transaction.
+        owns_tx = not self.session.in_transaction()
+        try:
+            if offset >= end:
+                return
+            first, last = offset // chunk_size, (end - 1) // chunk_size
+            result = await self.session.stream(
+                select(BlobChunkModel.seq, BlobChunkModel.data)
+                .where(
+                    BlobChunkModel.blob_id == blob_id,
+                    BlobChunkModel.seq.between(first, last),
+                )
+                .order_by(BlobChunkModel.seq)
+                .execution_options(yield_per=4)
+            )
+            try:
+                async for seq, data in result:
+                    base = seq * chunk_size
+                    lo, hi = max(offset - base, 0), min(end - base, len(data))
+                    yield data if (lo, hi) == (0, len(data)) else data[lo:hi]
+            finally:
+                await result.close()
+        finally:
+            if owns_tx:
+                await self.session.close()
+
+    async def _iter_inline(
+        self, blob_id: str, pos: int, end: int
+    ) -> AsyncIterator[bytes]:
+        owns_tx = not self.session.in_transaction()
+        try:
+            while pos < end:
+                n = min(CHUNK_SIZE, end - pos)
+                chunk = (
+                    await self.session.execute(
+                        select(func.substr(BlobDataModel.data, pos + 1, n)).where(
+                            BlobDataModel.id == blob_id
+                        )
+                    )
+                ).scalar_one()
+                if not chunk:
+                    return
+                pos += len(chunk)
+                yield bytes(chunk)
+        finally:
+            if owns_tx:
+                await self.session.close()
 
-    def delete(self, blob_id: str) -> None:
-        row = self.session.get(BlobDataModel, blob_id)
-        if row:
-            self.session.delete(row)
+    async def delete(self, blob_id: str) -> None:
+        await self.session.execute(
+            delete(BlobChunkModel).where(BlobChunkModel.blob_id == blob_id)
+        )
+        await self.session.execute(delete(BlobDataModel).where(BlobDataModel.id == blob_id))
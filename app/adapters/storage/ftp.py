@@ -1,14 +1,62 @@
 from __future__ import annotations
-import hashlib, io, os
-from ftplib import FTP, FTP_TLS, error_perm
-from typing import Tuple
+import hashlib, io, os, threading
+from ftplib import FTP, FTP_TLS, error_perm, error_temp
+from ssl import SSLSocket
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
 from datetime import datetime, timezone
 
+from app.domain.ports.storage import CHUNK_SIZE
 from app.infra.errors import NotFound, Conflict
+from app.infra.ftp.pool import FtpConnectionPool, is_connection_error
+from app.infra.metrics import FTP_POOL
 from app.infra.settings import Settings
+from app.infra.tracing import traced
+
+T = TypeVar("T")
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over an iterator of chunks, as ``storbinary`` expects."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._it = iter(chunks)
+        self._buf = b""
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, n: int = -1) -> bytes:
+        while not self._buf:
+            try:
+                self._buf = next(self._it)
+            except StopIteration:
+                return b""
+        if n < 0 or n >= len(self._buf):
+            out, self._buf = self._buf, b""
+        else:
+            out, self._buf = self._buf[:n], self._buf[n:]
+        self.size += len(out)
+        return out
+
+
+_pools: Dict[tuple, FtpConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+FTP_POOL.labels("open").set_function(lambda: sum(p.size for p in list(_pools.values())))
+FTP_POOL.labels("idle").set_function(lambda: sum(p.idle for p in list(_pools.values())))
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 
 class FtpStorage:
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, pool: Optional[FtpConnectionPool] = None):
         self.host = settings.ftp_host
         self.port = settings.ftp_port
         self.user = settings.ftp_user
@@ -16,7 +64,23 @@ class FtpStorage:
         self.tls = bool(settings.ftp_tls)
         self.base_dir = settings.ftp_base_dir or "/"
         self.timeout = float(settings.ftp_timeout)
+        self.pool = pool or self._shared_pool(settings)
 
+    def _shared_pool(self, settings: Settings) -> FtpConnectionPool:
+        key = (self.host, self.port, self.user, self.tls, self.base_dir)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = FtpConnectionPool(
+                    self._connect,
+                    min_size=settings.ftp_pool_min_size,
+                    max_size=settings.ftp_pool_max_size,
+                    keepalive=settings.ftp_pool_keepalive,
+                    checkout_timeout=self.timeout,
+                )
+            return pool
+
+    @traced("ftp.connect")
     def _connect(self):
         ftp = FTP_TLS(timeout=self.timeout) if self.tls else FTP(timeout=self.timeout)
         ftp.connect(self.host, self.port)
@@ -27,112 +91,189 @@ class FtpStorage:
             ftp.login(self.user, self.password)
 
         ftp.set_pasv(True)
+        ftp.voidcmd("TYPE I")
         if self.base_dir and self.base_dir != "/":
             ftp.cwd(self.base_dir)
         return ftp
 
+    def _call(
+        self, op: Callable[[FTP], T], can_retry: Callable[[], bool] = lambda: True
+    ) -> T:
+        # A pooled session may have been dropped by the server (421, broken
+        # pipe); the pool discards it and the op is retried once.
+        try:
+            with self.pool.connection() as ftp:
+                return op(ftp)
+        except Exception as e:
+            if not is_connection_error(e) or not can_retry():
+                raise
+        with self.pool.connection() as ftp:
+            return op(ftp)
+
     def _final_path(self, blob_id: str) -> str:
         h = hashlib.sha256(blob_id.encode("utf-8")).hexdigest()
         return f"data/{h[:2]}/{h[2:4]}/{h}__{blob_id}"
 
+    @traced("ftp.ensure_dirs")
     def _ensure_dirs(self, ftp: FTP, path: str) -> None:
+        known = self.pool.known_dirs
         parts = path.split("/")[:-1]
         cur = ""
         for p in parts:
             if not p:
                 continue
             cur = f"{cur}/{p}" if cur else p
+            if cur in known:
+                continue
             try:
                 ftp.mkd(cur)
             except error_perm as e:
                 if not str(e).startswith("550"):
                     raise
+            known.add(cur)
+
+    def _forget_dirs(self, path: str) -> None:
+        parts = [p for p in path.split("/")[:-1] if p]
+        for i in range(1, len(parts) + 1):
+            self.pool.known_dirs.discard("/".join(parts[:i]))
+
+    def _modified_at(self, ftp: FTP, key: str) -> datetime:
+        created_at = datetime.now(timezone.utc)
+        try:
+            resp = ftp.sendcmd(f"MDTM {key}")
+            if resp.startswith("213 "):
+                ts = resp.split()[1]
+                created_at = datetime.strptime(ts, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        except Exception:
+            pass
+        return created_at
 
     def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        return self.save_stream(blob_id, (data,))
+
+    def save_stream(
+        self, blob_id: str, chunks: Iterable[bytes]
+    ) -> Tuple[int, datetime]:
         key = self._final_path(blob_id)
-        ftp = self._connect()
-        try:
-            try:
-                ftp.size(key)
-                raise Conflict(f"Blob '{blob_id}' already exists")
-            except error_perm as e:
-                if not str(e).startswith("550"):
-                    raise
+        reader = _ChunkReader(chunks)
 
+        def _store(ftp: FTP) -> None:
             self._ensure_dirs(ftp, key)
 
             rnd = hashlib.md5(os.urandom(16)).hexdigest()
             tmp = f"{key}.tmp-{rnd}"
 
-            buf = io.BytesIO(data)
-            ftp.storbinary(f"STOR {tmp}", buf)
-
             try:
-                ftp.rename(tmp, key)
-            except Exception:
                 try:
-                    ftp.delete(tmp)
-                except Exception:
-                    pass
+                    ftp.storbinary(f"STOR {tmp}", reader, blocksize=CHUNK_SIZE)
+                except error_perm:
+                    if reader.size:
+                        raise
+                    # A cached shard directory was removed behind our back.
+                    self._forget_dirs(key)
+                    self._ensure_dirs(ftp, key)
+                    ftp.storbinary(f"STOR {tmp}", reader, blocksize=CHUNK_SIZE)
+                # RNTO replaces existing files on most servers, so probe right
+                # before the rename rather than ahead of the whole upload.
+                if self._exists(ftp, key):
+                    raise Conflict(f"Blob '{blob_id}' already exists")
+                ftp.rename(tmp, key)
+            except Exception as e:
+                if not is_connection_error(e):
+                    try:
+                        ftp.delete(tmp)
+                    except Exception:
+                        pass
                 raise
 
-            return len(data), datetime.now(timezone.utc)
-        finally:
-            try:
-                ftp.quit()
-            except Exception:
-                try:
-                    ftp.close()
-                except Exception:
-                    pass
+        self._call(_store, can_retry=lambda: reader.size == 0)
+        return reader.size, datetime.now(timezone.utc)
 
     def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
         key = self._final_path(blob_id)
-        ftp = self._connect()
-        try:
-            try:
-                size = ftp.size(key)
-            except error_perm as e:
-                if str(e).startswith("550"):
-                    raise NotFound(f"Blob '{blob_id}' not found")
-                raise
 
-            created_at = datetime.now(timezone.utc)
-            try:
-                resp = ftp.sendcmd(f"MDTM {key}")
-                if resp.startswith("213 "):
-                    ts = resp.split()[1]
-                    created_at = datetime.strptime(ts, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
-            except Exception:
-                pass
+        def _retrieve(ftp: FTP) -> Tuple[bytes, int, datetime]:
+            size = self._size(ftp, blob_id, key)
+            created_at = self._modified_at(ftp, key)
 
             buf = io.BytesIO()
             ftp.retrbinary(f"RETR {key}", buf.write)
             data = buf.getvalue()
             return data, (size if isinstance(size, int) else len(data)), created_at
-        finally:
-            try:
-                ftp.quit()
-            except Exception:
+
+        return self._call(_retrieve)
+
+    def _exists(self, ftp: FTP, key: str) -> bool:
+        try:
+            ftp.size(key)
+            return True
+        except error_perm as e:
+            if not str(e).startswith("550"):
+                raise
+            return False
+
+    def _size(self, ftp: FTP, blob_id: str, key: str) -> Optional[int]:
+        try:
+            return ftp.size(key)
+        except error_perm as e:
+            if str(e).startswith("550"):
+                raise NotFound(f"Blob '{blob_id}' not found")
+            raise
+
+    def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int, datetime]:
+        key = self._final_path(blob_id)
+
+        def _stat(ftp: FTP) -> Tuple[Optional[int], datetime]:
+            return self._size(ftp, blob_id, key), self._modified_at(ftp, key)
+
+        size, created_at = self._call(_stat)
+        return self._iter_retr(key, offset, length), (size or 0), created_at
+
+    def _iter_retr(
+        self, key: str, offset: int, remaining: Optional[int]
+    ) -> Iterator[bytes]:
+        ftp = self.pool.acquire()
+        clean = False
+        try:
+            with ftp.transfercmd(f"RETR {key}", rest=offset or None) as conn:
+                eof = False
+                while remaining is None or remaining > 0:
+                    n = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                    chunk = conn.recv(n)
+                    if not chunk:
+                        eof = True
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+                if eof and isinstance(conn, SSLSocket):
+                    conn.unwrap()
+            if eof:
+                ftp.voidresp()
+            else:
+                # Got the requested span and dropped the data connection; the
+                # server answers the RETR with 426/451 (some still say 226).
                 try:
-                    ftp.close()
-                except Exception:
+                    ftp.voidresp()
+                except (error_temp, error_perm):
                     pass
+            clean = True
+        finally:
+            if clean:
+                self.pool.release(ftp)
+            else:
+                self.pool.discard(ftp)
 
     def delete(self, blob_id: str) -> None:
         key = self._final_path(blob_id)
-        ftp = self._connect()
-        try:
+
+        def _delete(ftp: FTP) -> None:
             try:
                 ftp.delete(key)
             except error_perm as e:
                 if not str(e).startswith("550"):
                     raise
-        finally:
-            try:
-                ftp.quit()
-            except Exception:
-                try:
-                    ftp.close()
-                except Exception:
-                    pass
+
+        self._call(_delete)
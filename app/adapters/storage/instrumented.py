@@ -0,0 +1,82 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Tuple
+
+from app.domain.ports.storage import AsyncStoragePort
+from app.infra.metrics import STORAGE_BYTES, STORAGE_SECONDS
+from app.infra.tracing import timed
+
+
+class InstrumentedStorage:
+    """Records call latency and bytes moved for the adapter it wraps, and
+    traces each call as a ``storage.<operation>`` span.
+
+    Streamed reads are timed until the stream is open; their bytes are
+    counted as they are consumed.
+    """
+
+    def __init__(self, inner: AsyncStoragePort, backend: str):
+        self.inner = inner
+        self.backend = backend
+        self._written = STORAGE_BYTES.labels(backend, "written")
+        self._read = STORAGE_BYTES.labels(backend, "read")
+
+    def _timer(self, operation: str):
+        return timed(
+            STORAGE_SECONDS.labels(self.backend, operation),
+            f"storage.{operation}",
+            **{"storage.backend": self.backend},
+        )
+
+    async def _count(self, chunks: AsyncIterable[bytes], counter) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            counter.inc(len(chunk))
+            yield chunk
+
+    async def _count_read(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in chunks:
+                self._read.inc(len(chunk))
+                yield chunk
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        with self._timer("save"):
+            result = await self.inner.save(blob_id, data)
+        self._written.inc(len(data))
+        return result
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        with self._timer("save_stream"):
+            return await self.inner.save_stream(
+                blob_id, self._count(chunks, self._written), size
+            )
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+        with self._timer("get"):
+            data, size, created_at = await self.inner.get(blob_id)
+        self._read.inc(len(data))
+        return data, size, created_at
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, datetime]:
+        with self._timer("get_stream"):
+            chunks, size, created_at = await self.inner.get_stream(blob_id, offset, length)
+        return self._count_read(chunks), size, created_at
+
+    async def open_file(self, blob_id: str) -> Optional[Tuple[Any, str, int, datetime]]:
+        open_file = getattr(self.inner, "open_file", None)
+        if open_file is None:
+            return None
+        with self._timer("open_file"):
+            return await open_file(blob_id)
+
+    async def delete(self, blob_id: str) -> None:
+        with self._timer("delete"):
+            await self.inner.delete(blob_id)
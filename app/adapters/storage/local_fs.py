@@ -1,44 +1,133 @@
 from __future__ import annotations
-import os, uuid
+import hashlib, os, uuid
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
 from datetime import datetime, timezone
+from app.domain.ports.storage import CHUNK_SIZE
 from app.infra.errors import Conflict, NotFound
+from app.infra.fs.group_commit import (
+    GroupCommitter,
+    ensure_dir,
+    forget_dir,
+    fsync_dir,
+    publish,
+)
+
+
+def _iter_file(f: BinaryIO, remaining: Optional[int] = None) -> Iterator[bytes]:
+    try:
+        while remaining is None or remaining > 0:
+            n = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = f.read(n)
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def shard_path(root: Path, blob_id: str) -> Path:
+    h = hashlib.sha256(blob_id.encode("utf-8")).hexdigest()
+    return root / "data" / h[:2] / h[2:4] / h
 
 
 class LocalFsStorage:
-    def __init__(self, root: str):
+    def __init__(self, root: str, committer: Optional[GroupCommitter] = None):
         self.root = Path(root)
+        self.committer = committer
 
     def _final_path(self, blob_id: str) -> Path:
-        p = self.root / blob_id
-        p.parent.mkdir(parents=True, exist_ok=True)
-        return p
+        return shard_path(self.root, blob_id)
+
+    def _legacy_path(self, blob_id: str) -> Path:
+        # Flat layout used before sharding; read until the tree is migrated.
+        return self.root / blob_id
+
+    def _open(self, blob_id: str) -> BinaryIO:
+        try:
+            return open(self._final_path(blob_id), "rb")
+        except (FileNotFoundError, NotADirectoryError):
+            # NotADirectoryError: an unmigrated blob called "data".
+            pass
+        try:
+            legacy = self._legacy_path(blob_id)
+            if legacy.is_file():
+                return open(legacy, "rb")
+        except (FileNotFoundError, OSError):
+            pass
+        raise NotFound(f"Blob '{blob_id}' not found")
 
     def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        return self.save_stream(blob_id, (data,))
+
+    def save_stream(
+        self, blob_id: str, chunks: Iterable[bytes]
+    ) -> Tuple[int, datetime]:
         final_path = self._final_path(blob_id)
-        if final_path.exists():
+        if self._legacy_path(blob_id).is_file():
             raise Conflict(f"Blob '{blob_id}' already exists")
 
-        tmp_path = final_path.with_suffix(final_path.suffix + f".tmp.{uuid.uuid4().hex}")
-        with open(tmp_path, "wb") as f:
-            f.write(data)
-            f.flush()
-            os.fsync(f.fileno())
-        os.replace(tmp_path, final_path)
+        tmp_path = final_path.with_name(f"{final_path.name}.tmp.{uuid.uuid4().hex}")
+        size = 0
+        try:
+            ensure_dir(final_path.parent)
+            try:
+                f = open(tmp_path, "wb")
+            except FileNotFoundError:
+                # The shard directory was removed behind our back.
+                forget_dir(final_path.parent)
+                ensure_dir(final_path.parent)
+                f = open(tmp_path, "wb")
+            with f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                if self.committer is not None:
+                    self.committer.commit(f.fileno(), tmp_path, final_path)
+                else:
+                    os.fsync(f.fileno())
+                    publish(tmp_path, final_path)
+                    fsync_dir(final_path.parent)
+        except FileExistsError:
+            tmp_path.unlink(missing_ok=True)
+            raise Conflict(f"Blob '{blob_id}' already exists") from None
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
         created_at = datetime.now(timezone.utc)
-        return len(data), created_at
+        return size, created_at
 
     def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
-        p = self._final_path(blob_id)
-        if not p.exists():
-            raise NotFound(f"Blob '{blob_id}' not found")
-        b = p.read_bytes()
-        st = p.stat()
+        with self._open(blob_id) as f:
+            b = f.read()
+            st = os.fstat(f.fileno())
         created_at = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
         return b, len(b), created_at
 
+    def open_file(self, blob_id: str) -> Tuple[BinaryIO, str, int, datetime]:
+        """Open the blob for the server to send straight from the file."""
+        f = self._open(blob_id)
+        st = os.fstat(f.fileno())
+        created_at = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        return f, f.name, st.st_size, created_at
+
+    def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int, datetime]:
+        f = self._open(blob_id)
+        st = os.fstat(f.fileno())
+        created_at = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        if offset:
+            f.seek(offset)
+        return _iter_file(f, length), st.st_size, created_at
+
     def delete(self, blob_id: str) -> None:
-        p = self._final_path(blob_id)
-        if p.exists():
-            p.unlink()
+        for p in (self._final_path(blob_id), self._legacy_path(blob_id)):
+            try:
+                p.unlink()
+                return
+            except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                continue
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from app.domain.ports.storage import CHUNK_SIZE, AsyncStoragePort
+from app.infra.errors import Conflict, NotFound
+from app.infra.metrics import MIRROR_HEDGES, MIRROR_REPAIRS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latency samples kept per replica and read operation.
+_WINDOW = 256
+# Added to the latency of a failed read so the replica drops down the ranking.
+_ERROR_PENALTY = 1.0
+
+
+class _Latency:
+    def __init__(self):
+        self._samples: Deque[float] = deque(maxlen=_WINDOW)
+        self._sorted: Optional[List[float]] = None
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+
+class _Tee:
+    """Spools one incoming stream to a temp file that every replica reads at
+    its own pace, so a slow replica holds back neither the client nor the
+    others."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._fd = self._file.fileno()
+        self.size = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._grown = asyncio.Event()
+
+    def _notify(self) -> None:
+        grown, self._grown = self._grown, asyncio.Event()
+        grown.set()
+
+    async def fill(self, chunks: AsyncIterable[bytes]) -> None:
+        try:
+            async for chunk in chunks:
+                os.write(self._fd, chunk)
+                self.size += len(chunk)
+                self._notify()
+        except BaseException as exc:
+            self.error = exc
+            raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def read(self) -> AsyncIterator[bytes]:
+        pos = 0
+        while True:
+            if pos < self.size:
+                chunk = os.pread(self._fd, min(CHUNK_SIZE, self.size - pos), pos)
+                pos += len(chunk)
+                yield chunk
+            elif self.error is not None:
+                raise ConnectionError("Upload stream ended early") from self.error
+            elif self.done:
+                return
+            else:
+                await self._grown.wait()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+async def _aclose(chunks: AsyncIterator[bytes]) -> None:
+    aclose = getattr(chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+class MirroredStorage:
+    """Stores every blob on all replicas.
+
+    Writes go to the replicas in parallel and return once ``quorum`` of them
+    succeeded; the rest finish in the background, and replicas that failed
+    are repaired by copying from one that has the blob. Reads go to the
+    replica with the lowest median latency and are hedged to the next one
+    when the first has not answered within its p95 (clamped to
+    ``hedge_min_delay``..``hedge_max_delay``). A replica found missing a blob
+    during a read is repaired as well. Deletes that fail on a replica are
+    retried the same way, in the background.
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[AsyncStoragePort],
+        names: Sequence[str],
+        quorum: int = 0,
+        hedge_min_delay: float = 0.01,
+        hedge_max_delay: float = 1.0,
+        repair_retries: int = 5,
+        repair_concurrency: int = 4,
+        repair_backoff: float = 1.0,
+    ):
+        if len(replicas) < 2:
+            raise ValueError("Mirroring needs at least two replicas")
+        self.replicas = list(replicas)
+        self.names = list(names)
+        n = len(self.replicas)
+        self.quorum = min(quorum, n) if quorum > 0 else n // 2 + 1
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.repair_retries = repair_retries
+        self.repair_backoff = repair_backoff
+        self._latency: Dict[Tuple[str, int], _Latency] = {}
+        self._repair_slots = asyncio.Semaphore(max(repair_concurrency, 1))
+        self._writes: Set[asyncio.Task] = set()
+        self._repairs: Set[asyncio.Task] = set()
+        self._repairing: Set[Tuple[str, int, str]] = set()
+
+    # -- latency bookkeeping -------------------------------------------------
+
+    def _stats(self, op: str, i: int) -> _Latency:
+        stats = self._latency.get((op, i))
+        if stats is None:
+            stats = self._latency[(op, i)] = _Latency()
+        return stats
+
+    def ranked(self, op: str) -> List[int]:
+        """Replica indexes, fastest first; unmeasured replicas are tried first."""
+        return sorted(
+            range(len(self.replicas)),
+            key=lambda i: self._stats(op, i).quantile(0.5) or 0.0,
+        )
+
+    def _deadline(self, op: str, i: int) -> float:
+        p95 = self._stats(op, i).quantile(0.95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _timed(self, op: str, i: int, call: Callable[[Any], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await call(self.replicas[i])
+        except NotFound:
+            raise
+        except asyncio.CancelledError:
+            # Lost the race: it took at least this long.
+            self._stats(op, i).observe(time.perf_counter() - started)
+            raise
+        except Exception:
+            self._stats(op, i).observe(time.perf_counter() - started + _ERROR_PENALTY)
+            raise
+        self._stats(op, i).observe(time.perf_counter() - started)
+        return result
+
+    # -- background work -----------------------------------------------------
+
+    def _spawn(self, tasks: Set[asyncio.Task], coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def _repair_later(self, blob_id: str, target: int, op: str = "copy") -> None:
+        """Queue ``op`` ("copy" or "delete") of ``blob_id`` on one replica."""
+        if (blob_id, target, op) in self._repairing:
+            return
+        self._repairing.add((blob_id, target, op))
+        self._spawn(self._repairs, self._repair(blob_id, target, op))
+
+    async def _repair(self, blob_id: str, target: int, op: str) -> None:
+        name = self.names[target]
+        fix = self._copy if op == "copy" else self._remove
+        try:
+            for attempt in range(self.repair_retries):
+                try:
+                    async with self._repair_slots:
+                        await fix(blob_id, target)
+                    MIRROR_REPAIRS.labels(name, "ok").inc()
+                    return
+                except NotFound:
+                    # No replica has it any more: deleted meanwhile.
+                    return
+                except Exception:
+                    logger.warning(
+                        "Repairing blob '%s' on %s failed", blob_id, name, exc_info=True
+                    )
+                await asyncio.sleep(self.repair_backoff * 2**attempt)
+            MIRROR_REPAIRS.labels(name, "failed").inc()
+            logger.error("Giving up repairing blob '%s' on %s", blob_id, name)
+        finally:
+            self._repairing.discard((blob_id, target, op))
+
+    async def _copy(self, blob_id: str, target: int) -> None:
+        sources = [i for i in self.ranked("get_stream") if i != target]
+        chunks, size, _created_at = await self._first(
+            "get_stream", lambda r: r.get_stream(blob_id), sources, _discard_stream
+        )
+        replica = self.replicas[target]
+        try:
+            await replica.save_stream(blob_id, chunks, size)
+        except Conflict:
+            # A leftover of an earlier failed write; the others are authoritative.
+            await replica.delete(blob_id)
+            chunks, size, _created_at = await self._first(
+                "get_stream", lambda r: r.get_stream(blob_id), sources, _discard_stream
+            )
+            await replica.save_stream(blob_id, chunks, size)
+
+    async def _remove(self, blob_id: str, target: int) -> None:
+        try:
+            await self.replicas[target].delete(blob_id)
+        except NotFound:
+            pass
+
+    async def settle(self) -> None:
+        """Wait for background writes and repairs to finish."""
+        while self._writes or self._repairs:
+            await asyncio.gather(*self._writes, *self._repairs, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        """Finish the writes in flight; pending repairs are dropped."""
+        while self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        for task in list(self._repairs):
+            task.cancel()
+        await asyncio.gather(*self._repairs, return_exceptions=True)
+
+    # -- writes --------------------------------------------------------------
+
+    async def _quorum(
+        self,
+        blob_id: str,
+        calls: Sequence[Awaitable[Tuple[int, datetime]]],
+        release: Callable[[], None] = lambda: None,
+    ) -> Tuple[int, datetime]:
+        tasks = [asyncio.ensure_future(c) for c in calls]
+        n = len(tasks)
+        pending = set(tasks)
+        ok: List[asyncio.Task] = []
+        failed: List[asyncio.Task] = []
+        try:
+            while pending and len(ok) < self.quorum and len(failed) <= n - self.quorum:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    (failed if task.exception() is not None else ok).append(task)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self._spawn(self._writes, self._undo(blob_id, tasks))
+            release()
+            raise
+
+        if len(ok) >= self.quorum:
+            self._spawn(self._writes, self._settle_write(blob_id, tasks, release))
+            return ok[0].result()
+
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        release()
+        self._spawn(self._writes, self._undo(blob_id, tasks))
+        errors = [t.exception() for t in failed]
+        conflict = next((e for e in errors if isinstance(e, Conflict)), None)
+        raise conflict or errors[0]
+
+    async def _settle_write(
+        self, blob_id: str, tasks: List[asyncio.Task], release: Callable[[], None]
+    ) -> None:
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            release()
+        for i, task in enumerate(tasks):
+            exc = task.exception()
+            if exc is not None:
+                logger.warning(
+                    "Writing blob '%s' to %s failed", blob_id, self.names[i], exc_info=exc
+                )
+                self._repair_later(blob_id, i)
+
+    async def _undo(self, blob_id: str, tasks: List[asyncio.Task]) -> None:
+        # Without a quorum the write failed: drop what did get stored.
+        for i, task in enumerate(tasks):
+            if task.cancelled() or task.exception() is not None:
+                continue
+            try:
+                await self.replicas[i].delete(blob_id)
+            except Exception:
+                logger.warning(
+                    "Removing blob '%s' from %s failed", blob_id, self.names[i],
+                    exc_info=True,
+                )
+
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        return await self._quorum(blob_id, [r.save(blob_id, data) for r in self.replicas])
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        tee = _Tee()
+        writes = [
+            asyncio.ensure_future(r.save_stream(blob_id, tee.read(), size))
+            for r in self.replicas
+        ]
+        try:
+            await tee.fill(chunks)
+        except BaseException:
+            # The replicas see the stream break and give up.
+            await asyncio.gather(*writes, return_exceptions=True)
+            tee.close()
+            self._spawn(self._writes, self._undo(blob_id, writes))
+            raise
+        return await self._quorum(blob_id, writes, tee.close)
+
+    # -- reads ---------------------------------------------------------------
+
+    async def _first(
+        self,
+        op: str,
+        call: Callable[[Any], Awaitable[T]],
+        order: List[int],
+        discard: Callable[[T], Awaitable[None]],
+        blob_id: Optional[str] = None,
+    ) -> T:
+        """Ask replicas in ``order``, hedging to the next one when the current
+        is past its deadline; returns the first answer. Replicas that turn
+        out to miss ``blob_id`` are repaired."""
+        candidates = iter(order)
+        running: Dict[asyncio.Future, int] = {}
+        missing: List[int] = []
+        errors: List[BaseException] = []
+
+        def start() -> bool:
+            i = next(candidates, None)
+            if i is None:
+                return False
+            running[asyncio.ensure_future(self._timed(op, i, call))] = i
+            return True
+
+        start()
+        hedged = False
+        try:
+            while running:
+                timeout = None
+                slow = next(iter(running.values()))
+                if not hedged and len(running) == 1:
+                    timeout = self._deadline(op, slow)
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    if start():
+                        MIRROR_HEDGES.labels(self.names[slow]).inc()
+                    continue
+                for task in done:
+                    i = running.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        if blob_id is not None:
+                            for j in missing:
+                                self._repair_later(blob_id, j)
+                        return task.result()
+                    if isinstance(exc, NotFound):
+                        missing.append(i)
+                    else:
+                        errors.append(exc)
+                    if not running:
+                        start()
+            if errors:
+                raise errors[0]
+            raise NotFound("Blob not found on any replica")
+        finally:
+            for task in running:
+                task.cancel()
+            for task in running:
+                try:
+                    result = await task
+                except BaseException:
+                    continue
+                await discard(result)
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+        return await self._first(
+            "get",
+            lambda r: r.get(blob_id),
+            self.ranked("get"),
+            _discard_nothing,
+            blob_id,
+        )
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, datetime]:
+        return await self._first(
+            "get_stream",
+            lambda r: r.get_stream(blob_id, offset, length),
+            self.ranked("get_stream"),
+            _discard_stream,
+            blob_id,
+        )
+
+    async def open_file(self, blob_id: str) -> Optional[Tuple[Any, str, int, datetime]]:
+        for replica in self.replicas:
+            open_file = getattr(replica, "open_file", None)
+            if open_file is None:
+                continue
+            try:
+                opened = await open_file(blob_id)
+            except NotFound:
+                # Not repaired yet; the hedged read path finds another replica.
+                return None
+            if opened is not None:
+                return opened
+        return None
+
+    async def delete(self, blob_id: str) -> None:
+        results = await asyncio.gather(
+            *(r.delete(blob_id) for r in self.replicas), return_exceptions=True
+        )
+        if all(isinstance(e, NotFound) for e in results):
+            raise results[0]
+        # The caller has already forgotten the blob: replicas that still hold
+        # it are cleaned up in the background rather than failing the delete.
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException) and not isinstance(result, NotFound):
+                logger.warning(
+                    "Deleting blob '%s' on %s failed", blob_id, self.names[i],
+                    exc_info=result,
+                )
+                self._repair_later(blob_id, i, "delete")
+
+
+async def _discard_nothing(_result: Any) -> None:
+    return None
+
+
+async def _discard_stream(result: Tuple[AsyncIterator[bytes], int, datetime]) -> None:
+    await _aclose(result[0])
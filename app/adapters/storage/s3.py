@@ -1,20 +1,161 @@
 from __future__ import annotations
+import asyncio
 import hashlib
+import tempfile
+import weakref
+import xml.etree.ElementTree as ET
+from collections import deque
 from datetime import datetime, timezone
-from typing import Tuple
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from urllib.parse import quote
 from email.utils import parsedate_to_datetime
 
 import httpx
-from app.infra.http.s3_sign import sign_v4, sha256_hex
+from app.domain.ports.storage import CHUNK_SIZE
+from app.infra.http.s3_sign import ChunkSigner, sign_v4, sign_v4_streaming, sha256_hex
 from app.infra.settings import Settings
 from app.infra.errors import NotFound, Conflict
+from app.infra.metrics import S3_POOL
+
+# Streamed uploads of unknown length are spooled (to disk past this size) so
+# the PUT can carry the content length and payload hash that S3 requires.
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# Chunk size of aws-chunked bodies; S3 requires at least 8 KiB per chunk.
+_SIGNED_CHUNK_SIZE = 256 * 1024
+_MIN_PART_SIZE = 5 * 1024 * 1024
+_RETRY_BACKOFF = 0.2
+
+_clients: "weakref.WeakSet[httpx.AsyncClient]" = weakref.WeakSet()
+
+
+def _connections(idle: bool) -> int:
+    # httpx doesn't expose its pool; the transport's httpcore pool does.
+    n = 0
+    for client in list(_clients):
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        for conn in getattr(pool, "connections", ()):
+            n += conn.is_idle() == idle
+    return n
+
+
+S3_POOL.labels("active").set_function(lambda: _connections(idle=False))
+S3_POOL.labels("idle").set_function(lambda: _connections(idle=True))
 
 
 def _encode_key(k: str) -> str:
     return quote(k, safe="/-_.~")
 
 
+async def _iter_file(f: BinaryIO) -> AsyncIterator[bytes]:
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _iter_response(r: httpx.Response) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in r.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+    finally:
+        await r.aclose()
+
+
+async def _chain(*streams: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    for stream in streams:
+        async for chunk in stream:
+            yield chunk
+
+
+async def _rechunk(chunks: AsyncIterable[bytes], size: int) -> AsyncIterator[bytes]:
+    buf = bytearray()
+    async for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
+
+
+def _split(data: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def _aiter(parts: Iterator[bytes]) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+async def _signed_chunks(
+    chunks: AsyncIterable[bytes], signer: ChunkSigner, size: int
+) -> AsyncIterator[bytes]:
+    sent = 0
+    async for chunk in _rechunk(chunks, _SIGNED_CHUNK_SIZE):
+        sent += len(chunk)
+        if sent > size:
+            break
+        yield await asyncio.to_thread(signer.frame, chunk)
+    if sent != size:
+        raise ValueError(f"Upload length {sent} does not match expected {size}")
+    yield signer.frame(b"")
+
+
+def _xml_text(body: bytes, tag: str) -> Optional[str]:
+    for el in ET.fromstring(body).iter():
+        if el.tag == tag or el.tag.endswith("}" + tag):
+            return el.text
+    return None
+
+
+def _last_modified(r: httpx.Response) -> datetime:
+    lm_hdr = r.headers.get("Last-Modified")
+    if not lm_hdr:
+        return datetime.now(timezone.utc)
+    try:
+        created_at = parsedate_to_datetime(lm_hdr)
+    except Exception:
+        return datetime.now(timezone.utc)
+    if created_at.tzinfo is None:
+        return created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(timezone.utc)
+
+
+def _check_create(r: httpx.Response, key: str) -> None:
+    # 412: the key exists; 409: a concurrent conditional write won the race.
+    if r.status_code in (409, 412):
+        raise Conflict(f"Object '{key}' already exists")
+
+
+def _make_client(settings: Settings) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.s3_max_connections,
+        max_keepalive_connections=settings.s3_max_keepalive_connections,
+        keepalive_expiry=settings.s3_keepalive_expiry,
+    )
+    try:
+        return httpx.AsyncClient(
+            timeout=settings.s3_timeout, limits=limits, http2=settings.s3_http2
+        )
+    except ImportError:
+        raise RuntimeError(
+            "S3_HTTP2 needs the 'h2' package (pip install 'httpx[http2]')"
+        ) from None
+
+
 class S3HttpStorage:
     def __init__(self, settings: Settings):
         if not settings.s3_endpoint or not settings.s3_bucket:
@@ -28,7 +169,17 @@ class S3HttpStorage:
         self.st = settings.s3_session_token or ""
         self.path_style = bool(settings.s3_force_path_style)
 
-        self.client = httpx.Client(timeout=10.0)
+        self.multipart_threshold = settings.s3_multipart_threshold
+        self.part_size = max(settings.s3_part_size, _MIN_PART_SIZE)
+        self.max_concurrency = max(settings.s3_max_concurrency, 1)
+        self.max_retries = settings.s3_max_retries
+        self.conditional_writes = settings.s3_conditional_writes
+
+        self.client = _make_client(settings)
+        _clients.add(self.client)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
 
     def _bucket_base(self) -> str:
         if self.path_style:
@@ -42,64 +193,326 @@ class S3HttpStorage:
         h = hashlib.sha256(blob_id.encode("utf-8")).hexdigest()
         return f"data/{h[:2]}/{h[2:4]}/{h}__{blob_id}"
 
-    def _exists(self, key: str) -> bool:
+    def _url(self, key: str, query: str = "") -> str:
+        url = f"{self._bucket_base()}/{_encode_key(key)}"
+        return f"{url}?{query}" if query else url
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        content: Optional[bytes] = None,
+    ) -> httpx.Response:
+        """Signed request with a replayable body, retried on 5xx/408/429 and
+        transport errors with exponential backoff."""
+        payload_hash = "UNSIGNED-PAYLOAD"
+        if content is not None:
+            payload_hash = await asyncio.to_thread(sha256_hex, content)
+        signed = sign_v4(
+            method, url, self.region, self.ak, self.sk, self.st, headers, payload_hash
+        )
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                r = await self.client.request(method, url, content=content, headers=signed)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if last or (r.status_code < 500 and r.status_code not in (408, 429)):
+                    return r
+            await asyncio.sleep(_RETRY_BACKOFF * 2**attempt)
+        raise AssertionError("unreachable")
+
+    def _create_headers(self) -> Dict[str, str]:
+        # The object store rejects the write if the key already exists, so
+        # creation needs no separate existence check.
+        return {"if-none-match": "*"} if self.conditional_writes else {}
+
+    async def _exists(self, key: str) -> bool:
         url = f"{self._bucket_base()}/{_encode_key(key)}"
         signed = sign_v4("HEAD", url, self.region, self.ak, self.sk, self.st)
-        r = self.client.request("HEAD", url, headers=signed)
+        r = await self.client.request("HEAD", url, headers=signed)
         if r.status_code == 404:
             return False
         if r.status_code >= 300:
             raise RuntimeError(f"S3 HEAD failed {r.status_code}: {r.text}")
         return True
 
-    def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
-        key = self._final_key(blob_id)
-        if self._exists(key):
-            raise Conflict(f"Blob '{blob_id}' already exists")
-
+    async def _put(
+        self,
+        key: str,
+        body: Union[bytes, AsyncIterator[bytes]],
+        size: int,
+        payload_hash: str,
+    ) -> None:
         url = f"{self._bucket_base()}/{_encode_key(key)}"
-        payload_hash = sha256_hex(data)
         headers = {
             "content-type": "application/octet-stream",
-            "content-length": str(len(data)),
+            "content-length": str(size),
+            **self._create_headers(),
         }
         signed = sign_v4("PUT", url, self.region, self.ak, self.sk, self.st, headers, payload_hash)
-        r = self.client.put(url, content=data, headers=signed)
+        r = await self.client.put(url, content=body, headers=signed)
+        _check_create(r, key)
         if r.status_code >= 300:
             raise RuntimeError(f"S3 PUT failed {r.status_code}: {r.text}")
 
-        return len(data), datetime.now(timezone.utc)
+    async def _put_chunked(
+        self, key: str, chunks: AsyncIterable[bytes], size: int
+    ) -> None:
+        """PUT with a streaming (aws-chunked) signature: each chunk is hashed
+        and signed as it is sent, so the body is never buffered or pre-hashed."""
+        url = f"{self._bucket_base()}/{_encode_key(key)}"
+        signed, signer = sign_v4_streaming(
+            "PUT",
+            url,
+            self.region,
+            self.ak,
+            self.sk,
+            size,
+            _SIGNED_CHUNK_SIZE,
+            self.st,
+            {"content-type": "application/octet-stream", **self._create_headers()},
+        )
+        r = await self.client.put(
+            url, content=_signed_chunks(chunks, signer, size), headers=signed
+        )
+        _check_create(r, key)
+        if r.status_code >= 300:
+            raise RuntimeError(f"S3 PUT failed {r.status_code}: {r.text}")
 
-    def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
         key = self._final_key(blob_id)
-        url = f"{self._bucket_base()}/{_encode_key(key)}"
-        signed = sign_v4("GET", url, self.region, self.ak, self.sk, self.st)
-        r = self.client.get(url, headers=signed)
+        if not self.conditional_writes and await self._exists(key):
+            raise Conflict(f"Blob '{blob_id}' already exists")
+        try:
+            return await self._create(key, data)
+        except Conflict:
+            raise Conflict(f"Blob '{blob_id}' already exists") from None
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        key = self._final_key(blob_id)
+        if not self.conditional_writes and await self._exists(key):
+            raise Conflict(f"Blob '{blob_id}' already exists")
+        try:
+            return await self._create_stream(key, chunks, size)
+        except Conflict:
+            raise Conflict(f"Blob '{blob_id}' already exists") from None
+
+    async def _create(self, key: str, data: bytes) -> Tuple[int, datetime]:
+        if len(data) > self.multipart_threshold:
+            await self._multipart_upload(key, _aiter(_split(data, self.part_size)))
+        else:
+            await self._put_chunked(
+                key, _aiter(_split(data, _SIGNED_CHUNK_SIZE)), len(data)
+            )
+        return len(data), datetime.now(timezone.utc)
+
+    async def _create_stream(
+        self, key: str, chunks: AsyncIterable[bytes], size: Optional[int]
+    ) -> Tuple[int, datetime]:
+        if size is not None and size <= self.multipart_threshold:
+            await self._put_chunked(key, chunks, size)
+            return size, datetime.now(timezone.utc)
+
+        it = chunks.__aiter__()
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE) as spool:
+            h = hashlib.sha256()
+            size = 0
+            async for chunk in it:
+                spool.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+                if size > self.multipart_threshold:
+                    break
+            else:
+                spool.seek(0)
+                await self._put(key, _iter_file(spool), size, h.hexdigest())
+                return size, datetime.now(timezone.utc)
+
+            # Past the threshold: replay the spooled head, then keep
+            # consuming the stream part by part.
+            spool.seek(0)
+            parts = _rechunk(_chain(_iter_file(spool), it), self.part_size)
+            size = await self._multipart_upload(key, parts)
+
+        return size, datetime.now(timezone.utc)
+
+    async def _multipart_upload(self, key: str, parts: AsyncIterator[bytes]) -> int:
+        r = await self._request("POST", self._url(key, "uploads="))
+        if r.status_code >= 300:
+            raise RuntimeError(f"S3 CreateMultipartUpload failed {r.status_code}: {r.text}")
+        upload_id = _xml_text(r.content, "UploadId")
+        if not upload_id:
+            raise RuntimeError("S3 CreateMultipartUpload returned no UploadId")
+
+        # The semaphore bounds both in-flight requests and buffered parts.
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks: List[asyncio.Task] = []
+        size = 0
+        try:
+            number = 0
+            async for part in parts:
+                await slots.acquire()
+                for t in tasks:
+                    if t.done() and t.exception() is not None:
+                        raise t.exception()
+                number += 1
+                size += len(part)
+                tasks.append(
+                    asyncio.create_task(
+                        self._upload_part(key, upload_id, number, part, slots)
+                    )
+                )
+            etags = await asyncio.gather(*tasks)
+            await self._complete_multipart(key, upload_id, etags)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.shield(self._abort_multipart(key, upload_id))
+            raise
+        return size
+
+    async def _upload_part(
+        self,
+        key: str,
+        upload_id: str,
+        number: int,
+        body: bytes,
+        slots: asyncio.Semaphore,
+    ) -> str:
+        try:
+            query = f"partNumber={number}&uploadId={quote(upload_id, safe='-_.~')}"
+            r = await self._request(
+                "PUT",
+                self._url(key, query),
+                {"content-length": str(len(body))},
+                body,
+            )
+            if r.status_code >= 300:
+                raise RuntimeError(f"S3 UploadPart {number} failed {r.status_code}: {r.text}")
+            return r.headers["etag"]
+        finally:
+            slots.release()
+
+    async def _complete_multipart(self, key: str, upload_id: str, etags: List[str]) -> None:
+        body = "".join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>"
+            for n, etag in enumerate(etags, start=1)
+        )
+        content = f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode()
+        query = f"uploadId={quote(upload_id, safe='-_.~')}"
+        r = await self._request(
+            "POST",
+            self._url(key, query),
+            {
+                "content-type": "application/xml",
+                "content-length": str(len(content)),
+                **self._create_headers(),
+            },
+            content,
+        )
+        _check_create(r, key)
+        # S3 may report a failed completion inside a 200 response.
+        if r.status_code >= 300 or b"<Error>" in r.content:
+            raise RuntimeError(f"S3 CompleteMultipartUpload failed {r.status_code}: {r.text}")
+
+    async def _abort_multipart(self, key: str, upload_id: str) -> None:
+        try:
+            query = f"uploadId={quote(upload_id, safe='-_.~')}"
+            await self._request("DELETE", self._url(key, query))
+        except Exception:
+            pass
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+        chunks, size, created_at = await self.get_stream(blob_id)
+        b = b"".join([chunk async for chunk in chunks])
+        return b, len(b), created_at
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, datetime]:
+        url = self._url(self._final_key(blob_id))
+        headers = {}
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            headers["range"] = f"bytes={offset}-{end}"
+        signed = sign_v4("GET", url, self.region, self.ak, self.sk, self.st, headers)
+        r = await self.client.send(
+            self.client.build_request("GET", url, headers=signed), stream=True
+        )
         if r.status_code == 404:
+            await r.aclose()
             raise NotFound(f"Blob '{blob_id}' not found")
         if r.status_code >= 300:
+            await r.aread()
+            await r.aclose()
             raise RuntimeError(f"S3 GET failed {r.status_code}: {r.text}")
 
-        b = r.content
-        lm_hdr = r.headers.get("Last-Modified")
-        if lm_hdr:
-            try:
-                created_at = parsedate_to_datetime(lm_hdr)
-                if created_at.tzinfo is None:
-                    created_at = created_at.replace(tzinfo=timezone.utc)
-                else:
-                    created_at = created_at.astimezone(timezone.utc)
-            except Exception:
-                created_at = datetime.now(timezone.utc)
+        span = int(r.headers.get("content-length", "0"))
+        if r.status_code == 206:
+            size = int(r.headers["content-range"].rsplit("/", 1)[1])
         else:
-            created_at = datetime.now(timezone.utc)
+            size = span
+        if span > self.multipart_threshold:
+            chunks = self._parallel_stream(r, url, offset, offset + span)
+        else:
+            chunks = _iter_response(r)
+        return chunks, size, _last_modified(r)
 
-        return b, len(b), created_at
+    async def _parallel_stream(
+        self, first: httpx.Response, url: str, start: int, end: int
+    ) -> AsyncIterator[bytes]:
+        """Stream the first part from the already open response while the
+        following parts are fetched as parallel ranged GETs, in order."""
+        ranges = iter(
+            (pos, min(pos + self.part_size, end) - 1)
+            for pos in range(start + self.part_size, end, self.part_size)
+        )
+        pending: Deque[asyncio.Task] = deque()
+
+        def _fill() -> None:
+            while len(pending) < self.max_concurrency:
+                nxt = next(ranges, None)
+                if nxt is None:
+                    return
+                pending.append(asyncio.create_task(self._get_range(url, *nxt)))
+
+        try:
+            _fill()
+            remaining = self.part_size
+            async for chunk in first.aiter_bytes(CHUNK_SIZE):
+                if len(chunk) >= remaining:
+                    yield chunk[:remaining]
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            await first.aclose()
+
+            while pending:
+                data = await pending.popleft()
+                _fill()
+                yield data
+        finally:
+            await first.aclose()
+            for t in pending:
+                t.cancel()
+
+    async def _get_range(self, url: str, first: int, last: int) -> bytes:
+        r = await self._request("GET", url, {"range": f"bytes={first}-{last}"})
+        if r.status_code != 206:
+            raise RuntimeError(f"S3 ranged GET failed {r.status_code}: {r.text}")
+        return r.content
 
-    def delete(self, blob_id: str) -> None:
+    async def delete(self, blob_id: str) -> None:
         key = self._final_key(blob_id)
         url = f"{self._bucket_base()}/{_encode_key(key)}"
         signed = sign_v4("DELETE", url, self.region, self.ak, self.sk, self.st)
-        r = self.client.delete(url, headers=signed)
+        r = await self.client.delete(url, headers=signed)
         if r.status_code not in (200, 202, 204, 404):
             raise RuntimeError(f"S3 DELETE failed {r.status_code}: {r.text}")
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Iterator, Optional, Tuple
+
+from app.domain.ports.storage import StreamingStoragePort
+
+
+def _pull(chunks: AsyncIterable[bytes], loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """Expose an async chunk stream to blocking code running off-loop."""
+    it = chunks.__aiter__()
+    while True:
+        try:
+            chunk = asyncio.run_coroutine_threadsafe(it.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+        yield chunk
+
+
+class ThreadedStorage:
+    """Async facade over a blocking adapter, confined to its own executor."""
+
+    def __init__(self, inner: StreamingStoragePort, executor: Executor):
+        self.inner = inner
+        self.executor = executor
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        # Like asyncio.to_thread, carry the context over so spans opened by the
+        # blocking adapter land in the request's trace.
+        call = functools.partial(contextvars.copy_context().run, fn, *args)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]:
+        return await self._run(self.inner.save, blob_id, data)
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        loop = asyncio.get_running_loop()
+        return await self._run(self.inner.save_stream, blob_id, _pull(chunks, loop))
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]:
+        return await self._run(self.inner.get, blob_id)
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, datetime]:
+        chunks, size, created_at = await self._run(
+            self.inner.get_stream, blob_id, offset, length
+        )
+        return self._push(chunks), size, created_at
+
+    async def open_file(self, blob_id: str) -> Optional[Tuple[Any, str, int, datetime]]:
+        open_file = getattr(self.inner, "open_file", None)
+        if open_file is None:
+            return None
+        return await self._run(open_file, blob_id)
+
+    async def _push(self, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                await self._run(close)
+
+    async def delete(self, blob_id: str) -> None:
+        await self._run(self.inner.delete, blob_id)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+
+from app.domain.entities.blob_metadata import BlobMeta
+
+
+def _utc(dt: datetime) -> datetime:
+    # SQLite hands back naive datetimes; every stored timestamp is UTC.
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def etag(meta: BlobMeta) -> str:
+    return f'"{meta.checksum}"'
+
+
+def validators(meta: BlobMeta, cache_control: str) -> Dict[str, str]:
+    """Response headers that let clients revalidate an immutable blob."""
+    headers = {
+        "ETag": etag(meta),
+        "Last-Modified": format_datetime(_utc(meta.created_at), usegmt=True),
+    }
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    try:
+        return _utc(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _matches(header: str, tag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored.
+    candidates = (t.strip() for t in header.split(","))
+    return any(t.removeprefix("W/") == tag for t in candidates)
+
+
+def not_modified(headers: Headers, meta: BlobMeta) -> bool:
+    """RFC 9110 precedence: If-None-Match wins over If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _matches(if_none_match, etag(meta))
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        since = _parse_date(if_modified_since)
+        modified = _utc(meta.created_at).replace(microsecond=0)
+        return since is not None and modified <= since
+    return False
+
+
+def range_applies(headers: Headers, meta: BlobMeta) -> bool:
+    """False when an If-Range validator no longer matches the blob."""
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Ranges require a strong match.
+        return if_range == etag(meta)
+    since = _parse_date(if_range)
+    return since is not None and _utc(meta.created_at).replace(microsecond=0) == since
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from app.domain.entities.blob_metadata import BlobMeta
+from app.infra.errors import BadRequest
+
+
+def encode_cursor(meta: BlobMeta, order_by: str) -> str:
+    """Opaque keyset cursor pointing just past ``meta`` in ``order_by`` order."""
+    if order_by == "created_at":
+        key = [order_by, meta.created_at.isoformat(), meta.id]
+    else:
+        key = [order_by, meta.id]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], order_by: str) -> Optional[Tuple[Any, ...]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, *key = json.loads(raw)
+        if kind != order_by:
+            raise ValueError(kind)
+        if order_by == "created_at":
+            created_at, blob_id = key
+            return datetime.fromisoformat(created_at), str(blob_id)
+        (blob_id,) = key
+        return (str(blob_id),)
+    except Exception:
+        raise BadRequest("Invalid 'after' cursor")
@@ -1,75 +1,313 @@
 from __future__ import annotations
 
-from fastapi import Depends
-from sqlalchemy.orm import Session, sessionmaker
+import asyncio
+import contextlib
+import functools
+from contextlib import asynccontextmanager
+from typing import Any, Dict
 
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.adapters.storage.cached import CachedStorage
 from app.adapters.storage.db import DbBlobStorage
-from app.adapters.storage.ftp import FtpStorage
+from app.adapters.storage.ftp import FtpStorage, close_pools
+from app.adapters.storage.instrumented import InstrumentedStorage
 from app.adapters.storage.local_fs import LocalFsStorage
+from app.adapters.storage.mirrored import MirroredStorage
 from app.adapters.storage.s3 import S3HttpStorage
+from app.adapters.storage.threaded import ThreadedStorage
 
-from app.infra.db import Base, make_engine, make_session_factory
+from app.infra.cache.blob_cache import BlobCache
+from app.infra.db import (
+    make_async_engine,
+    make_async_session_factory,
+    trace_queries,
+    track_pool,
+)
+from app.infra.executors import get_executor, shutdown_executors
+from app.infra.fs.group_commit import get_group_committer
+from app.infra.codecs import get_codec
+from app.infra.schema import upgrade_schema
 from app.infra.settings import get_settings, Settings
-from app.infra.uow.sqlalchemy_uow import SqlAlchemyUnitOfWork
-from app.infra.repositories.metadata.repository import SqlAlchemyMetadataRepository
+from app.infra.uow.sqlalchemy_uow import AsyncSqlAlchemyUnitOfWork
+from app.infra.repositories.metadata.instrumented import InstrumentedMetadataRepository
+from app.infra.repositories.metadata.repository import AsyncSqlAlchemyMetadataRepository
 from app.domain.services.blob_service import BlobService
+from app.domain.services.ingest import IngestQueue
+from app.domain.services.tiering import AccessTracker, TierMigrator
 
 _engine = None
-_SessionFactory: sessionmaker | None = None
+_SessionFactory: async_sessionmaker | None = None
 _bootstrapped = False
+_bootstrap_lock = asyncio.Lock()
+_blob_cache: BlobCache | None = None
+# Adapters of the non-db backends, shared by all requests: they hold the
+# HTTP clients, connection pools and executors.
+_storages: Dict[str, Any] = {}
+# STORAGE=tiered: new blobs land on the hot tier and the migrator moves them.
+HOT_TIER = "fs"
+_tracker: AccessTracker | None = None
+_migrator: TierMigrator | None = None
+_migrator_task: asyncio.Task | None = None
+# INGEST_ASYNC: uploads are staged here and copied to the backend behind.
+_ingest: IngestQueue | None = None
 
 
-def _bootstrap_db(database_url: str) -> None:
+async def _bootstrap_db(settings: Settings) -> None:
     global _engine, _SessionFactory, _bootstrapped
-    if _engine is None:
-        _engine = make_engine(database_url)
-        _SessionFactory = make_session_factory(_engine)
+    if _bootstrapped:
+        return
+    async with _bootstrap_lock:
+        if _engine is None:
+            _engine = make_async_engine(settings.database_url, settings)
+            track_pool(_engine)
+            trace_queries(_engine)
+            _SessionFactory = make_async_session_factory(_engine)
+
+        if not _bootstrapped:
+            async with _engine.begin() as conn:
+                await conn.run_sync(upgrade_schema)
+            _bootstrapped = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the engine and the configured backend's clients and pools once,
+    and drain them on shutdown."""
+    settings = get_settings()
+    await _bootstrap_db(settings)
+    backend = _write_backend(settings)
+    if backend != "db":
+        _shared_storage(backend, settings)
+    if settings.storage.lower() == "tiered":
+        _start_tiering(settings)
+    if settings.ingest_async:
+        _start_ingest(settings, backend)
+    try:
+        yield
+    finally:
+        await _shutdown()
+
+
+def _start_tiering(settings: Settings) -> None:
+    global _tracker, _migrator, _migrator_task
+    cold = settings.tier_cold.lower()
+    if cold not in ("s3", "ftp"):
+        raise ValueError(f"Unsupported cold tier: {cold!r}")
+    _tracker = AccessTracker(
+        HOT_TIER, settings.tier_promote_reads, settings.tier_promote_window
+    )
+    _migrator = TierMigrator(
+        {
+            HOT_TIER: _shared_storage(HOT_TIER, settings),
+            cold: _shared_storage(cold, settings),
+        },
+        _metadata_scope,
+        _tracker,
+        HOT_TIER,
+        cold,
+        settings.tier_cold_after,
+        interval=settings.tier_migrate_interval,
+        batch=settings.tier_migrate_batch,
+        concurrency=settings.tier_migrate_concurrency,
+        bytes_per_sec=settings.tier_migrate_bytes_per_sec,
+        delete_grace=settings.tier_delete_grace,
+    )
+    _migrator_task = asyncio.create_task(_migrator.run())
 
-    if not _bootstrapped:
-        Base.metadata.create_all(bind=_engine)
-        _bootstrapped = True
+
+def _start_ingest(settings: Settings, backend: str) -> None:
+    global _ingest
+    if backend == "db":
+        raise ValueError("INGEST_ASYNC needs a backend other than db")
+    if settings.dedup:
+        raise ValueError("INGEST_ASYNC can't be combined with DEDUP")
+    staging = InstrumentedStorage(
+        ThreadedStorage(
+            LocalFsStorage(settings.ingest_staging_dir),
+            get_executor("staging", settings.fs_executor_workers),
+        ),
+        "staging",
+    )
+    _ingest = IngestQueue(
+        staging,
+        _shared_storage(backend, settings),
+        _metadata_scope,
+        backend,
+        workers=settings.ingest_workers,
+        max_attempts=settings.ingest_max_attempts,
+        retry_backoff=settings.ingest_retry_backoff,
+        lease=settings.ingest_lease,
+        poll_interval=settings.ingest_poll_interval,
+    )
+    _ingest.start()
+
+
+@asynccontextmanager
+async def _metadata_scope():
+    """A metadata repository on a session of its own, committed on exit."""
+    async with _SessionFactory() as session:
+        yield InstrumentedMetadataRepository(AsyncSqlAlchemyMetadataRepository(session))
+        await session.commit()
+
+
+async def _shutdown() -> None:
+    global _engine, _SessionFactory, _bootstrapped
+    global _tracker, _migrator, _migrator_task, _ingest, _blob_cache
+    if _ingest is not None:
+        await _ingest.aclose()
+        _ingest = None
+    if _migrator_task is not None:
+        _migrator_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _migrator_task
+        await _migrator.close()
+    _tracker, _migrator, _migrator_task = None, None, None
+    # Newest first: a mirror finishes its writes before its replicas close.
+    storages = list(reversed(_storages.values()))
+    _storages.clear()
+    for storage in storages:
+        aclose = getattr(storage.inner, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    # Blocking backends: let queued work finish, then hang up.
+    await asyncio.to_thread(shutdown_executors)
+    await asyncio.to_thread(close_pools)
+    if _engine is not None:
+        await _engine.dispose()
+    _engine, _SessionFactory, _bootstrapped = None, None, False
+    _blob_cache = None
 
 
-def get_session(settings: Settings = Depends(get_settings)):
-    _bootstrap_db(settings.database_url)
-    session: Session = _SessionFactory()
+async def get_session(settings: Settings = Depends(get_settings)):
+    await _bootstrap_db(settings)
+    session: AsyncSession = _SessionFactory()
     try:
         yield session
-        session.commit()
+        await session.commit()
     except Exception:
-        session.rollback()
+        await session.rollback()
         raise
     finally:
-        session.close()
+        await session.close()
 
 
-def get_storage(
-    settings: Settings = Depends(get_settings), session: Session = Depends(get_session)
-):
+def get_blob_cache(settings: Settings = Depends(get_settings)) -> BlobCache | None:
+    """Process-wide read cache; None unless CACHE_MAX_BYTES is set."""
+    global _blob_cache
+    if _blob_cache is None and settings.cache_max_bytes > 0:
+        _blob_cache = BlobCache(
+            settings.cache_max_bytes,
+            settings.cache_max_item_bytes,
+            settings.cache_dir,
+            settings.cache_disk_max_bytes,
+        )
+    return _blob_cache
+
+
+def _write_backend(settings: Settings) -> str:
     backend = (
         getattr(settings, "active_backend", None) or getattr(settings, "storage", "fs")
     ).lower()
-    if backend == "fs":
-        return LocalFsStorage(settings.fs_base_path)
+    return HOT_TIER if backend == "tiered" else backend
+
+
+def get_storage(
+    settings: Settings = Depends(get_settings),
+    session: AsyncSession = Depends(get_session),
+    cache: BlobCache | None = Depends(get_blob_cache),
+):
+    return _storage_for(_write_backend(settings), settings, session, cache)
+
+
+def _storage_for(
+    backend: str, settings: Settings, session: AsyncSession, cache: BlobCache | None
+):
+    backend = backend.lower()
     if backend == "db":
-        return DbBlobStorage(session)
+        # Writes through the request's session, so it can't be shared.
+        storage = InstrumentedStorage(
+            DbBlobStorage(session, settings.db_chunk_size), backend
+        )
+    else:
+        storage = _shared_storage(backend, settings)
+    if cache is not None:
+        # Tiers share one namespace: a blob's bytes don't change when it moves.
+        tiered = settings.storage.lower() == "tiered"
+        return CachedStorage(storage, cache, "tiered" if tiered else backend)
+    return storage
+
+
+def _shared_storage(backend: str, settings: Settings) -> InstrumentedStorage:
+    storage = _storages.get(backend)
+    if storage is None:
+        storage = _storages[backend] = InstrumentedStorage(
+            _backend_storage(backend, settings), backend
+        )
+    return storage
+
+
+def _backend_storage(backend: str, settings: Settings):
+    if backend == "fs":
+        committer = None
+        if settings.fs_group_commit:
+            committer = get_group_committer(
+                settings.fs_base_path,
+                settings.fs_group_commit_window,
+                settings.fs_group_commit_syncfs,
+            )
+        return ThreadedStorage(
+            LocalFsStorage(settings.fs_base_path, committer),
+            get_executor("fs", settings.fs_executor_workers),
+        )
     if backend == "s3":
         return S3HttpStorage(settings)
     if backend == "ftp":
-        return FtpStorage(settings)
+        return ThreadedStorage(
+            FtpStorage(settings), get_executor("ftp", settings.ftp_executor_workers)
+        )
+    if backend == "mirror":
+        names = [b.strip().lower() for b in settings.mirror_backends.split(",") if b.strip()]
+        if len(set(names)) != len(names) or not set(names) <= {"fs", "s3", "ftp"}:
+            raise ValueError(f"Unsupported mirror backends: {settings.mirror_backends!r}")
+        return MirroredStorage(
+            [_shared_storage(name, settings) for name in names],
+            names,
+            quorum=settings.mirror_write_quorum,
+            hedge_min_delay=settings.mirror_hedge_min_delay,
+            hedge_max_delay=settings.mirror_hedge_max_delay,
+            repair_retries=settings.mirror_repair_retries,
+            repair_concurrency=settings.mirror_repair_concurrency,
+        )
     raise ValueError(f"Unsupported backend: {backend!r}")
 
 
 def get_blob_service(
     settings: Settings = Depends(get_settings),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     storage=Depends(get_storage),
+    cache: BlobCache | None = Depends(get_blob_cache),
 ) -> BlobService:
-    meta_repo = SqlAlchemyMetadataRepository(session)
-    uow = SqlAlchemyUnitOfWork(session) if settings.storage.lower() == "db" else None
+    meta_repo = InstrumentedMetadataRepository(AsyncSqlAlchemyMetadataRepository(session))
+    backend = _write_backend(settings)
+    shares_session = backend == "db"
     return BlobService(
         storage=storage,
         meta_repo=meta_repo,
-        backend_name=settings.storage,
-        uow=uow,
+        backend_name=backend,
+        # Metadata writes commit right away, so SQLite's write lock is never
+        # held across a call to a remote backend. The db backend's bytes are
+        # written in the request's transaction, which get_session commits.
+        uow=AsyncSqlAlchemyUnitOfWork(session, flush_only=shares_session),
+        dedup=settings.dedup,
+        codec=get_codec(settings.compression, settings.compression_level),
+        # The db backend writes through the request session, which can't
+        # run statements concurrently.
+        batch_concurrency=1 if shares_session else settings.batch_concurrency,
+        storages=functools.partial(
+            _storage_for, settings=settings, session=session, cache=cache
+        ),
+        tracker=_tracker,
+        ingest=_ingest,
     )
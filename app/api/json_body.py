@@ -0,0 +1,275 @@
+from __future__ import annotations
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Type
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+_WS = b" \t\r\n"
+_SCALAR = frozenset(b"+-0123456789.eEtruefalsn")
+# Keys and every value other than the streamed one are parsed whole.
+_MAX_SMALL = 64 * 1024
+_MAX_DEPTH = 32
+# Raw control characters aren't allowed in strings; escaped ones are.
+_CONTROL = re.compile(rb"[\x00-\x1f]")
+_ESCAPES = {
+    ord('"'): b'"',
+    ord("\\"): b"\\",
+    ord("/"): b"/",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+}
+
+
+class BlobBody:
+    """Incremental parser for a JSON object with one large string member.
+
+    Members are parsed up to the start of the ``stream_key`` string, which
+    is then handed out in pieces as the request body arrives (escapes
+    decoded), so it never has to be held in memory as a whole.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], stream_key: str = "data"):
+        self._chunks = chunks.__aiter__()
+        self._buf = b""
+        self._pos = 0
+        self._offset = 0
+        self._started = False
+        self._first = True
+        self._closed = False
+        self.stream_key = stream_key
+        self.streamed = False
+        self.fields: Dict[str, Any] = {}
+
+    def _error(self, msg: str) -> RequestValidationError:
+        return RequestValidationError(
+            [
+                {
+                    "type": "json_invalid",
+                    "loc": ("body", self._offset + self._pos),
+                    "msg": "JSON decode error",
+                    "input": {},
+                    "ctx": {"error": msg},
+                }
+            ]
+        )
+
+    async def _fill(self) -> bool:
+        async for chunk in self._chunks:
+            if chunk:
+                self._offset += self._pos
+                self._buf = self._buf[self._pos :] + chunk
+                self._pos = 0
+                return True
+        return False
+
+    async def _peek(self) -> Optional[int]:
+        """Next non-whitespace byte, or None at the end of the body."""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not await self._fill():
+                return None
+
+    async def _expect(self, ch: bytes) -> None:
+        if await self._peek() != ch[0]:
+            raise self._error(f"Expecting {ch.decode()!r}")
+        self._pos += 1
+
+    async def _need(self, n: int) -> None:
+        while len(self._buf) - self._pos < n:
+            if not await self._fill():
+                raise self._error("Unterminated string")
+
+    async def _escape(self) -> bytes:
+        await self._need(2)
+        n = 2
+        if self._buf[self._pos + 1] == ord("u"):
+            await self._need(6)
+            n = 6
+            high = self._buf[self._pos + 2 : self._pos + 4].lower()
+            if high in (b"d8", b"d9", b"da", b"db"):
+                # A high surrogate is decoded together with its low half.
+                try:
+                    await self._need(12)
+                except RequestValidationError:
+                    pass
+                else:
+                    if self._buf[self._pos + 6 : self._pos + 8] == b"\\u":
+                        n = 12
+        seq = self._buf[self._pos : self._pos + n]
+        try:
+            text = json.loads(b'"' + seq + b'"')
+        except ValueError:
+            raise self._error("Invalid \\escape") from None
+        self._pos += n
+        return text.encode("utf-8", "surrogatepass")
+
+    async def _string(self, strict: bool = False) -> AsyncIterator[bytes]:
+        """Pieces of the string whose opening quote was just consumed; with
+        ``strict``, raw control characters in it are an error."""
+        while True:
+            buf, pos = self._buf, self._pos
+            start, end = pos, len(buf)
+            quote = buf.find(b'"', pos)
+            out = bytearray()
+            while True:
+                if quote < pos:
+                    quote = buf.find(b'"', pos)
+                stop = quote if quote >= 0 else end
+                backslash = buf.find(b"\\", pos, stop)
+                if backslash < 0:
+                    out += buf[pos:stop]
+                    pos = stop
+                    break
+                seg = buf[pos:stop] if not out else b""
+                if seg and seg.count(b"\\") == seg.count(b"\\/"):
+                    # Only escaped slashes, as some encoders emit for "/".
+                    out += seg.replace(b"\\/", b"/")
+                    pos = stop
+                    break
+                out += buf[pos:backslash]
+                pos = backslash
+                # Short escapes are decoded inline; \u sequences and escapes
+                # split across chunks take the slow path below.
+                esc = _ESCAPES.get(buf[pos + 1]) if pos + 1 < end else None
+                if esc is None:
+                    break
+                out += esc
+                pos += 2
+            if strict and _CONTROL.search(buf, start, pos):
+                raise self._error("Invalid control character")
+            self._pos = pos
+            if out:
+                yield bytes(out)
+            if pos < end and buf[pos] == ord('"'):
+                self._pos = pos + 1
+                return
+            if pos < end:
+                yield await self._escape()
+            elif not await self._fill():
+                raise self._error("Unterminated string")
+
+    async def _small_string(self) -> str:
+        await self._expect(b'"')
+        out = bytearray()
+        async for piece in self._string(strict=True):
+            out += piece
+            if len(out) > _MAX_SMALL:
+                raise self._error("String too long")
+        try:
+            return out.decode("utf-8", "surrogatepass")
+        except UnicodeDecodeError:
+            raise self._error("Invalid UTF-8") from None
+
+    async def _value(self, depth: int = 0) -> Any:
+        ch = await self._peek()
+        if depth > _MAX_DEPTH:
+            raise self._error("Nesting too deep")
+        if ch == ord('"'):
+            return await self._small_string()
+        if ch == ord("{"):
+            self._pos += 1
+            obj: Dict[str, Any] = {}
+            if await self._peek() == ord("}"):
+                self._pos += 1
+                return obj
+            while True:
+                key = await self._small_string()
+                await self._expect(b":")
+                obj[key] = await self._value(depth + 1)
+                if await self._peek() == ord("}"):
+                    self._pos += 1
+                    return obj
+                await self._expect(b",")
+        if ch == ord("["):
+            self._pos += 1
+            arr = []
+            if await self._peek() == ord("]"):
+                self._pos += 1
+                return arr
+            while True:
+                arr.append(await self._value(depth + 1))
+                if await self._peek() == ord("]"):
+                    self._pos += 1
+                    return arr
+                await self._expect(b",")
+        token = bytearray()
+        while True:
+            buf, pos = self._buf, self._pos
+            end = pos
+            while end < len(buf) and buf[end] in _SCALAR:
+                end += 1
+            token += buf[pos:end]
+            self._pos = end
+            if len(token) > _MAX_SMALL:
+                raise self._error("Value too long")
+            if end < len(buf) or not await self._fill():
+                break
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise self._error("Expecting value") from None
+
+    async def _members(self, stop_at_stream: bool) -> bool:
+        if not self._started:
+            await self._expect(b"{")
+            self._started = True
+        while not self._closed:
+            if await self._peek() == ord("}"):
+                self._pos += 1
+                self._closed = True
+                break
+            if not self._first:
+                await self._expect(b",")
+            self._first = False
+            key = await self._small_string()
+            await self._expect(b":")
+            if key in self.fields or (key == self.stream_key and self.streamed):
+                raise self._error(f"Duplicate key {key!r}")
+            if (
+                key == self.stream_key
+                and stop_at_stream
+                and await self._peek() == ord('"')
+            ):
+                self._pos += 1
+                self.streamed = True
+                return True
+            self.fields[key] = await self._value()
+        return False
+
+    async def read_until_stream(self) -> bool:
+        """Parse members until the streamed string starts; False if the
+        object ended without it."""
+        return await self._members(stop_at_stream=True)
+
+    def stream(self) -> AsyncIterator[bytes]:
+        return self._string()
+
+    async def finish(self) -> None:
+        """Parse the members after the streamed string and the end of input."""
+        await self._members(stop_at_stream=False)
+        if await self._peek() is not None:
+            raise self._error("Extra data")
+
+
+def validate(model: Type[BaseModel], fields: Dict[str, Any]) -> None:
+    """Run the model's validation on the small fields, as FastAPI would
+    have for a whole body."""
+    try:
+        model.model_validate(fields)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [
+                {**err, "loc": ("body", *err["loc"])}
+                for err in exc.errors(include_url=False)
+            ]
+        ) from None
@@ -1,8 +1,20 @@
-from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional
+
+from pydantic import AfterValidator, BaseModel, Field
+
+BATCH_MAX_ITEMS = 1000
+
+
+def check_blob_id(blob_id: str) -> str:
+    # GET /v1/blobs/<id>/content serves the bytes of <id>, so a blob whose id
+    # ended that way could never be fetched as JSON.
+    if blob_id.endswith("/content"):
+        raise ValueError("Blob ids must not end with '/content'")
+    return blob_id
 
 
 class BlobIn(BaseModel):
-    id: str = Field(min_length=1, max_length=512)
+    id: Annotated[str, Field(min_length=1, max_length=512), AfterValidator(check_blob_id)]
     data: str
 
 
@@ -11,3 +23,31 @@ class BlobOut(BaseModel):
     data: str
     size: int
     created_at: str
+
+
+class BlobInfo(BaseModel):
+    id: str
+    size: int
+    created_at: str
+
+
+class BlobBatchIn(BaseModel):
+    items: List[BlobIn] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class BlobIdsIn(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class BlobItemResult(BaseModel):
+    id: str
+    status: int
+    data: Optional[str] = None
+    size: Optional[int] = None
+    created_at: Optional[str] = None
+    error: Optional[str] = None
+    message: Optional[str] = None
+
+
+class BlobBatchOut(BaseModel):
+    results: List[BlobItemResult]
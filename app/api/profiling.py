@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import os
+import uuid
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.infra.profiling import Sampler
+from app.infra.settings import get_settings
+
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class ProfilingMiddleware:
+    """Profiles a request on demand.
+
+    Requests carrying ``X-Profile: <PROFILE_TOKEN>`` (or ``?profile=<token>``)
+    are sampled for their whole duration and the collapsed stacks are written
+    to ``<PROFILE_DIR>/<id>.folded``; the id is returned in ``x-profile-id``.
+    Disabled while PROFILE_TOKEN is empty.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _requested(self, scope: Scope, token: bytes) -> bool:
+        given = b""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                given = value
+                break
+        if not given and b"profile=" in scope.get("query_string", b""):
+            query = scope["query_string"].decode("latin-1")
+            given = dict(parse_qsl(query)).get("profile", "").encode("latin-1")
+        return bool(given) and hmac.compare_digest(given, token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        settings = get_settings()
+        token = settings.profile_token.encode()
+        if not token or not self._requested(scope, token):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def tagged_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = Sampler(settings.profile_interval)
+        try:
+            async with sampler:
+                await self.app(scope, receive, tagged_send)
+        finally:
+            path = os.path.join(settings.profile_dir, f"{profile_id}.folded")
+            await asyncio.to_thread(_write, path, sampler.folded())
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+
+from app.infra.errors import RangeNotSatisfiable
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Resolve a ``Range`` header to an inclusive ``(start, end)`` byte span.
+
+    Returns None when the whole object should be served: no header, a unit
+    other than bytes, a malformed value or a multi-range request.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable("Requested range not satisfiable", size)
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable("Requested range not satisfiable", size)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
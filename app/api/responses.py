@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import mmap
+from typing import BinaryIO, Mapping, Optional
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+class FileSpanResponse(Response):
+    """Serve ``count`` bytes of an already open file from ``offset``.
+
+    Servers offering the ASGI zero-copy extension get the descriptor itself
+    (``sendfile(2)``), and whole files may go out through ``pathsend``.
+    Otherwise the span is sent as slices of an ``mmap``, so Python never
+    issues a read per chunk. The file is closed once the response is done.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        path: str,
+        offset: int,
+        count: int,
+        size: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: str = "application/octet-stream",
+    ):
+        self.file = file
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.size = size
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if scope["method"].upper() == "HEAD" or self.count == 0:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopy" in extensions:
+                await send(
+                    {
+                        "type": "http.response.zerocopy",
+                        "file": self.file,
+                        "offset": self.offset,
+                        "count": self.count,
+                    }
+                )
+            elif "http.response.pathsend" in extensions and self.count == self.size:
+                await send({"type": "http.response.pathsend", "path": self.path})
+            else:
+                await self._send_mapped(send)
+        finally:
+            self.file.close()
+
+    async def _send_mapped(self, send: Send) -> None:
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos, end = self.offset, self.offset + self.count
+            while pos < end:
+                stop = min(pos + self.chunk_size, end)
+                if stop < end and hasattr(mm, "madvise"):
+                    # Let the kernel read the next slice ahead while this
+                    # one is written, so slicing rarely faults on the loop.
+                    ahead = stop - stop % mmap.PAGESIZE
+                    mm.madvise(
+                        mmap.MADV_WILLNEED,
+                        ahead,
+                        min(self.chunk_size, self.size - ahead),
+                    )
+                await send(
+                    {"type": "http.response.body", "body": mm[pos:stop], "more_body": stop < end}
+                )
+                pos = stop
@@ -1,26 +1,281 @@
-from fastapi import APIRouter, Depends
+import json
+import tempfile
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, BinaryIO, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import AfterValidator
 from starlette import status
 
+from app.api.conditional import not_modified, range_applies, validators
 from app.api.dependencies import get_blob_service
-from app.api.models import BlobIn, BlobOut
+from app.api.cursors import decode_cursor, encode_cursor
+from app.api.json_body import BlobBody, validate
+from app.api.models import (
+    BlobBatchIn,
+    BlobBatchOut,
+    BlobIdsIn,
+    BlobIn,
+    BlobInfo,
+    BlobOut,
+    check_blob_id,
+)
+from app.api.ranges import parse_range
+from app.api.responses import FileSpanResponse
 from app.api.auth import require_auth
-from app.domain.services.blob_service import BlobService
+from app.domain.entities.blob_metadata import BlobMeta
+from app.domain.services.blob_service import BlobService, describe
+from app.infra.settings import Settings, get_settings
 
 router = APIRouter(prefix="/v1/blobs", tags=["blobs"])
 
 
+async def _request_body(request: Request) -> AsyncIterator[bytes]:
+    async for chunk in request.stream():
+        if chunk:
+            yield chunk
+
+
+_LIST_FLUSH_BYTES = 64 * 1024
+# The base64 text echoed back by POST stays in memory up to this size.
+_ECHO_SPOOL_MAX = 1024 * 1024
+_ECHO_READ = 256 * 1024
+
+
+async def _spooled(f: BinaryIO) -> AsyncIterator[bytes]:
+    f.seek(0)
+    while chunk := f.read(_ECHO_READ):
+        yield chunk
+
+
+async def _streamed_data(body: BlobBody, echo: BinaryIO) -> AsyncIterator[bytes]:
+    async for piece in body.stream():
+        echo.write(piece)
+        yield piece
+    # Trailing members or garbage fail the upload before it is committed.
+    await body.finish()
+
+
+def _json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode()
+
+
+async def _created_body(saved: dict, echo: BinaryIO) -> AsyncIterator[bytes]:
+    try:
+        yield b'{"id":' + _json(saved["id"]) + b',"data":"'
+        async for chunk in _spooled(echo):
+            yield chunk
+        yield b'","size":%d,"created_at":%s' % (saved["size"], _json(saved["created_at"]))
+        if "status" in saved:
+            yield b',"status":' + _json(saved["status"])
+        yield b"}"
+    finally:
+        echo.close()
+
+
+def _created_status(saved: dict) -> int:
+    # Staged for a write-behind upload: accepted, not yet on the backend.
+    if saved.get("status") == "PENDING":
+        return status.HTTP_202_ACCEPTED
+    return status.HTTP_201_CREATED
+
+
+async def _list_body(
+    rows: AsyncIterator[BlobMeta], limit: int, order_by: str
+) -> AsyncIterator[bytes]:
+    buf = bytearray(b'{"items":[')
+    count, last, more = 0, None, False
+    try:
+        async for meta in rows:
+            if count == limit:
+                more = True
+                break
+            if count:
+                buf += b","
+            buf += json.dumps(describe(meta)).encode()
+            count, last = count + 1, meta
+            if len(buf) >= _LIST_FLUSH_BYTES:
+                yield bytes(buf)
+                buf.clear()
+    finally:
+        await rows.aclose()
+    cursor = encode_cursor(last, order_by) if more else None
+    buf += b'],"next":' + json.dumps(cursor).encode() + b"}"
+    yield bytes(buf)
+
+
+@router.get("", dependencies=[Depends(require_auth)])
+async def list_blobs(
+    prefix: Optional[str] = Query(None, max_length=512),
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    backend: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    order_by: Literal["id", "created_at"] = "id",
+    svc: BlobService = Depends(get_blob_service),
+):
+    # One extra row tells whether there is a next page.
+    rows = svc.list_page(
+        order_by,
+        limit + 1,
+        decode_cursor(after, order_by),
+        prefix,
+        backend,
+        created_after,
+    )
+    return StreamingResponse(
+        _list_body(rows, limit, order_by), media_type="application/json"
+    )
+
+
 @router.post(
     "",
     response_model=BlobOut,
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(require_auth)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": BlobIn.model_json_schema()}},
+        }
+    },
 )
-def store_blob(body: BlobIn, svc: BlobService = Depends(get_blob_service)):
-    return svc.save(body.id, body.data)
+async def store_blob(request: Request, svc: BlobService = Depends(get_blob_service)):
+    # The body is parsed as it arrives: "data" is decoded, hashed and written
+    # in blocks, and its text is spooled for the echo in the response.
+    body = BlobBody(_request_body(request))
+    echo = tempfile.SpooledTemporaryFile(max_size=_ECHO_SPOOL_MAX)
+    try:
+        streaming = await body.read_until_stream()
+        if streaming and "id" in body.fields:
+            validate(BlobIn, {**body.fields, "data": ""})
+            saved = await svc.save_base64_stream(
+                body.fields["id"], _streamed_data(body, echo)
+            )
+        else:
+            # "data" came before "id" (or not at all): set it aside until
+            # the whole body has been validated.
+            if streaming:
+                async for piece in body.stream():
+                    echo.write(piece)
+            await body.finish()
+            validate(BlobIn, {**body.fields, "data": ""} if streaming else body.fields)
+            saved = await svc.save_base64_stream(body.fields["id"], _spooled(echo))
+    except BaseException:
+        echo.close()
+        raise
+    return StreamingResponse(
+        _created_body(saved, echo),
+        status_code=_created_status(saved),
+        media_type="application/json",
+    )
+
+
+@router.post(
+    ":batch",
+    response_model=BlobBatchOut,
+    response_model_exclude_none=True,
+    dependencies=[Depends(require_auth)],
+)
+async def store_blobs(body: BlobBatchIn, svc: BlobService = Depends(get_blob_service)):
+    results = await svc.save_many([(item.id, item.data) for item in body.items])
+    return {"results": results}
+
+
+@router.post(
+    ":get",
+    response_model=BlobBatchOut,
+    response_model_exclude_none=True,
+    dependencies=[Depends(require_auth)],
+)
+async def get_blobs(body: BlobIdsIn, svc: BlobService = Depends(get_blob_service)):
+    return {"results": await svc.get_many(body.ids)}
+
+
+@router.put(
+    "/{blob_id:path}",
+    response_model=BlobInfo,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_auth)],
+)
+async def upload_blob_content(
+    request: Request,
+    blob_id: Annotated[
+        str, Path(min_length=1, max_length=512), AfterValidator(check_blob_id)
+    ],
+    content_length: Optional[int] = Header(None, ge=0),
+    svc: BlobService = Depends(get_blob_service),
+):
+    saved = await svc.save_stream(blob_id, _request_body(request), content_length)
+    if saved.get("status") == "PENDING":
+        return JSONResponse(saved, status_code=_created_status(saved))
+    return saved
+
+
+@router.get("/{blob_id:path}/content", dependencies=[Depends(require_auth)])
+async def get_blob_content(
+    request: Request,
+    blob_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    svc: BlobService = Depends(get_blob_service),
+    settings: Settings = Depends(get_settings),
+):
+    meta = await svc.lookup(blob_id)
+    headers = validators(meta, settings.http_cache_control)
+    if not_modified(request.headers, meta):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = meta.size
+    headers["Accept-Ranges"] = "bytes"
+    span = None
+    if range_applies(request.headers, meta):
+        span = parse_range(range_header, size)
+    if span is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        start, end = span
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    local = await svc.open_file(blob_id)
+    if local is not None:
+        f, path, file_size, _created_at = local
+        return FileSpanResponse(
+            f, path, start, end - start + 1, file_size, status_code, headers
+        )
+    return StreamingResponse(
+        await svc.read_stream(blob_id, start, end - start + 1 if span else None),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
 
 
 @router.get(
     "/{blob_id:path}", response_model=BlobOut, dependencies=[Depends(require_auth)]
 )
-def get_blob(blob_id: str, svc: BlobService = Depends(get_blob_service)):
-    return svc.get(blob_id)
+async def get_blob(
+    request: Request,
+    response: Response,
+    blob_id: str,
+    svc: BlobService = Depends(get_blob_service),
+    settings: Settings = Depends(get_settings),
+):
+    meta = await svc.lookup(blob_id)
+    headers = validators(meta, settings.http_cache_control)
+    if not_modified(request.headers, meta):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return await svc.get(blob_id)
+
+
+@router.delete(
+    "/{blob_id:path}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_auth)],
+)
+async def delete_blob(blob_id: str, svc: BlobService = Depends(get_blob_service)):
+    await svc.delete(blob_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
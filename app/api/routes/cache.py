@@ -0,0 +1,16 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+
+from app.api.auth import require_auth
+from app.api.dependencies import get_blob_cache
+from app.infra.cache.blob_cache import BlobCache
+
+router = APIRouter(prefix="/v1/cache", tags=["cache"])
+
+
+@router.get("/stats", dependencies=[Depends(require_auth)])
+async def cache_stats(cache: Optional[BlobCache] = Depends(get_blob_cache)):
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+
+from app.api.auth import require_auth
+from app.infra.metrics import CONTENT_TYPE, REGISTRY
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", dependencies=[Depends(require_auth)])
+async def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
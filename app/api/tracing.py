@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.infra.settings import get_settings
+from app.infra.tracing import get_exporter, start_trace
+
+
+class TracingMiddleware:
+    """Root span per sampled request, exported when the response is done.
+
+    The span is named after the route template once routing has matched;
+    the trace id is returned in ``x-trace-id``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        settings = get_settings()
+        exporter = get_exporter(settings.trace_export, settings.trace_service_name)
+        if exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        root = start_trace(
+            f"{scope['method']} {scope['path']}",
+            exporter,
+            settings.trace_sample_rate,
+            traceparent,
+            **{"http.request.method": scope["method"], "url.path": scope["path"]},
+        )
+        with root as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def traced_send(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set("http.response.status_code", message["status"])
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"x-trace-id", span.trace.trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, traced_send)
+            finally:
+                route = getattr(scope.get("route"), "path_format", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+                    span.set("http.route", route)
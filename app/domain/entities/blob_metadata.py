@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Literal
+from typing import Literal, Optional
 
 Status = Literal["PENDING", "COMMITTED", "FAILED"]
 
@@ -13,3 +13,6 @@ class BlobMeta:
     created_at: datetime
     backend: str
     checksum: str
+    content_ref: Optional[str] = None
+    codec: Optional[str] = None
+    status: Status = "COMMITTED"
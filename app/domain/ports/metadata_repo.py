@@ -1,12 +1,121 @@
 from __future__ import annotations
-from typing import Protocol, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Protocol, Optional, Sequence, Set, Tuple
 
-from app.domain.entities.blob_metadata import BlobMeta
+from app.domain.entities.blob_metadata import BlobMeta, Status
 
 
-class MetadataRepository(Protocol):
-    def create(self, meta: BlobMeta) -> None: ...
+class AsyncMetadataRepository(Protocol):
+    async def create(self, meta: BlobMeta) -> None: ...
 
-    def get(self, blob_id: str) -> Optional[BlobMeta]: ...
+    async def get(self, blob_id: str) -> Optional[BlobMeta]: ...
 
-    def exists(self, blob_id: str) -> bool: ...
+    async def exists(self, blob_id: str) -> bool: ...
+
+    async def existing_ids(self, blob_ids: Sequence[str]) -> Set[str]: ...
+
+    async def get_many(self, blob_ids: Sequence[str]) -> Dict[str, BlobMeta]: ...
+
+    def iter_page(
+        self,
+        order_by: str,
+        limit: int,
+        after: Optional[Tuple[Any, ...]] = None,
+        prefix: Optional[str] = None,
+        backend: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+    ) -> AsyncIterator[BlobMeta]: ...
+
+    async def create_many(self, metas: List[BlobMeta]) -> Set[str]:
+        """Insert in bulk; returns the ids that already existed."""
+        ...
+
+    async def delete(self, blob_id: str) -> None: ...
+
+    async def find_content(
+        self, backend: str, checksum: str
+    ) -> Optional[Tuple[int, Optional[str]]]:
+        """(refcount, codec) of stored content; at a refcount of 0 its bytes
+        are being deleted."""
+        ...
+
+    async def acquire_content(
+        self, backend: str, checksum: str, codec: Optional[str] = None
+    ) -> bool:
+        """Add a reference to stored content encoded with ``codec``; False
+        when there is none, or it is being deleted."""
+        ...
+
+    async def add_content(
+        self, backend: str, checksum: str, size: int, codec: Optional[str] = None
+    ) -> bool:
+        """Register new content, or reference it when it was registered
+        meanwhile; False as for ``acquire_content``."""
+        ...
+
+    async def release_content(self, backend: str, checksum: str) -> bool:
+        """Drop a reference; True when it was the last one. The content stays
+        registered, at zero, until ``drop_content``."""
+        ...
+
+    async def drop_content(self, backend: str, checksum: str) -> None:
+        """Forget content without references once its bytes are deleted."""
+        ...
+
+    async def record_access(self, hits: Dict[str, Tuple[datetime, int]]) -> None:
+        """Store last read times and add read counts, by blob id."""
+        ...
+
+    async def idle_ids(self, backend: str, idle_since: datetime, limit: int) -> List[str]: ...
+
+    async def claim_move(
+        self, blob_id: str, backend: str, now: datetime, until: datetime
+    ) -> bool:
+        """Lease a blob on ``backend`` for a tier move until ``until``."""
+        ...
+
+    async def finish_move(
+        self,
+        blob_id: str,
+        src: str,
+        dst: Optional[str],
+        accessed_at: Optional[datetime] = None,
+        purge_at: Optional[datetime] = None,
+    ) -> bool:
+        """Release the lease, pointing the blob at ``dst`` when given and
+        scheduling the copy on ``src`` for removal at ``purge_at``."""
+        ...
+
+    async def due_purges(self, now: datetime, limit: int) -> List[Tuple[str, str]]:
+        """(backend, blob id) of old copies due for removal."""
+        ...
+
+    async def claim_purge(
+        self, backend: str, blob_id: str, now: datetime, until: datetime
+    ) -> bool:
+        """Lease a blob for removing its old copy on ``backend``."""
+        ...
+
+    async def finish_purge(self, backend: str, blob_id: str, removed: bool) -> None:
+        """Release that lease; forget the removal once ``removed``."""
+        ...
+
+    async def pending_ids(self, now: datetime, limit: int) -> List[str]: ...
+
+    async def claim_pending(self, blob_id: str, now: datetime, until: datetime) -> bool:
+        """Lease a PENDING blob whose previous lease ran out."""
+        ...
+
+    async def set_staged(self, meta: BlobMeta) -> bool:
+        """Fill in size, checksum and codec of a PENDING blob once staged."""
+        ...
+
+    async def add_attempt(self, blob_id: str) -> Optional[int]:
+        """Count a failed upload of a PENDING blob; returns the attempts so far."""
+        ...
+
+    async def finish_ingest(
+        self, blob_id: str, status: Status, lease_until: Optional[datetime] = None
+    ) -> bool:
+        """Move a PENDING blob to ``status``; False when it is gone."""
+        ...
@@ -1,14 +1,54 @@
 from __future__ import annotations
-from typing import Protocol, Tuple
+from datetime import datetime
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    Optional,
+    Protocol,
+    Tuple,
+)
+
+CHUNK_SIZE = 1024 * 1024
 
 
 class StoragePort(Protocol):
-    def prepare(self, data: bytes) -> Tuple[str, int, str]: ...
+    def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]: ...
 
-    def commit(self, blob_id: str, temp_ref: str) -> None: ...
+    def get(self, blob_id: str) -> Tuple[bytes, int, datetime]: ...
 
-    def abort(self, temp_ref: str) -> None: ...
+    def delete(self, blob_id: str) -> None: ...
 
-    def get(self, blob_id: str) -> Tuple[bytes, int, str]: ...
 
-    def delete(self, blob_id: str) -> None: ...
+class StreamingStoragePort(StoragePort, Protocol):
+    def save_stream(
+        self, blob_id: str, chunks: Iterable[bytes]
+    ) -> Tuple[int, datetime]: ...
+
+    def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[Iterator[bytes], int, datetime]:
+        """Yield ``length`` bytes from ``offset`` (to the end when None).
+
+        The returned size is always the full object size.
+        """
+        ...
+
+
+class AsyncStoragePort(Protocol):
+    async def save(self, blob_id: str, data: bytes) -> Tuple[int, datetime]: ...
+
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> Tuple[int, datetime]:
+        """``size`` is the expected stream length when the caller knows it."""
+        ...
+
+    async def get(self, blob_id: str) -> Tuple[bytes, int, datetime]: ...
+
+    async def get_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> Tuple[AsyncIterator[bytes], int, datetime]: ...
+
+    async def delete(self, blob_id: str) -> None: ...
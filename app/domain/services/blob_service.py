@@ -1,26 +1,138 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
+import logging
+import tempfile
+import time
 from datetime import datetime, timezone
-from typing import Any
+from collections import defaultdict
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
-from app.domain.ports.storage import StoragePort
-from app.domain.ports.metadata_repo import MetadataRepository, BlobMeta
-from app.infra.errors import BadRequest, NotFound, Conflict
+from app.domain.ports.storage import CHUNK_SIZE, AsyncStoragePort
+from app.domain.ports.metadata_repo import AsyncMetadataRepository, BlobMeta
+from app.domain.services.ingest import IngestQueue
+from app.domain.services.tiering import AccessTracker
+from app.infra.codecs import SAMPLE_SIZE, Codec, get_codec
+from app.infra.errors import AppError, BadRequest, NotFound, Conflict
+from app.infra.metrics import ERRORS, STAGE_SECONDS
+from app.infra.tracing import span, timed, traced
+
+logger = logging.getLogger(__name__)
+
+_DECODE = STAGE_SECONDS.labels("decode")
+_HASH = STAGE_SECONDS.labels("hash")
+_COMPRESS = STAGE_SECONDS.labels("compress")
+_DECOMPRESS = STAGE_SECONDS.labels("decompress")
+_ENCODE = STAGE_SECONDS.labels("encode")
 
 
 def _utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _decode_base64(b64: str) -> bytes:
+def _decode_base64(b64: Union[str, bytes]) -> bytes:
     try:
         return base64.b64decode(b64, validate=True)
     except Exception:
         raise BadRequest("Invalid base64 'data'")
 
 
+def _decode_and_hash(b64: str) -> Tuple[bytes, str]:
+    with timed(_DECODE, "decode", bytes=len(b64)):
+        raw = _decode_base64(b64)
+    with timed(_HASH, "hash", bytes=len(raw)):
+        return raw, hashlib.sha256(raw).hexdigest()
+
+
+def _decode_many(payloads: List[str]) -> List[Union[Tuple[bytes, str], AppError]]:
+    out: List[Union[Tuple[bytes, str], AppError]] = []
+    for b64 in payloads:
+        try:
+            out.append(_decode_and_hash(b64))
+        except AppError as exc:
+            out.append(exc)
+    return out
+
+
+def _item_error(blob_id: str, exc: BaseException) -> dict:
+    if not isinstance(exc, AppError):
+        logger.error("Batch item '%s' failed", blob_id, exc_info=exc)
+        exc = AppError("Storage operation failed")
+    ERRORS.labels(exc.code).inc()
+    return {
+        "id": blob_id,
+        "status": exc.http_status,
+        "error": exc.code,
+        "message": exc.message,
+    }
+
+
+# Small payloads are cheaper to process inline than to hand to a thread.
+_INLINE_CPU_MAX = 64 * 1024
+
+
+async def _cpu(fn, data: bytes, stage: Optional[str] = None):
+    """``fn(data)``, timed and traced as ``stage`` when one is given."""
+    if stage is None:
+        return await _run_cpu(fn, data)
+    with timed(STAGE_SECONDS.labels(stage), stage, bytes=len(data)):
+        return await _run_cpu(fn, data)
+
+
+async def _run_cpu(fn, data: bytes):
+    if len(data) > _INLINE_CPU_MAX:
+        return await asyncio.to_thread(fn, data)
+    return fn(data)
+
+
+# Base64 characters decoded per step when the text arrives in pieces.
+_B64_BLOCK = 1024 * 1024
+
+
+async def _decode_base64_stream(pieces: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    pending = bytearray()
+    padded = False
+    # Streamed stages are recorded once per request, summed over the steps.
+    spent = 0.0
+    async for piece in pieces:
+        pending += piece
+        if padded and pending:
+            # Nothing may follow the padding of an earlier block.
+            raise BadRequest("Invalid base64 'data'")
+        if len(pending) >= _B64_BLOCK:
+            cut = len(pending) - len(pending) % 4
+            block = bytes(pending[:cut])
+            del pending[:cut]
+            padded = block.endswith(b"=")
+            start = time.perf_counter()
+            with span("decode", bytes=len(block)):
+                raw = await _cpu(_decode_base64, block)
+            spent += time.perf_counter() - start
+            yield raw
+    if pending:
+        start = time.perf_counter()
+        with span("decode", bytes=len(pending)):
+            raw = await _cpu(_decode_base64, bytes(pending))
+        spent += time.perf_counter() - start
+        yield raw
+    _DECODE.observe(spent)
+
+
 def _to_datetime(val: Any) -> datetime:
     if isinstance(val, datetime):
         return val.astimezone(timezone.utc)
@@ -33,81 +145,781 @@ def _to_datetime(val: Any) -> datetime:
     return _utc_now()
 
 
+def _iso(dt: datetime) -> str:
+    return dt.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def describe(meta: BlobMeta) -> dict:
+    return {
+        "id": meta.id,
+        "size": meta.size,
+        "created_at": _iso(meta.created_at),
+        "backend": meta.backend,
+        "checksum": meta.checksum,
+        "status": meta.status,
+    }
+
+
+class _Digest:
+    """Hashes and counts the original bytes as they stream past."""
+
+    def __init__(self):
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.seconds = 0.0
+
+    async def tap(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            start = time.perf_counter()
+            self.sha.update(chunk)
+            self.seconds += time.perf_counter() - start
+            self.size += len(chunk)
+            yield chunk
+
+
+async def _prepend(head: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    if head:
+        yield head
+    async for chunk in rest:
+        yield chunk
+
+
+async def _peek(
+    chunks: AsyncIterable[bytes], n: int
+) -> Tuple[bytes, AsyncIterator[bytes]]:
+    """At least ``n`` leading bytes (fewer if the stream is shorter), and
+    the stream as if nothing had been read."""
+    it = chunks.__aiter__()
+    head = b""
+    while len(head) < n:
+        try:
+            head += await it.__anext__()
+        except StopAsyncIteration:
+            break
+    return head, _prepend(head, it)
+
+
+async def _compress_stream(
+    codec: Codec, chunks: AsyncIterable[bytes]
+) -> AsyncIterator[bytes]:
+    compressor = codec.compressor()
+    spent = 0.0
+    async for chunk in chunks:
+        start = time.perf_counter()
+        with span("compress", bytes=len(chunk)):
+            out = await _cpu(compressor.compress, chunk)
+        spent += time.perf_counter() - start
+        if out:
+            yield out
+    tail = compressor.flush()
+    _COMPRESS.observe(spent)
+    if tail:
+        yield tail
+
+
+async def _decompress_stream(
+    codec: Codec,
+    chunks: AsyncIterator[bytes],
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """Decode stored chunks and yield ``length`` bytes of the original
+    content starting at ``offset``."""
+    decoder = codec.decoder()
+    skip, remaining = offset, length
+    spent = 0.0
+
+    def window(piece: bytes) -> bytes:
+        nonlocal skip, remaining
+        if skip:
+            cut = min(skip, len(piece))
+            piece, skip = piece[cut:], skip - cut
+        if remaining is not None:
+            piece = piece[:remaining]
+            remaining -= len(piece)
+        return piece
+
+    try:
+        async for chunk in chunks:
+            pieces = decoder.feed(chunk)
+            while True:
+                start = time.perf_counter()
+                with span("decompress", bytes=len(chunk)):
+                    if len(chunk) > _INLINE_CPU_MAX:
+                        piece = await asyncio.to_thread(next, pieces, None)
+                    else:
+                        piece = next(pieces, None)
+                spent += time.perf_counter() - start
+                if piece is None:
+                    break
+                piece = window(piece)
+                if piece:
+                    yield piece
+                if remaining == 0:
+                    return
+        piece = window(decoder.flush())
+        if piece:
+            yield piece
+    finally:
+        _DECOMPRESS.observe(spent)
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def _iter_spool(f: BinaryIO) -> AsyncIterator[bytes]:
+    f.seek(0)
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _codec_name(codec: Optional[Codec]) -> Optional[str]:
+    return codec.name if codec is not None else None
+
+
+async def _decode(meta: BlobMeta, data: bytes) -> bytes:
+    if not meta.codec:
+        return data
+    return await _cpu(get_codec(meta.codec).decompress, data, "decompress")
+
+
+async def _discard_copy(storage: AsyncStoragePort, key: str) -> None:
+    try:
+        await storage.delete(key)
+    except NotFound:
+        pass
+
+
+def _content_key(checksum: str) -> str:
+    return f"sha256/{checksum}"
+
+
+class _ContentGone(AppError):
+    """The content a new blob refers to was deleted before the blob was
+    committed."""
+
+
+# Saves whose content is deleted under them start over this many times.
+_CONTENT_ATTEMPTS = 3
+# Content at refcount zero is having its bytes deleted. A save waits this
+# long for that to finish before it finishes the delete itself, in case
+# whoever released the last reference died.
+_DELETE_WAIT = 10.0
+_DELETE_POLL = 0.05
+
+# Deduplicated streams are spooled (to disk past this size) until their
+# hash is known, so content that is already stored is never re-uploaded.
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
 class BlobService:
     def __init__(
         self,
-        storage: StoragePort,
-        meta_repo: MetadataRepository,
+        storage: AsyncStoragePort,
+        meta_repo: AsyncMetadataRepository,
         backend_name: str,
         uow=None,
+        dedup: bool = False,
+        batch_concurrency: int = 1,
+        codec: Optional[Codec] = None,
+        storages: Optional[Callable[[str], AsyncStoragePort]] = None,
+        tracker: Optional[AccessTracker] = None,
+        ingest: Optional[IngestQueue] = None,
     ):
         self.storage = storage
         self.meta = meta_repo
         self.backend = backend_name
         self.uow = uow
+        self.dedup = dedup
+        self.batch_concurrency = max(batch_concurrency, 1)
+        self.codec = codec
+        # Reads go to the backend recorded with the blob, which differs from
+        # the one new blobs are written to once blobs move between tiers.
+        self.storages = storages
+        self.tracker = tracker
+        # Streamed uploads are staged and answered before they reach the
+        # backend; until then the blob reads from the staging area.
+        self.ingest = ingest
+        self._metas: Dict[str, BlobMeta] = {}
+        # Batch items run concurrently but share one session, and items with
+        # equal content must not race to upload it.
+        self._session_lock = asyncio.Lock()
+        self._content_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def _storage_of(self, meta: BlobMeta) -> AsyncStoragePort:
+        if meta.status != "COMMITTED" and self.ingest is not None:
+            return self.ingest.staging
+        if meta.backend == self.backend or self.storages is None:
+            storage = self.storage
+        else:
+            storage = self.storages(meta.backend)
+        # Caches key the bytes by version, so a copy cached before the id was
+        # deleted and re-created (maybe by another process) is never served.
+        versioned = getattr(storage, "versioned", None)
+        if versioned is None:
+            return storage
+        return versioned(f"{meta.checksum}:{meta.codec or ''}")
 
-    def save(self, blob_id: str, b64: str) -> dict:
-        if self.meta.exists(blob_id):
-            raise Conflict(f"Blob '{blob_id}' already exists")
+    def _read(self, meta: BlobMeta) -> AsyncStoragePort:
+        if self.tracker is not None:
+            self.tracker.hit(meta)
+        return self._storage_of(meta)
 
-        raw = _decode_base64(b64)
-        checksum = hashlib.sha256(raw).hexdigest()
+    async def _reading(
+        self, meta: BlobMeta, call: Callable[[AsyncStoragePort], Awaitable[Any]]
+    ) -> Any:
+        """``call`` on the storage holding ``meta``'s bytes, following a
+        staged blob to the backend if it was committed in the meantime."""
+        try:
+            return await call(self._read(meta))
+        except NotFound:
+            if meta.status == "COMMITTED" or self.ingest is None:
+                raise
+        # The request's session would answer from its identity map.
+        async with self.ingest.repo_scope() as repo:
+            fresh = await repo.get(meta.id)
+        if fresh is None or fresh.status != "COMMITTED":
+            raise NotFound(f"Blob '{meta.id}' not found")
+        self._metas[meta.id] = fresh
+        return await call(self._storage_of(fresh))
+
+    @traced("BlobService.save")
+    async def save(self, blob_id: str, b64: str) -> dict:
+        # No existence check up front: the backend creates objects exclusively
+        # and the metadata insert is arbitrated by the primary key.
 
-        size, created_at_val = self.storage.save(blob_id, raw)
+        # Decoding and hashing large payloads is CPU-bound; keep it off the loop.
+        raw, checksum = await asyncio.to_thread(_decode_and_hash, b64)
+        size = len(raw)
+        codec = await self._pick_codec(raw)
+
+        if self.dedup:
+            created_at = await self._save_deduped(
+                blob_id, size, checksum, codec, lambda k: self._store(k, raw, codec)
+            )
+        else:
+            _stored, created_at_val = await self._store(blob_id, raw, codec)
+            created_at = _to_datetime(created_at_val)
+            await self._commit_meta(
+                blob_id, size, created_at, checksum, codec=_codec_name(codec)
+            )
+
+        return {
+            "id": blob_id,
+            "data": b64,
+            "size": size,
+            "created_at": _iso(created_at),
+        }
+
+    @traced("BlobService.save_stream")
+    async def save_stream(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int] = None
+    ) -> dict:
+        if self.ingest is not None:
+            return await self._save_stream_staged(blob_id, chunks, size)
+        if self.dedup:
+            return await self._save_stream_dedup(blob_id, chunks)
+
+        digest, source, codec = await self._encode_stream(chunks)
+        if codec is not None:
+            size = None
+        _stored, created_at_val = await self.storage.save_stream(blob_id, source, size)
+        _HASH.observe(digest.seconds)
         created_at = _to_datetime(created_at_val)
+        await self._commit_meta(
+            blob_id,
+            digest.size,
+            created_at,
+            digest.sha.hexdigest(),
+            codec=_codec_name(codec),
+        )
+
+        return {"id": blob_id, "size": digest.size, "created_at": _iso(created_at)}
+
+    async def _encode_stream(
+        self, chunks: AsyncIterable[bytes]
+    ) -> Tuple[_Digest, AsyncIterator[bytes], Optional[Codec]]:
+        """The stream to store, compressed if the configured codec pays off
+        on its first bytes, and the digest of the original bytes."""
+        digest = _Digest()
+        source = digest.tap(chunks)
+        codec = None
+        if self.codec is not None:
+            head, source = await _peek(source, SAMPLE_SIZE)
+            codec = await self._pick_codec(head)
+        if codec is not None:
+            source = _compress_stream(codec, source)
+        return digest, source, codec
+
+    async def _save_stream_staged(
+        self, blob_id: str, chunks: AsyncIterable[bytes], size: Optional[int]
+    ) -> dict:
+        await self.ingest.begin(blob_id)
+        try:
+            digest, source, codec = await self._encode_stream(chunks)
+            if codec is not None:
+                size = None
+            _stored, created_at_val = await self.ingest.staging.save_stream(
+                blob_id, source, size
+            )
+            _HASH.observe(digest.seconds)
+            created_at = _to_datetime(created_at_val)
+            await self.ingest.staged(
+                BlobMeta(
+                    id=blob_id,
+                    size=digest.size,
+                    created_at=created_at,
+                    backend=self.backend,
+                    checksum=digest.sha.hexdigest(),
+                    codec=_codec_name(codec),
+                    status="PENDING",
+                )
+            )
+        except BaseException:
+            await self.ingest.abandon(blob_id)
+            raise
+        return {
+            "id": blob_id,
+            "size": digest.size,
+            "created_at": _iso(created_at),
+            "status": "PENDING",
+        }
+
+    async def save_base64_stream(
+        self, blob_id: str, pieces: AsyncIterable[bytes]
+    ) -> dict:
+        """``save`` for base64 text that arrives in pieces: it is decoded
+        block by block into ``save_stream`` instead of being held whole."""
+        return await self.save_stream(blob_id, _decode_base64_stream(pieces))
+
+    async def _save_stream_dedup(
+        self, blob_id: str, chunks: AsyncIterable[bytes]
+    ) -> dict:
+        digest = _Digest()
+        head = b""
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE) as spool:
+            async for chunk in digest.tap(chunks):
+                spool.write(chunk)
+                if len(head) < SAMPLE_SIZE:
+                    head += chunk[: SAMPLE_SIZE - len(head)]
+            _HASH.observe(digest.seconds)
+            size, checksum = digest.size, digest.sha.hexdigest()
+            codec = await self._pick_codec(head)
+
+            async def upload(key: str) -> Tuple[int, Any]:
+                if codec is None:
+                    return await self.storage.save_stream(key, _iter_spool(spool), size)
+                packed = _compress_stream(codec, _iter_spool(spool))
+                return await self.storage.save_stream(key, packed)
+
+            created_at = await self._save_deduped(blob_id, size, checksum, codec, upload)
+        return {"id": blob_id, "size": size, "created_at": _iso(created_at)}
+
+    async def _pick_codec(self, sample: bytes) -> Optional[Codec]:
+        """The configured codec, unless a sample shows the data won't shrink."""
+        if self.codec is None:
+            return None
+        if await _cpu(self.codec.compresses, sample[:SAMPLE_SIZE]):
+            return self.codec
+        return None
+
+    async def _store(
+        self, key: str, raw: bytes, codec: Optional[Codec]
+    ) -> Tuple[int, Any]:
+        if codec is not None:
+            raw = await _cpu(codec.compress, raw, "compress")
+        return await self.storage.save(key, raw)
+
+    async def _save_deduped(
+        self, blob_id: str, size: int, checksum: str, codec: Optional[Codec], upload
+    ) -> datetime:
+        for attempt in range(_CONTENT_ATTEMPTS):
+            key, uploaded, found, created_at_val, codec_name = await self._save_content(
+                checksum, codec, upload
+            )
+            created_at = _to_datetime(created_at_val)
+            try:
+                await self._commit_meta(
+                    blob_id, size, created_at, checksum, key, uploaded, codec_name, found
+                )
+                return created_at
+            except _ContentGone:
+                if attempt == _CONTENT_ATTEMPTS - 1:
+                    raise
+
+    async def _save_content(
+        self, checksum: str, codec: Optional[Codec], upload
+    ) -> Tuple[str, bool, bool, Any, Optional[str]]:
+        """Store content once per hash; returns (key, uploaded, found,
+        created_at, codec of the stored bytes). The reference to it is taken
+        when the blob is committed."""
+        key = _content_key(checksum)
+        async with self._content_locks[checksum]:
+            stored = await self._live_content(key, checksum)
+            if stored is not None:
+                return key, False, True, _utc_now(), stored[1]
+            try:
+                _size, created_at_val = await upload(key)
+                uploaded = True
+            except Conflict:
+                # Left behind by a failed save, or a concurrent upload of the
+                # same bytes won the race; either way the content is in place,
+                # encoded the way this configuration would encode it.
+                created_at_val, uploaded = _utc_now(), False
+        return key, uploaded, False, created_at_val, _codec_name(codec)
+
+    async def _live_content(
+        self, key: str, checksum: str
+    ) -> Optional[Tuple[int, Optional[str]]]:
+        """The stored content's (refcount, codec), after any delete of it that
+        is under way has finished."""
+        deadline = time.monotonic() + _DELETE_WAIT
+        while True:
+            async with self._session_lock:
+                stored = await self.meta.find_content(self.backend, checksum)
+            if stored is None or stored[0] > 0:
+                return stored
+            if time.monotonic() >= deadline:
+                await _discard_copy(self.storage, key)
+                async with self._session_lock:
+                    await self._in_uow(
+                        lambda: self.meta.drop_content(self.backend, checksum)
+                    )
+                return None
+            await asyncio.sleep(_DELETE_POLL)
+
+    async def _reference(self, meta: BlobMeta, found: bool) -> bool:
+        if found:
+            return await self.meta.acquire_content(
+                meta.backend, meta.checksum, meta.codec
+            )
+        return await self.meta.add_content(
+            meta.backend, meta.checksum, meta.size, meta.codec
+        )
+
+    async def _in_uow(self, write: Callable[[], Awaitable[Any]]) -> Any:
+        """``write()``, committed on its own when there is a unit of work."""
+        if not self.uow:
+            return await write()
+        async with self.uow:
+            try:
+                result = await write()
+                await self.uow.commit()
+            except Exception:
+                await self.uow.rollback()
+                raise
+        return result
+
+    @traced("BlobService.save_many")
+    async def save_many(self, items: Sequence[Tuple[str, str]]) -> List[dict]:
+        """Create several blobs; every item gets its own result or error."""
+        results: List[Optional[dict]] = [None] * len(items)
+        existing = await self.meta.existing_ids([blob_id for blob_id, _ in items])
+        todo: List[int] = []
+        seen = set()
+        for i, (blob_id, _b64) in enumerate(items):
+            if blob_id in existing or blob_id in seen:
+                results[i] = _item_error(
+                    blob_id, Conflict(f"Blob '{blob_id}' already exists")
+                )
+            else:
+                seen.add(blob_id)
+                todo.append(i)
+
+        decoded = await asyncio.to_thread(_decode_many, [items[i][1] for i in todo])
+        slots = asyncio.Semaphore(self.batch_concurrency)
+
+        async def store(
+            blob_id: str, raw: bytes, checksum: str
+        ) -> Tuple[BlobMeta, bool, bool]:
+            async with slots:
+                codec = await self._pick_codec(raw)
+                if self.dedup:
+                    key, uploaded, found, created_at_val, codec_name = (
+                        await self._save_content(
+                            checksum, codec, lambda k: self._store(k, raw, codec)
+                        )
+                    )
+                else:
+                    key, uploaded, found, codec_name = None, True, False, _codec_name(codec)
+                    _size, created_at_val = await self._store(blob_id, raw, codec)
+            meta = BlobMeta(
+                id=blob_id,
+                size=len(raw),
+                created_at=_to_datetime(created_at_val),
+                backend=self.backend,
+                checksum=checksum,
+                content_ref=key,
+                codec=codec_name,
+            )
+            return meta, uploaded, found
+
+        pending: Dict[int, Tuple[bytes, str]] = {}
+        for i, outcome in zip(todo, decoded):
+            if isinstance(outcome, AppError):
+                results[i] = _item_error(items[i][0], outcome)
+            else:
+                pending[i] = outcome
+
+        # Items whose content was deleted before they committed start over.
+        for _attempt in range(_CONTENT_ATTEMPTS):
+            if not pending:
+                break
+            stored = await asyncio.gather(
+                *(store(items[i][0], *pending[i]) for i in pending),
+                return_exceptions=True,
+            )
+            written: Dict[int, Tuple[BlobMeta, bool, bool]] = {}
+            for i, outcome in zip(list(pending), stored):
+                if isinstance(outcome, Exception):
+                    results[i] = _item_error(items[i][0], outcome)
+                elif isinstance(outcome, BaseException):
+                    raise outcome
+                else:
+                    written[i] = outcome
+
+            conflicts, gone = await self._commit_many(list(written.values()))
+            for i, (meta, _uploaded, _found) in written.items():
+                if meta.id in gone:
+                    continue
+                if meta.id in conflicts:
+                    results[i] = _item_error(
+                        meta.id, Conflict(f"Blob '{meta.id}' already exists")
+                    )
+                else:
+                    results[i] = {
+                        "id": meta.id,
+                        "status": 201,
+                        "size": meta.size,
+                        "created_at": _iso(meta.created_at),
+                    }
+            pending = {i: v for i, v in pending.items() if results[i] is None}
+        for i in pending:
+            blob_id = items[i][0]
+            results[i] = _item_error(
+                blob_id,
+                _ContentGone(f"Content of blob '{blob_id}' was deleted while it was saved"),
+            )
+        return results
+
+    async def _commit_many(
+        self, written: List[Tuple[BlobMeta, bool, bool]]
+    ) -> Tuple[set, set]:
+        """Returns the ids that already existed and those whose content was
+        deleted meanwhile; neither is stored."""
+        if not written:
+            return set(), set()
+        gone = set()
+
+        async def _write() -> set:
+            conflicts = await self.meta.create_many([m for m, _, _ in written])
+            for meta, _uploaded, found in written:
+                if meta.content_ref is None or meta.id in conflicts:
+                    continue
+                if not await self._reference(meta, found):
+                    await self.meta.delete(meta.id)
+                    gone.add(meta.id)
+            return conflicts
+
+        async def _discard(ids) -> None:
+            # Content bytes stay: other saves may have found them in place.
+            for meta, uploaded, _found in written:
+                if uploaded and meta.content_ref is None and meta.id in ids:
+                    try:
+                        await self.storage.delete(meta.id)
+                    except Exception:
+                        pass
+
+        try:
+            conflicts = await self._in_uow(_write)
+        except Exception:
+            await _discard({m.id for m, _, _ in written})
+            raise
+        await _discard(conflicts)
+        return conflicts, gone
+
+    @traced("BlobService.get_many")
+    async def get_many(self, blob_ids: Sequence[str]) -> List[dict]:
+        metas = await self.meta.get_many(blob_ids)
+        slots = asyncio.Semaphore(self.batch_concurrency)
 
+        async def fetch(meta: BlobMeta) -> dict:
+            async with slots:
+                data, _size, _created_at_val = await self._reading(
+                    meta, lambda s: s.get(meta.content_ref or meta.id)
+                )
+            data = await _decode(meta, data)
+            encoded = await _cpu(base64.b64encode, data, "encode")
+            return {
+                "id": meta.id,
+                "status": 200,
+                "data": encoded.decode("ascii"),
+                "size": len(data),
+                "created_at": _iso(meta.created_at),
+            }
+
+        async def one(blob_id: str) -> dict:
+            meta = metas.get(blob_id)
+            if meta is None:
+                return _item_error(blob_id, NotFound(f"Blob '{blob_id}' not found"))
+            try:
+                return await fetch(meta)
+            except Exception as exc:
+                return _item_error(blob_id, exc)
+
+        return list(await asyncio.gather(*(one(blob_id) for blob_id in blob_ids)))
+
+    async def _commit_meta(
+        self,
+        blob_id: str,
+        size: int,
+        created_at: datetime,
+        checksum: str,
+        content_ref: Optional[str] = None,
+        uploaded: bool = True,
+        codec: Optional[str] = None,
+        found: bool = False,
+    ) -> None:
         meta = BlobMeta(
             id=blob_id,
             size=size,
             created_at=created_at,
             backend=self.backend,
             checksum=checksum,
+            content_ref=content_ref,
+            codec=codec,
         )
 
-        def _write_meta() -> None:
-            self.meta.create(meta)
+        async def _write_meta() -> None:
+            if content_ref is not None and not await self._reference(meta, found):
+                raise _ContentGone(
+                    f"Content of blob '{blob_id}' was deleted while it was saved"
+                )
+            await self.meta.create(meta)
 
-        if self.uow:
-            with self.uow:
-                try:
-                    _write_meta()
-                    self.uow.commit()
-                except Exception:
-                    self.uow.rollback()
-                    try:
-                        self.storage.delete(blob_id)
-                    except Exception:
-                        pass
-                    raise
-        else:
-            try:
-                _write_meta()
-            except Exception:
+        try:
+            await self._in_uow(_write_meta)
+        except Exception:
+            # Content bytes stay: other saves may have found them in place.
+            if uploaded and content_ref is None:
                 try:
-                    self.storage.delete(blob_id)
+                    await self.storage.delete(blob_id)
                 except Exception:
                     pass
-                raise
+            raise
 
-        return {
-            "id": blob_id,
-            "data": b64,
-            "size": size,
-            "created_at": created_at.replace(microsecond=0)
-            .isoformat()
-            .replace("+00:00", "Z"),
-        }
+    async def _lookup(self, blob_id: str) -> BlobMeta:
+        meta = self._metas.get(blob_id)
+        if meta is None:
+            meta = await self.meta.get(blob_id)
+            if not meta or not meta.checksum:
+                # No checksum yet: a journaled upload still being staged.
+                raise NotFound(f"Blob '{blob_id}' not found")
+            self._metas[blob_id] = meta
+        return meta
+
+    @traced("BlobService.delete")
+    async def delete(self, blob_id: str) -> None:
+        meta = await self._lookup(blob_id)
+        self._metas.pop(blob_id, None)
+
+        async def _forget() -> bool:
+            await self.meta.delete(blob_id)
+            if meta.content_ref is None:
+                return True
+            return await self.meta.release_content(meta.backend, meta.checksum)
 
-    def get(self, blob_id: str) -> dict:
-        meta = self.meta.get(blob_id)
-        if not meta:
-            raise NotFound(f"Blob '{blob_id}' not found")
-        data, size, _created_at_val = self.storage.get(blob_id)
+        if not await self._in_uow(_forget):
+            return
+        # The bytes go once the committed metadata no longer points at them,
+        # so no transaction stays open across the backend call.
+        storage = self._storage_of(meta)
+        if meta.status != "COMMITTED" and self.ingest is not None:
+            # Staged, and maybe uploaded by now.
+            await _discard_copy(self.ingest.staging, blob_id)
+            await _discard_copy(self.ingest.storage, blob_id)
+        elif meta.content_ref is None:
+            await _discard_copy(storage, blob_id)
+        else:
+            await _discard_copy(storage, meta.content_ref)
+            await self._in_uow(
+                lambda: self.meta.drop_content(meta.backend, meta.checksum)
+            )
+
+    @traced("BlobService.get")
+    async def get(self, blob_id: str) -> dict:
+        meta = await self._lookup(blob_id)
+        data, _size, _created_at_val = await self._reading(
+            meta, lambda s: s.get(meta.content_ref or blob_id)
+        )
+        data = await _decode(meta, data)
+        with timed(_ENCODE, "encode", bytes=len(data)):
+            encoded = await asyncio.to_thread(base64.b64encode, data)
         return {
             "id": blob_id,
-            "data": base64.b64encode(data).decode("ascii"),
-            "size": size,
-            "created_at": meta.created_at.replace(microsecond=0)
-            .isoformat()
-            .replace("+00:00", "Z"),
+            "data": encoded.decode("ascii"),
+            "size": len(data),
+            "created_at": _iso(meta.created_at),
         }
+
+    def list_page(
+        self,
+        order_by: str,
+        limit: int,
+        after: Optional[Tuple[Any, ...]] = None,
+        prefix: Optional[str] = None,
+        backend: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+    ) -> AsyncIterator[BlobMeta]:
+        if created_after is not None:
+            created_after = _to_datetime(created_after)
+        return self.meta.iter_page(
+            order_by, limit, after, prefix, backend, created_after
+        )
+
+    async def lookup(self, blob_id: str) -> BlobMeta:
+        """Metadata only; never touches the storage backend."""
+        return await self._lookup(blob_id)
+
+    async def stat(self, blob_id: str) -> dict:
+        meta = await self._lookup(blob_id)
+        return {"id": blob_id, "size": meta.size, "created_at": _iso(meta.created_at)}
+
+    async def open_file(self, blob_id: str) -> Optional[Tuple[BinaryIO, str, int, Any]]:
+        """Open file handle for backends that keep blobs as local files."""
+        meta = await self._lookup(blob_id)
+        open_file = getattr(self._storage_of(meta), "open_file", None)
+        if open_file is None or meta.codec:
+            # Compressed files have to be decoded on the way out.
+            return None
+        try:
+            opened = await open_file(meta.content_ref or blob_id)
+        except NotFound:
+            if meta.status == "COMMITTED":
+                raise
+            # Unstaged since: the caller falls back to read_stream.
+            return None
+        if opened is not None and self.tracker is not None:
+            self.tracker.hit(meta)
+        return opened
+
+    @traced("BlobService.read_stream")
+    async def read_stream(
+        self, blob_id: str, offset: int = 0, length: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        meta = await self._lookup(blob_id)
+        key = meta.content_ref or blob_id
+        if meta.codec:
+            # Compressed bytes can't be addressed by original offsets: decode
+            # from the start and cut the requested span out of the output.
+            chunks, _size, _created_at_val = await self._reading(
+                meta, lambda s: s.get_stream(key)
+            )
+            return _decompress_stream(get_codec(meta.codec), chunks, offset, length)
+        chunks, _size, _created_at_val = await self._reading(
+            meta, lambda s: s.get_stream(key, offset, length)
+        )
+        return chunks
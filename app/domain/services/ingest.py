@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Set
+
+from app.domain.ports.metadata_repo import BlobMeta
+from app.domain.ports.storage import AsyncStoragePort
+from app.domain.services.tiering import RepoScope
+from app.infra.errors import Conflict, NotFound
+from app.infra.metrics import INGEST_QUEUE, INGEST_UPLOADS
+
+logger = logging.getLogger(__name__)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _discard(storage: AsyncStoragePort, blob_id: str) -> None:
+    try:
+        await storage.delete(blob_id)
+    except NotFound:
+        pass
+
+
+class IngestQueue:
+    """Write-behind uploads to a remote backend.
+
+    An upload is journaled as a PENDING metadata row before its bytes are
+    staged in ``staging`` (a local, fsync'ing store), and the client is
+    answered once they are. ``workers`` uploaders then copy staged blobs to
+    ``storage`` and mark them COMMITTED. A failed upload is retried once its
+    lease runs out, ``retry_backoff`` doubling per attempt, and the blob is
+    marked FAILED after ``max_attempts``; its staged copy is kept. PENDING
+    rows whose lease ran out, including those of a process that died, are
+    picked up by a sweep every ``poll_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        staging: AsyncStoragePort,
+        storage: AsyncStoragePort,
+        repo_scope: RepoScope,
+        backend: str,
+        workers: int = 4,
+        max_attempts: int = 5,
+        retry_backoff: float = 1.0,
+        lease: float = 600.0,
+        poll_interval: float = 5.0,
+    ):
+        self.staging = staging
+        self.storage = storage
+        self.repo_scope = repo_scope
+        self.backend = backend
+        self.workers = max(workers, 1)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._queued: Set[str] = set()
+        self._closing = False
+        INGEST_QUEUE.labels().set_function(lambda: len(self._queued))
+
+    def start(self) -> None:
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def aclose(self) -> None:
+        """Stop the uploaders and release the uploads this process holds, so
+        the next sweep (here or elsewhere) resumes them right away."""
+        held = list(self._queued)
+        # A cancellation that lands in a database call can come back out as
+        # the session's cleanup error; the loops check this flag as well.
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = asyncio.Queue()
+        self._queued.clear()
+        if held:
+            async with self.repo_scope() as repo:
+                for blob_id in held:
+                    await repo.finish_ingest(blob_id, "PENDING")
+
+    async def begin(self, blob_id: str) -> None:
+        """Journal a new upload; raises Conflict when the id is taken."""
+        now = _utc_now()
+        async with self.repo_scope() as repo:
+            await repo.create(
+                BlobMeta(
+                    id=blob_id,
+                    size=0,
+                    created_at=now,
+                    backend=self.backend,
+                    checksum="",
+                    status="PENDING",
+                )
+            )
+            await repo.claim_pending(blob_id, now, now + timedelta(seconds=self.lease))
+        # Only the journal row claims the id: anything staged under it is
+        # left over from an upload that never got that far.
+        await _discard(self.staging, blob_id)
+
+    async def abandon(self, blob_id: str) -> None:
+        """Drop an upload that failed before it was staged."""
+        async with self.repo_scope() as repo:
+            await repo.delete(blob_id)
+        await _discard(self.staging, blob_id)
+
+    async def staged(self, meta: BlobMeta) -> None:
+        async with self.repo_scope() as repo:
+            found = await repo.set_staged(meta)
+        if not found:
+            raise NotFound(f"Blob '{meta.id}' not found")
+        self._enqueue(meta.id)
+
+    def _enqueue(self, blob_id: str) -> None:
+        if blob_id not in self._queued:
+            self._queued.add(blob_id)
+            self._queue.put_nowait(blob_id)
+
+    async def _work(self) -> None:
+        while not self._closing:
+            blob_id = await self._queue.get()
+            try:
+                await self.upload(blob_id)
+            except Exception:
+                logger.exception("Uploading blob '%s' failed", blob_id)
+            finally:
+                self._queued.discard(blob_id)
+
+    async def _sweep(self) -> None:
+        while not self._closing:
+            try:
+                await self.recover()
+            except Exception:
+                logger.exception("Scanning for pending uploads failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def recover(self) -> None:
+        """Claim PENDING uploads nobody holds and queue them."""
+        now = _utc_now()
+        until = now + timedelta(seconds=self.lease)
+        async with self.repo_scope() as repo:
+            ids = await repo.pending_ids(now, 100)
+            claimed = [b for b in ids if await repo.claim_pending(b, now, until)]
+        for blob_id in claimed:
+            self._enqueue(blob_id)
+
+    async def upload(self, blob_id: str) -> None:
+        """Copy one staged blob to the backend; the caller holds its lease."""
+        try:
+            await self._copy(blob_id)
+        except NotFound:
+            await self._unstaged(blob_id)
+            return
+        except Exception:
+            logger.warning("Uploading blob '%s' failed", blob_id, exc_info=True)
+            await self._retry(blob_id)
+            return
+
+        async with self.repo_scope() as repo:
+            committed = await repo.finish_ingest(blob_id, "COMMITTED")
+            gone = not committed and await repo.get(blob_id) is None
+        if gone:
+            # Deleted while it was being uploaded.
+            await _discard(self.storage, blob_id)
+        INGEST_UPLOADS.labels("committed").inc()
+        await _discard(self.staging, blob_id)
+
+    async def _unstaged(self, blob_id: str) -> None:
+        async with self.repo_scope() as repo:
+            meta = await repo.get(blob_id)
+            if meta is not None and not meta.checksum:
+                # The process died while the upload was being staged, before
+                # the client got an answer: the id is free again.
+                await repo.delete(blob_id)
+                return
+            await repo.finish_ingest(blob_id, "FAILED")
+        INGEST_UPLOADS.labels("failed").inc()
+        logger.error("Staged copy of blob '%s' is missing", blob_id)
+
+    async def _copy(self, blob_id: str) -> None:
+        chunks, size, _created_at = await self.staging.get_stream(blob_id)
+        try:
+            await self.storage.save_stream(blob_id, chunks, size)
+        except Conflict:
+            # Left by an attempt that didn't get to commit; the lease is ours.
+            await self.storage.delete(blob_id)
+            chunks, size, _created_at = await self.staging.get_stream(blob_id)
+            await self.storage.save_stream(blob_id, chunks, size)
+
+    async def _retry(self, blob_id: str) -> None:
+        async with self.repo_scope() as repo:
+            attempts = await repo.add_attempt(blob_id)
+            if attempts is None:
+                return
+            if attempts >= self.max_attempts:
+                await repo.finish_ingest(blob_id, "FAILED")
+                INGEST_UPLOADS.labels("failed").inc()
+                logger.error("Giving up uploading blob '%s'", blob_id)
+                return
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            # Still PENDING: the sweep picks it up once this lease runs out.
+            await repo.finish_ingest(
+                blob_id, "PENDING", _utc_now() + timedelta(seconds=delay)
+            )
+        INGEST_UPLOADS.labels("retried").inc()
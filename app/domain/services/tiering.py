@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import (
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Mapping,
+    Tuple,
+)
+
+from app.domain.ports.metadata_repo import AsyncMetadataRepository, BlobMeta
+from app.domain.ports.storage import AsyncStoragePort
+from app.infra.errors import Conflict, NotFound
+from app.infra.metrics import TIER_BYTES, TIER_MOVES
+
+logger = logging.getLogger(__name__)
+
+RepoScope = Callable[[], AsyncContextManager[AsyncMetadataRepository]]
+
+
+class AccessTracker:
+    """Per-process read log.
+
+    Read times are kept in memory and written back in batches by the
+    migrator. Reads of blobs on a cold tier are also counted: ``promote_reads``
+    of them within ``promote_window`` seconds queue the blob for promotion.
+    """
+
+    def __init__(self, hot: str, promote_reads: int, promote_window: float):
+        self.hot = hot
+        self.promote_reads = promote_reads
+        self.promote_window = promote_window
+        self._hits: Dict[str, Tuple[datetime, int]] = {}
+        self._cold_reads: Dict[str, Tuple[float, int]] = {}
+        self._promote: Dict[str, str] = {}
+        self.wakeup = asyncio.Event()
+
+    def hit(self, meta: BlobMeta) -> None:
+        _at, n = self._hits.get(meta.id, (None, 0))
+        self._hits[meta.id] = (datetime.now(timezone.utc), n + 1)
+        if meta.backend == self.hot or meta.content_ref or self.promote_reads <= 0:
+            return
+        now = time.monotonic()
+        start, n = self._cold_reads.get(meta.id, (now, 0))
+        if now - start > self.promote_window:
+            start, n = now, 0
+        if n + 1 < self.promote_reads:
+            self._cold_reads[meta.id] = (start, n + 1)
+            return
+        self._cold_reads.pop(meta.id, None)
+        self._promote[meta.id] = meta.backend
+        self.wakeup.set()
+
+    def take_hits(self) -> Dict[str, Tuple[datetime, int]]:
+        hits, self._hits = self._hits, {}
+        return hits
+
+    def take_promotions(self) -> Dict[str, str]:
+        """Blob ids to promote, with the tier they were read from."""
+        promote, self._promote = self._promote, {}
+        horizon = time.monotonic() - self.promote_window
+        self._cold_reads = {
+            k: v for k, v in self._cold_reads.items() if v[0] >= horizon
+        }
+        return promote
+
+
+class _Pacer:
+    """Spreads copied bytes evenly at ``rate`` bytes/s across all workers."""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    async def take(self, n: int) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(self._next, now)
+        self._next = start + n / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class TierMigrator:
+    """Moves blobs between the hot tier and the cold tier in the background.
+
+    Each round writes back the tracked reads, promotes blobs that were read
+    repeatedly on the cold tier and demotes hot blobs not read for
+    ``cold_after`` seconds, ``batch`` at a time with ``concurrency`` copies in
+    flight. A move leases the metadata row, copies the stored bytes, points
+    the row at the new tier and removes the old copy ``delete_grace`` seconds
+    later, when reads that resolved the old location are done with it. The
+    removal is scheduled in the metadata database, so it survives restarts.
+    """
+
+    def __init__(
+        self,
+        storages: Mapping[str, AsyncStoragePort],
+        repo_scope: RepoScope,
+        tracker: AccessTracker,
+        hot: str,
+        cold: str,
+        cold_after: float,
+        interval: float = 60.0,
+        batch: int = 100,
+        concurrency: int = 2,
+        bytes_per_sec: int = 0,
+        delete_grace: float = 60.0,
+        lease: float = 600.0,
+    ):
+        self.storages = storages
+        self.repo_scope = repo_scope
+        self.tracker = tracker
+        self.hot = hot
+        self.cold = cold
+        self.cold_after = cold_after
+        self.interval = interval
+        self.batch = batch
+        self.lease = lease
+        self.delete_grace = delete_grace
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+        self._pacer = _Pacer(bytes_per_sec)
+        # Rounds run one at a time, whether from run() or called directly.
+        self._round = asyncio.Lock()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Tier migration round failed")
+            try:
+                await asyncio.wait_for(self.tracker.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.tracker.wakeup.clear()
+
+    async def run_once(self) -> None:
+        async with self._round:
+            await self.flush()
+            await self._purge()
+            promote = self.tracker.take_promotions()
+            now = datetime.now(timezone.utc)
+            async with self.repo_scope() as repo:
+                idle = await repo.idle_ids(
+                    self.hot, now - timedelta(seconds=self.cold_after), self.batch
+                )
+            moves = [
+                self.move(k, src, self.hot)
+                for k, src in promote.items()
+                if src in self.storages
+            ]
+            moves += [self.move(k, self.hot, self.cold) for k in idle]
+            await asyncio.gather(*moves)
+
+    async def flush(self) -> None:
+        hits = self.tracker.take_hits()
+        if hits:
+            async with self.repo_scope() as repo:
+                await repo.record_access(hits)
+
+    async def close(self) -> None:
+        """Write back pending reads and remove the old copies that are due;
+        the others are removed after the next start."""
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Writing back blob reads failed")
+        try:
+            await self._purge()
+        except Exception:
+            logger.exception("Removing moved blobs failed")
+
+    async def move(self, blob_id: str, src: str, dst: str) -> bool:
+        """Move one blob from tier ``src`` to ``dst``; False when it was not
+        (or no longer) on ``src`` or another migrator holds it."""
+        direction = "promote" if dst == self.hot else "demote"
+        async with self._slots:
+            try:
+                moved = await self._copy(blob_id, src, dst, direction)
+            except Exception:
+                TIER_MOVES.labels(direction, "error").inc()
+                logger.exception("Moving blob '%s' from %s to %s failed", blob_id, src, dst)
+                async with self.repo_scope() as repo:
+                    await repo.finish_move(blob_id, src, None)
+                return False
+        TIER_MOVES.labels(direction, "ok" if moved else "skipped").inc()
+        return moved
+
+    async def _copy(self, blob_id: str, src: str, dst: str, direction: str) -> bool:
+        now = datetime.now(timezone.utc)
+        async with self.repo_scope() as repo:
+            claimed = await repo.claim_move(
+                blob_id, src, now, now + timedelta(seconds=self.lease)
+            )
+        if not claimed:
+            return False
+        source, target = self.storages[src], self.storages[dst]
+        for attempt in range(2):
+            chunks, size, _created_at = await source.get_stream(blob_id)
+            try:
+                await target.save_stream(blob_id, self._paced(chunks, direction), size)
+                break
+            except Conflict:
+                if attempt:
+                    raise
+                # Left behind by a move that never finished: we hold the
+                # lease, so the copy on the target is stale.
+                await target.delete(blob_id)
+
+        # Promoted blobs start their idle period over.
+        accessed_at = now if direction == "promote" else None
+        purge_at = datetime.now(timezone.utc) + timedelta(seconds=self.delete_grace)
+        async with self.repo_scope() as repo:
+            moved = await repo.finish_move(blob_id, src, dst, accessed_at, purge_at)
+        if not moved:
+            # Deleted while we were copying.
+            await _discard(target, blob_id)
+            return False
+        return True
+
+    async def _paced(
+        self, chunks: AsyncIterator[bytes], direction: str
+    ) -> AsyncIterator[bytes]:
+        moved = TIER_BYTES.labels(direction)
+        try:
+            async for chunk in chunks:
+                await self._pacer.take(len(chunk))
+                moved.inc(len(chunk))
+                yield chunk
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def _purge(self) -> None:
+        now = datetime.now(timezone.utc)
+        async with self.repo_scope() as repo:
+            due = await repo.due_purges(now, self.batch)
+        for backend, blob_id in due:
+            if backend not in self.storages:
+                continue
+            # The lease keeps a move back to ``backend`` from copying the blob
+            # there while the old copy is being removed.
+            async with self.repo_scope() as repo:
+                claimed = await repo.claim_purge(
+                    backend, blob_id, now, now + timedelta(seconds=self.lease)
+                )
+            if not claimed:
+                continue
+            removed = False
+            try:
+                await _discard(self.storages[backend], blob_id)
+                removed = True
+            except Exception:
+                logger.exception("Removing moved blob '%s' from %s failed", blob_id, backend)
+            async with self.repo_scope() as repo:
+                await repo.finish_purge(backend, blob_id, removed)
+
+
+async def _discard(storage: AsyncStoragePort, blob_id: str) -> None:
+    try:
+        await storage.delete(blob_id)
+    except NotFound:
+        pass
+
@@ -0,0 +1,246 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Keys known to be too large to cache, so reads skip straight to the backend.
+_OVERSIZE_KEYS = 4096
+
+
+@dataclass
+class CacheEntry:
+    data: bytes
+    created_at: datetime
+
+
+class BlobCache:
+    """Byte-budgeted LRU over immutable blobs, with an optional disk tier.
+
+    Everything except file I/O runs on the event loop, so the indexes need
+    no locking. Entries are never updated in place: keys name one version
+    of a blob, and deletes invalidate.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_item_bytes: int,
+        disk_path: str = "",
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._oversize: "OrderedDict[str, None]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped by every invalidation; a fill that started before one does
+        # not store its result, so a delete can't be undone by a slow read.
+        self.epoch = 0
+
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.disk_max_bytes = disk_max_bytes
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        if self.disk_path is not None:
+            self._load_disk_index()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def _load_disk_index(self) -> None:
+        self.disk_path.mkdir(parents=True, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.disk_path):
+            if not entry.is_file():
+                continue
+            if ".tmp." in entry.name:
+                os.unlink(entry.path)
+                continue
+            st = entry.stat()
+            files.append((st.st_mtime, entry.name, st.st_size))
+        for _mtime, name, size in sorted(files):
+            self._disk[name] = size
+            self._disk_bytes += size
+        for name in self._evict_disk():
+            self._disk_unlink(name)
+
+    @staticmethod
+    def _disk_name(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        name = self._disk_name(key)
+        if name in self._disk:
+            try:
+                entry = await asyncio.to_thread(self._disk_read, name)
+            except FileNotFoundError:
+                self._disk_forget(name)
+            else:
+                self._disk.move_to_end(name)
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, entry)
+                return entry
+
+        self.misses += 1
+        return None
+
+    async def put(
+        self, key: str, data: bytes, created_at: datetime, epoch: Optional[int] = None
+    ) -> CacheEntry:
+        entry = CacheEntry(data, created_at)
+        if epoch is not None and epoch != self.epoch:
+            return entry
+        if len(data) > self.max_item_bytes:
+            self.mark_oversize(key)
+            return entry
+        self._remember(key, entry)
+        if self.disk_path is not None and len(data) <= self.disk_max_bytes:
+            name = self._disk_name(key)
+            epoch = self.epoch
+            await asyncio.to_thread(self._disk_write, name, entry)
+            if epoch != self.epoch:
+                await asyncio.to_thread(self._disk_unlink, name)
+                return entry
+            if name not in self._disk:
+                self._disk[name] = len(data)
+                self._disk_bytes += len(data)
+            evicted = self._evict_disk()
+            if evicted:
+                await asyncio.to_thread(self._disk_unlink, *evicted)
+        return entry
+
+    async def invalidate(self, key: str) -> None:
+        self.epoch += 1
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.data)
+        self._oversize.pop(key, None)
+        name = self._disk_name(key)
+        if name in self._disk:
+            self._disk_forget(name)
+            await asyncio.to_thread(self._disk_unlink, name)
+
+    def mark_oversize(self, key: str) -> None:
+        self._oversize[key] = None
+        self._oversize.move_to_end(key)
+        while len(self._oversize) > _OVERSIZE_KEYS:
+            self._oversize.popitem(last=False)
+
+    def is_oversize(self, key: str) -> bool:
+        return key in self._oversize
+
+    async def single_flight(
+        self, key: str, loader: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Run ``loader`` once for concurrent callers of the same key."""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leader was cancelled (its client went away); load again.
+                return await self.single_flight(key, loader)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as exc:
+            fut.set_exception(exc)
+            fut.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        else:
+            fut.set_result(result)
+        finally:
+            del self._inflight[key]
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "items": len(self._memory),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "disk_items": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes if self.disk_path else 0,
+        }
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.data)
+        self._memory[key] = entry
+        self._bytes += len(entry.data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= len(evicted.data)
+            self.evictions += 1
+
+    def _evict_disk(self) -> List[str]:
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            name = next(iter(self._disk))
+            self._disk_forget(name)
+            self.disk_evictions += 1
+            evicted.append(name)
+        return evicted
+
+    def _disk_forget(self, name: str) -> None:
+        self._disk_bytes -= self._disk.pop(name)
+
+    def _disk_read(self, name: str) -> CacheEntry:
+        p = self.disk_path / name
+        with open(p, "rb") as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+        return CacheEntry(data, datetime.fromtimestamp(mtime, tz=timezone.utc))
+
+    def _disk_write(self, name: str, entry: CacheEntry) -> None:
+        # Entries are a cache, so no fsync: a torn file after a crash is
+        # only possible for the tmp name, which is never indexed.
+        tmp = self.disk_path / f"{name}.tmp.{uuid.uuid4().hex}"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(entry.data)
+            ts = entry.created_at.timestamp()
+            os.utime(tmp, (ts, ts))
+            os.replace(tmp, self.disk_path / name)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def _disk_unlink(self, *names: str) -> None:
+        for name in names:
+            (self.disk_path / name).unlink(missing_ok=True)
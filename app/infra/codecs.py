@@ -0,0 +1,111 @@
+from __future__ import annotations
+import zlib
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+# Compressing this much of a payload tells whether the rest is worth it.
+SAMPLE_SIZE = 64 * 1024
+# Samples that shrink less than this are stored as they are.
+_MAX_RATIO = 0.9
+_MIN_SIZE = 512
+# Bounds what one decode step can expand to.
+_DECODE_OUT = 1024 * 1024
+_ZSTD_DECODE_IN = 16 * 1024
+
+
+class Codec:
+    def __init__(
+        self,
+        name: str,
+        compressor: Callable[[], Any],
+        decoder: Callable[[], "Decoder"],
+    ):
+        self.name = name
+        self.compressor = compressor
+        self.decoder = decoder
+
+    def compress(self, data: bytes) -> bytes:
+        c = self.compressor()
+        return c.compress(data) + c.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        d = self.decoder()
+        return b"".join((*d.feed(data), d.flush()))
+
+    def compresses(self, sample: bytes) -> bool:
+        if len(sample) < _MIN_SIZE:
+            return False
+        return len(self.compress(sample)) <= len(sample) * _MAX_RATIO
+
+
+class Decoder:
+    """Incremental decompression that yields bounded pieces, so a small,
+    highly compressed chunk cannot expand into one huge buffer."""
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _ZlibDecoder(Decoder):
+    def __init__(self):
+        self._d = zlib.decompressobj()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            out = self._d.decompress(data, _DECODE_OUT)
+            data = self._d.unconsumed_tail
+            if out:
+                yield out
+
+    def flush(self) -> bytes:
+        return self._d.flush()
+
+
+class _ZstdDecoder(Decoder):
+    def __init__(self, zstandard):
+        self._d = zstandard.ZstdDecompressor().decompressobj()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        # The zstandard decompressobj has no output limit; small input
+        # slices keep each step bounded instead.
+        view = memoryview(data)
+        for i in range(0, len(view), _ZSTD_DECODE_IN):
+            out = self._d.decompress(view[i : i + _ZSTD_DECODE_IN])
+            if out:
+                yield out
+
+
+def _zlib(level: int) -> Codec:
+    return Codec("zlib", lambda: zlib.compressobj(level), _ZlibDecoder)
+
+
+def _zstd(level: int) -> Codec:
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("The zstd codec needs the 'zstandard' package") from None
+    # A ZstdCompressor holds one context; each stream needs its own.
+    return Codec(
+        "zstd",
+        lambda: zstandard.ZstdCompressor(level=level).compressobj(),
+        lambda: _ZstdDecoder(zstandard),
+    )
+
+
+_CODECS = {"zlib": _zlib, "zstd": _zstd}
+
+
+@lru_cache(maxsize=None)
+def get_codec(name: str, level: int = 3) -> Optional[Codec]:
+    """Codec by name; ``""`` or ``"none"`` means no compression. The level
+    only matters for writing."""
+    name = name.lower()
+    if name in ("", "none"):
+        return None
+    try:
+        return _CODECS[name](level)
+    except KeyError:
+        raise ValueError(f"Unsupported codec: {name!r}") from None
@@ -1,14 +1,231 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import asyncio
+import re
+import sqlite3
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.util import await_only
+
+from app.infra.metrics import DB_POOL
+from app.infra.settings import Settings, get_settings
+from app.infra.tracing import end_span, start_span
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def make_engine(database_url: str):
-    return create_engine(database_url, pool_pre_ping=True)
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    driver = _ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        return database_url
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _is_memory(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _sqlite_pragmas(engine, settings: Settings) -> None:
+    # WAL lets readers run alongside the writer; with synchronous=NORMAL a
+    # commit appends to the WAL without an fsync, which only moves to
+    # checkpoints. busy_timeout covers writers in other processes.
+    memory = _is_memory(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        if settings.sqlite_wal and not memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout * 1000)}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_kb}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_bytes}")
+        cursor.close()
+
+
+_SQLITE_WRITES = re.compile(
+    r"\s*(INSERT|UPDATE|DELETE|REPLACE|SAVEPOINT|CREATE|DROP|ALTER)\b", re.I
+)
+
+
+def _sqlite_transactions(
+    engine, writer: Optional[asyncio.Lock] = None, busy_timeout: float = 5.0
+) -> None:
+    # The sqlite3 driver only opens a transaction before DML, so a SAVEPOINT
+    # issued first becomes the outermost transaction and its RELEASE commits.
+    # Take over transaction control (see the SQLAlchemy "Serializable
+    # isolation / Savepoints" notes for pysqlite): the first write or
+    # SAVEPOINT of a transaction emits BEGIN IMMEDIATE, and reads before it
+    # run in autocommit as the driver itself would run them.
+    # Taking the write lock up front means a transaction never has to
+    # upgrade a read snapshot, which SQLite refuses once another writer has
+    # committed. With ``writer`` set, in-process writers also queue on that
+    # lock instead of polling SQLite's busy handler. Either lock is held until
+    # the transaction ends, so writes commit before anything slow, such as a
+    # call to a remote backend, is awaited.
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.info["sqlite_tx"] = "deferred"
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("sqlite_tx") != "deferred":
+            return
+        if not _SQLITE_WRITES.match(statement):
+            return
+        if writer is not None:
+            try:
+                await_only(asyncio.wait_for(writer.acquire(), busy_timeout))
+            except asyncio.TimeoutError:
+                raise sqlite3.OperationalError("database is locked") from None
+            conn.info["sqlite_writer"] = writer
+        conn.info["sqlite_tx"] = "immediate"
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            _end(conn)
+            raise
+
+    @event.listens_for(engine, "commit")
+    @event.listens_for(engine, "rollback")
+    def _end(conn):
+        # Fires just before COMMIT/ROLLBACK is sent; a writer let in now
+        # waits out that last statement in busy_timeout.
+        conn.info.pop("sqlite_tx", None)
+        lock = conn.info.pop("sqlite_writer", None)
+        if lock is not None:
+            lock.release()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(_dbapi_connection, record):
+        # A connection given back mid-transaction (e.g. garbage collected).
+        record.info.pop("sqlite_tx", None)
+        lock = record.info.pop("sqlite_writer", None)
+        if lock is not None:
+            lock.release()
+
+
+def _pool_options(url, settings: Settings) -> dict:
+    if url.get_backend_name() == "sqlite":
+        if _is_memory(url):
+            return {}
+        # Local file: a stale connection isn't a thing, so no pre-ping.
+        return {
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+        }
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if url.get_driver_name() == "asyncpg":
+        # asyncpg prepares every statement server-side; keep them per connection.
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size
+        }
+    return options
+
+
+def _ping_stale(engine, idle: float) -> None:
+    """Pre-ping only connections that sat idle in the pool for ``idle``
+    seconds; recently used ones are trusted."""
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(_dbapi_connection, record):
+        record.info["returned_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, _proxy):
+        returned_at = record.info.get("returned_at")
+        if returned_at is None or time.monotonic() - returned_at < idle:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as exc:
+            # The pool discards this connection and checks out another.
+            raise DisconnectionError() from exc
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+def make_async_engine(database_url: str, settings: Optional[Settings] = None):
+    settings = settings or get_settings()
+    url = make_url(async_database_url(database_url))
+    engine = create_async_engine(url, **_pool_options(url, settings))
+    sync_engine = engine.sync_engine
+    if url.get_backend_name() == "sqlite":
+        _sqlite_pragmas(sync_engine, settings)
+        writer = asyncio.Lock() if settings.sqlite_single_writer else None
+        _sqlite_transactions(sync_engine, writer, settings.sqlite_busy_timeout)
+    else:
+        _ping_stale(sync_engine, settings.db_ping_idle)
+    return engine
+
+
+def track_pool(engine) -> None:
+    """Report the engine's connection pool on the ``db_pool_connections``
+    gauge; pools without checkout accounting (e.g. NullPool) are skipped."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL.labels("checked_out").set_function(pool.checkedout)
+        DB_POOL.labels("idle").set_function(pool.checkedin)
+
+
+def trace_queries(engine) -> None:
+    """Trace each statement the engine executes as a ``db.query`` span."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._trace_span = start_span(
+                "db.query",
+                **{"db.system": sync_engine.dialect.name, "db.statement": statement},
+            )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            end_span(span)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            context._trace_span = None
+            end_span(span, exception_context.original_exception)
 
 
-def make_session_factory(engine):
-    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+def make_async_session_factory(engine):
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
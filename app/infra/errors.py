@@ -1,10 +1,13 @@
 from fastapi import status
 from fastapi.responses import JSONResponse
 
+from app.infra.metrics import ERRORS
+
 
 class AppError(Exception):
     code = "app_error"
     http_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+    headers: dict | None = None
 
     def __init__(self, message: str):
         super().__init__(message)
@@ -26,7 +29,19 @@ class Conflict(AppError):
     http_status = status.HTTP_409_CONFLICT
 
 
+class RangeNotSatisfiable(AppError):
+    code = "range_not_satisfiable"
+    http_status = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+    def __init__(self, message: str, size: int):
+        super().__init__(message)
+        self.headers = {"Content-Range": f"bytes */{size}"}
+
+
 def app_error_handler(_, exc: AppError):
+    ERRORS.labels(exc.code).inc()
     return JSONResponse(
-        status_code=exc.http_status, content={"error": exc.code, "message": exc.message}
+        status_code=exc.http_status,
+        content={"error": exc.code, "message": exc.message},
+        headers=exc.headers,
     )
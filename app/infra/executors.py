@@ -0,0 +1,30 @@
+from __future__ import annotations
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """Dedicated, named thread pool for a blocking backend.
+
+    Each blocking backend gets its own pool so a slow one (FTP) can only
+    exhaust its own workers, never the event loop's default executor.
+    """
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"{name}-io"
+            )
+        return executor
+
+
+def shutdown_executors() -> None:
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
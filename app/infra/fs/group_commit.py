@@ -0,0 +1,202 @@
+from __future__ import annotations
+import ctypes
+import errno
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+def _load_syncfs():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        fn = ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int]
+    return fn
+
+
+_syncfs = _load_syncfs()
+# The file's data and size are enough to read it back after a crash.
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _sync_filesystem(fd: int) -> None:
+    if _syncfs(fd) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_NO_LINKS = {errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV}
+
+
+def publish(tmp: Path, final: Path) -> None:
+    """Move ``tmp`` to ``final``, raising FileExistsError if ``final`` exists.
+
+    Unlike ``rename``, ``link`` refuses to replace an existing target, so two
+    writers of one path cannot both succeed.
+    """
+    try:
+        os.link(tmp, final)
+    except OSError as exc:
+        if exc.errno not in _NO_LINKS:
+            raise
+        # Filesystems without hard links: the check and the rename race.
+        if final.exists():
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(final))
+        os.replace(tmp, final)
+        return
+    os.unlink(tmp)
+
+
+@dataclass
+class _Commit:
+    fd: int
+    tmp: Path
+    final: Path
+    finished: bool = False
+    error: Optional[BaseException] = None
+
+
+class GroupCommitter:
+    """Makes concurrent file writes durable together.
+
+    Writers hand over a written (not yet synced) temp file and block. One of
+    them becomes the leader, waits ``window`` seconds for others to join,
+    then makes the whole batch durable at once: an fdatasync per file and
+    one fsync per touched directory.
+
+    With ``use_syncfs`` (Linux only) the batch instead costs two ``syncfs``
+    calls, before and after the renames, however many files it holds. But
+    ``syncfs`` writes back every dirty page of the filesystem, including
+    the metadata database, staging and cache directories or anything else
+    on a shared volume, so it only pays off when the blob root has a
+    filesystem to itself.
+    """
+
+    def __init__(self, window: float, use_syncfs: bool = False):
+        self.window = window
+        self.use_syncfs = use_syncfs and _syncfs is not None
+        self._cond = threading.Condition()
+        self._pending: List[_Commit] = []
+        self._leading = False
+        self.batches = 0
+
+    def commit(self, fd: int, tmp: Path, final: Path) -> None:
+        req = _Commit(fd, tmp, final)
+        with self._cond:
+            self._pending.append(req)
+            while self._leading and not req.finished:
+                self._cond.wait()
+            if not req.finished:
+                self._leading = True
+        if not req.finished:
+            try:
+                if self.window:
+                    time.sleep(self.window)
+                with self._cond:
+                    batch, self._pending = self._pending, []
+                self._flush(batch)
+            finally:
+                with self._cond:
+                    self._leading = False
+                    self._cond.notify_all()
+        if req.error is not None:
+            raise req.error
+
+    def _flush(self, batch: List[_Commit]) -> None:
+        self.batches += 1
+        try:
+            if self.use_syncfs:
+                self._flush_syncfs(batch)
+            else:
+                self._flush_fsync(batch)
+        finally:
+            for req in batch:
+                req.finished = True
+
+    def _flush_syncfs(self, batch: List[_Commit]) -> None:
+        try:
+            _sync_filesystem(batch[0].fd)
+        except OSError as exc:
+            for req in batch:
+                req.error = exc
+            return
+        renamed = []
+        for req in batch:
+            try:
+                publish(req.tmp, req.final)
+                renamed.append(req)
+            except OSError as exc:
+                req.error = exc
+        if renamed:
+            try:
+                _sync_filesystem(renamed[0].fd)
+            except OSError as exc:
+                for req in renamed:
+                    req.error = exc
+
+    def _flush_fsync(self, batch: List[_Commit]) -> None:
+        dirs: Dict[Path, List[_Commit]] = {}
+        for req in batch:
+            try:
+                _fdatasync(req.fd)
+                publish(req.tmp, req.final)
+                dirs.setdefault(req.final.parent, []).append(req)
+            except OSError as exc:
+                req.error = exc
+        for d, reqs in dirs.items():
+            try:
+                fsync_dir(d)
+            except OSError as exc:
+                for req in reqs:
+                    req.error = exc
+
+
+_committers: Dict[str, GroupCommitter] = {}
+_known_dirs: Set[Path] = set()
+_lock = threading.Lock()
+
+
+def get_group_committer(
+    root: str, window: float, use_syncfs: bool = False
+) -> GroupCommitter:
+    key = os.path.abspath(root)
+    with _lock:
+        committer = _committers.get(key)
+        if committer is None:
+            committer = _committers[key] = GroupCommitter(window, use_syncfs)
+        return committer
+
+
+def ensure_dir(path: Path) -> None:
+    """Create ``path`` durably: every new directory entry is synced in its
+    parent. Directories already created by this process are skipped."""
+    if path in _known_dirs:
+        return
+    missing = []
+    p = path
+    while not p.exists():
+        missing.append(p)
+        p = p.parent
+    path.mkdir(parents=True, exist_ok=True)
+    for created in reversed(missing):
+        fsync_dir(created.parent)
+    _known_dirs.add(path)
+
+
+def forget_dir(path: Path) -> None:
+    _known_dirs.discard(path)
@@ -0,0 +1,104 @@
+"""Move a flat ``root/<blob_id>`` tree into the sharded layout.
+
+    python -m app.infra.fs.migrate [ROOT] [--dry-run]
+
+Safe to re-run: files already in ``root/data`` are left alone, and each
+move is a same-filesystem rename. Blobs whose ids start with ``data/``
+share that directory; they are told apart from sharded files by their
+path. A blob called ``data`` is first renamed out of the way, since the
+sharded tree needs its name.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from pathlib import Path
+from typing import Tuple
+
+from app.adapters.storage.local_fs import shard_path
+from app.infra.fs.group_commit import ensure_dir, fsync_dir
+
+_HASH = re.compile(r"[0-9a-f]{64}")
+_SHARD = re.compile(r"[0-9a-f]{2}")
+# Temp files of interrupted writes; ids may contain ".tmp." themselves.
+_TEMP = re.compile(r".+\.tmp\.[0-9a-f]{32}")
+# Where a blob called "data" waits while the sharded tree takes its name.
+_DATA_ASIDE = "data.tmp." + "0" * 32
+
+
+def _is_sharded(parts: Tuple[str, ...]) -> bool:
+    if len(parts) != 4 or parts[0] != "data" or not _HASH.fullmatch(parts[3]):
+        return False
+    return parts[1:3] == (parts[3][:2], parts[3][2:4])
+
+
+def _is_shard_dir(parts: Tuple[str, ...]) -> bool:
+    return (
+        parts[:1] == ("data",)
+        and len(parts) <= 3
+        and all(_SHARD.fullmatch(p) for p in parts[1:])
+    )
+
+
+def _move(root: Path, src: Path, blob_id: str, dry_run: bool) -> bool:
+    dst = shard_path(root, blob_id)
+    if dst.exists():
+        print(f"skip {blob_id}: already present in {root / 'data'}")
+        return False
+    print(f"{blob_id} -> {dst.relative_to(root)}")
+    if not dry_run:
+        ensure_dir(dst.parent)
+        os.replace(src, dst)
+        fsync_dir(dst.parent)
+    return True
+
+
+def migrate(root: Path, dry_run: bool = False) -> int:
+    moved = 0
+    legacy_data, aside = root / "data", root / _DATA_ASIDE
+    if legacy_data.is_file() and not dry_run:
+        os.replace(legacy_data, aside)
+        fsync_dir(root)
+    if aside.is_file():
+        moved += _move(root, aside, "data", dry_run)
+
+    for dirpath, _dirnames, filenames in os.walk(root):
+        current = Path(dirpath)
+        for name in filenames:
+            if _TEMP.fullmatch(name):
+                continue
+            src = current / name
+            rel = src.relative_to(root)
+            if _is_sharded(rel.parts):
+                continue
+            moved += _move(root, src, rel.as_posix(), dry_run)
+
+    if not dry_run:
+        for dirpath, _dirnames, _filenames in os.walk(root, topdown=False):
+            current = Path(dirpath)
+            if current != root and not _is_shard_dir(current.relative_to(root).parts):
+                try:
+                    current.rmdir()
+                except OSError:
+                    pass
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("root", nargs="?", default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    root = args.root
+    if root is None:
+        from app.infra.settings import get_settings
+
+        root = get_settings().fs_base_path
+    moved = migrate(Path(root), args.dry_run)
+    print(f"{'would move' if args.dry_run else 'moved'} {moved} blob(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from __future__ import annotations
+import threading, time
+from contextlib import contextmanager
+from ftplib import FTP, Error as FtpError, error_perm
+from typing import Callable, Iterator, List, Set, Tuple
+
+
+def close_quietly(ftp: FTP) -> None:
+    try:
+        ftp.quit()
+    except Exception:
+        try:
+            ftp.close()
+        except Exception:
+            pass
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """True when the control connection can no longer be trusted.
+
+    Covers dropped sockets (broken pipe, reset, timeout, EOF) and server-side
+    ``421`` shutdowns; plain ``5xx`` replies leave the session usable.
+    """
+    if isinstance(exc, (OSError, EOFError)):
+        return True
+    if isinstance(exc, FtpError) and not isinstance(exc, error_perm):
+        return True
+    return False
+
+
+class PoolExhausted(RuntimeError):
+    pass
+
+
+class FtpConnectionPool:
+    """Bounded, thread-safe pool of logged-in FTP/FTPS sessions.
+
+    Up to ``min_size`` idle sessions are kept warm with ``NOOP`` every
+    ``keepalive`` seconds; extra idle sessions are closed on the same tick.
+    Sessions idle for longer than ``keepalive`` are health-checked on
+    checkout. ``known_dirs`` caches directories already created on the
+    server so repeat writes skip ``MKD``.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], FTP],
+        min_size: int = 1,
+        max_size: int = 8,
+        keepalive: float = 30.0,
+        checkout_timeout: float = 10.0,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("FTP pool sizes must satisfy 0 <= min <= max, max >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.keepalive = keepalive
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: List[Tuple[FTP, float]] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.known_dirs: Set[str] = set()
+
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+        if keepalive > 0:
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name="ftp-pool-keepalive", daemon=True
+            )
+            self._keepalive_thread.start()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def acquire(self) -> FTP:
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhausted("FTP pool is closed")
+                if self._idle:
+                    ftp, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    ftp, last_used = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted("Timed out waiting for an FTP connection")
+                self._cond.wait(remaining)
+
+        if ftp is not None and time.monotonic() - last_used < self.keepalive:
+            return ftp
+        if ftp is not None:
+            try:
+                ftp.voidcmd("NOOP")
+                return ftp
+            except Exception:
+                close_quietly(ftp)
+
+        try:
+            return self._connect()
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, ftp: FTP) -> None:
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                close_quietly(ftp)
+                return
+            self._idle.append((ftp, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, ftp: FTP) -> None:
+        close_quietly(ftp)
+        self._forget()
+
+    def _forget(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[FTP]:
+        ftp = self.acquire()
+        try:
+            yield ftp
+        except BaseException as e:
+            if is_connection_error(e):
+                self.discard(ftp)
+            else:
+                self.release(ftp)
+            raise
+        else:
+            self.release(ftp)
+
+    def _keepalive_loop(self) -> None:
+        while not self._stop.wait(self.keepalive):
+            self.ping_idle()
+
+    def ping_idle(self) -> None:
+        # Sessions are checked out one at a time while pinged, so the rest
+        # stay available and a close() meanwhile is seen by release().
+        with self._cond:
+            surplus = max(len(self._idle) - self.min_size, 0)
+            extra, self._idle = self._idle[:surplus], self._idle[surplus:]
+            warm = list(self._idle)
+        for ftp, _ in extra:
+            self.discard(ftp)
+        for entry in warm:
+            with self._cond:
+                if entry not in self._idle:
+                    continue  # checked out meanwhile
+                self._idle.remove(entry)
+            ftp = entry[0]
+            try:
+                ftp.voidcmd("NOOP")
+            except Exception:
+                self.discard(ftp)
+                continue
+            self.release(ftp)
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for ftp, _ in idle:
+            close_quietly(ftp)
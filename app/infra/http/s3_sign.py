@@ -1,17 +1,27 @@
 from __future__ import annotations
 import datetime, hashlib, hmac
-from urllib.parse import urlparse, quote
-from typing import Dict, Tuple
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlparse, quote
+from typing import Dict, Optional, Tuple
+
+from app.infra.tracing import traced
 
 _ALGO = "AWS4-HMAC-SHA256"
+_CHUNK_ALGO = "AWS4-HMAC-SHA256-PAYLOAD"
+STREAMING_PAYLOAD = "STREAMING-AWS4-HMAC-SHA256-PAYLOAD"
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+# "<hex size>;chunk-signature=<64 hex>\r\n" ... "\r\n"
+_CHUNK_OVERHEAD = len(";chunk-signature=") + 64 + 2 + 2
 
 
 def sha256_hex(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
-def _amz_dates(region: str, service: str = "s3") -> Tuple[str, str, str]:
-    now = datetime.datetime.utcnow()
+def _amz_dates(
+    region: str, service: str = "s3", now: Optional[datetime.datetime] = None
+) -> Tuple[str, str, str]:
+    now = now or datetime.datetime.utcnow()
     amz_date = now.strftime("%Y%m%dT%H%M%SZ")
     datestamp = now.strftime("%Y%m%d")
     scope = f"{datestamp}/{region}/{service}/aws4_request"
@@ -24,6 +34,13 @@ def _canonical_uri(path: str) -> str:
     return quote(path, safe="/-_.~")
 
 
+def _canonical_query(query: str) -> str:
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    return "&".join(
+        f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in params
+    )
+
+
 def _canonical_headers(headers: Dict[str, str]) -> Tuple[str, str]:
     items = [
         (k.lower().strip(), " ".join(v.strip().split())) for k, v in headers.items()
@@ -36,6 +53,9 @@ def _hmac(key: bytes, msg: str) -> bytes:
     return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
 
 
+# The derived key only changes once per day per region, so it is cached
+# instead of re-running the four HMAC steps on every request.
+@lru_cache(maxsize=64)
 def _signing_key(
     secret: str, datestamp: str, region: str, service: str = "s3"
 ) -> bytes:
@@ -45,20 +65,21 @@ def _signing_key(
     return hmac.new(k_service, b"aws4_request", hashlib.sha256).digest()
 
 
-def sign_v4(
+def _sign(
     method: str,
     url: str,
     region: str,
     access_key: str,
     secret_key: str,
-    session_token: str = "",
-    extra_headers: Dict[str, str] | None = None,
-    payload_hash: str = "UNSIGNED-PAYLOAD",
-) -> Dict[str, str]:
+    session_token: str,
+    extra_headers: Dict[str, str] | None,
+    payload_hash: str,
+    now: Optional[datetime.datetime],
+) -> Tuple[Dict[str, str], "ChunkSigner"]:
     extra_headers = extra_headers or {}
     u = urlparse(url)
     host = u.netloc
-    amz_date, datestamp, scope = _amz_dates(region)
+    amz_date, datestamp, scope = _amz_dates(region, now=now)
 
     headers = {
         "host": host,
@@ -73,7 +94,7 @@ def sign_v4(
         [
             method.upper(),
             _canonical_uri(u.path or "/"),
-            "",
+            _canonical_query(u.query),
             *_canonical_headers(headers),
             payload_hash,
         ]
@@ -98,4 +119,102 @@ def sign_v4(
         f"SignedHeaders={_canonical_headers(headers)[1]}, "
         f"Signature={signature}"
     )
+    return headers, ChunkSigner(signing_key, amz_date, scope, signature)
+
+
+@traced("s3.sign_v4")
+def sign_v4(
+    method: str,
+    url: str,
+    region: str,
+    access_key: str,
+    secret_key: str,
+    session_token: str = "",
+    extra_headers: Dict[str, str] | None = None,
+    payload_hash: str = "UNSIGNED-PAYLOAD",
+    now: Optional[datetime.datetime] = None,
+) -> Dict[str, str]:
+    headers, _ = _sign(
+        method,
+        url,
+        region,
+        access_key,
+        secret_key,
+        session_token,
+        extra_headers,
+        payload_hash,
+        now,
+    )
     return headers
+
+
+class ChunkSigner:
+    """Frames and signs an ``aws-chunked`` body one chunk at a time.
+
+    Each chunk signature chains off the previous one, starting from the
+    seed signature of the request headers; the body ends with a signed
+    zero-length chunk.
+    """
+
+    def __init__(self, signing_key: bytes, amz_date: str, scope: str, seed: str):
+        self._key = signing_key
+        self._prefix = f"{_CHUNK_ALGO}\n{amz_date}\n{scope}\n"
+        self.previous = seed
+
+    def frame(self, chunk: bytes) -> bytes:
+        string_to_sign = (
+            f"{self._prefix}{self.previous}\n{_EMPTY_SHA256}\n{sha256_hex(chunk)}"
+        )
+        self.previous = hmac.new(
+            self._key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        header = f"{len(chunk):x};chunk-signature={self.previous}\r\n".encode()
+        return b"".join((header, chunk, b"\r\n"))
+
+
+def aws_chunked_length(decoded_length: int, chunk_size: int) -> int:
+    """Encoded body length for ``decoded_length`` bytes framed in
+    ``chunk_size`` chunks (the last one may be short), plus the final
+    zero-length chunk."""
+    full, rest = divmod(decoded_length, chunk_size)
+    total = full * (len(f"{chunk_size:x}") + _CHUNK_OVERHEAD + chunk_size)
+    if rest:
+        total += len(f"{rest:x}") + _CHUNK_OVERHEAD + rest
+    return total + 1 + _CHUNK_OVERHEAD
+
+
+@traced("s3.sign_v4_streaming")
+def sign_v4_streaming(
+    method: str,
+    url: str,
+    region: str,
+    access_key: str,
+    secret_key: str,
+    decoded_length: int,
+    chunk_size: int,
+    session_token: str = "",
+    extra_headers: Dict[str, str] | None = None,
+    now: Optional[datetime.datetime] = None,
+) -> Tuple[Dict[str, str], ChunkSigner]:
+    """Sign the headers of a ``STREAMING-AWS4-HMAC-SHA256-PAYLOAD`` upload.
+
+    The body does not need to be hashed up front: pass each
+    ``chunk_size`` chunk through the returned signer as it is sent.
+    """
+    headers = {
+        "content-encoding": "aws-chunked",
+        "x-amz-decoded-content-length": str(decoded_length),
+        "content-length": str(aws_chunked_length(decoded_length, chunk_size)),
+        **(extra_headers or {}),
+    }
+    return _sign(
+        method,
+        url,
+        region,
+        access_key,
+        secret_key,
+        session_token,
+        headers,
+        STREAMING_PAYLOAD,
+        now,
+    )
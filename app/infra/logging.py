@@ -1,12 +1,22 @@
 import logging, sys
 
+from app.infra.tracing import current_trace_id
+
+
+class _TraceFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
 
 def configure_logging() -> None:
     handler = logging.StreamHandler(sys.stdout)
     fmt = logging.Formatter(
-        '{"level":"%(levelname)s","ts":"%(asctime)s","logger":"%(name)s","msg":"%(message)s"}'
+        '{"level":"%(levelname)s","ts":"%(asctime)s","logger":"%(name)s",'
+        '"trace_id":"%(trace_id)s","msg":"%(message)s"}'
     )
     handler.setFormatter(fmt)
+    handler.addFilter(_TraceFilter())
     root = logging.getLogger()
     root.setLevel(logging.INFO)
     root.handlers.clear()
@@ -0,0 +1,282 @@
+"""Process-wide metrics in the Prometheus text exposition format.
+
+A small registry with the parts of the ``prometheus_client`` API used here
+(``labels``, ``inc``, ``observe``, ``set_function``). Updates are a dict
+lookup and a short locked section, so the instrumentation stays on under
+full load.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; fine enough at the low end for per-stage CPU work.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional["Registry"] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self, values: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("fn",)
+
+    def __init__(self):
+        self.fn: Callable[[], float] = lambda: 0.0
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        self.fn = fn
+
+
+class Gauge(_Metric):
+    """Gauges read at scrape time from a callback per label set."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_num(child.fn())}"]
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional["Registry"] = None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            le = f'le="{_num(bound)}"'
+            lines.append(
+                f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}"
+            )
+        labels = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_num(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response, per route template.",
+    ("method", "route", "status"),
+)
+HTTP_BYTES = Counter(
+    "http_bytes_total",
+    "Request and response body bytes, per route template.",
+    ("route", "direction"),
+)
+STAGE_SECONDS = Histogram(
+    "blob_stage_duration_seconds",
+    "Time spent per BlobService stage and request (decode, hash, compress, "
+    "decompress, encode, meta_read, meta_write).",
+    ("stage",),
+)
+STORAGE_SECONDS = Histogram(
+    "storage_call_duration_seconds",
+    "Storage adapter call latency.",
+    ("backend", "operation"),
+)
+STORAGE_BYTES = Counter(
+    "storage_bytes_total",
+    "Bytes written to and read from the storage backend.",
+    ("backend", "direction"),
+)
+ERRORS = Counter(
+    "app_errors_total",
+    "Errors answered to clients, by AppError code.",
+    ("code",),
+)
+DB_POOL = Gauge(
+    "db_pool_connections",
+    "SQLAlchemy engine pool connections by state.",
+    ("state",),
+)
+S3_POOL = Gauge(
+    "s3_http_connections",
+    "Connections held by S3 httpx clients by state.",
+    ("state",),
+)
+FTP_POOL = Gauge(
+    "ftp_pool_connections",
+    "FTP sessions held by the connection pools by state.",
+    ("state",),
+)
+TIER_MOVES = Counter(
+    "tier_moves_total",
+    "Blobs moved between storage tiers, by direction (demote, promote) and result.",
+    ("direction", "result"),
+)
+TIER_BYTES = Counter(
+    "tier_moved_bytes_total",
+    "Stored bytes copied between storage tiers.",
+    ("direction",),
+)
+MIRROR_HEDGES = Counter(
+    "mirror_hedged_reads_total",
+    "Mirrored reads sent to a second replica because this one was past its deadline.",
+    ("backend",),
+)
+MIRROR_REPAIRS = Counter(
+    "mirror_repairs_total",
+    "Missing replicas copied from another replica, by result.",
+    ("backend", "result"),
+)
+INGEST_UPLOADS = Counter(
+    "ingest_uploads_total",
+    "Write-behind uploads to the backend, by result (committed, retried, failed).",
+    ("result",),
+)
+INGEST_QUEUE = Gauge(
+    "ingest_queued_blobs",
+    "Staged blobs queued for upload in this process.",
+)
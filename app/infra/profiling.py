@@ -0,0 +1,83 @@
+"""Sampling profiler for single requests.
+
+Samples stacks at a fixed interval and aggregates them as collapsed stacks
+("folded" format: ``frame;frame;frame count`` per line), which
+flamegraph.pl, speedscope and inferno render as flame graphs.
+
+On the event loop's thread only the profiled request is sampled: the task
+that entered the sampler and, on Python 3.12+, the tasks started from it
+(they inherit its context). Other threads are sampled whole, because blocking backends and CPU
+stages run off the loop and their work can't be told apart by request;
+under concurrent load those samples include other requests' work.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_SAMPLER: ContextVar[Optional["Sampler"]] = ContextVar("profiling_sampler", default=None)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "Sampler":
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.current_task()
+        self._token = _SAMPLER.set(self)
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        _SAMPLER.reset(self._token)
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join)
+
+    def _profiled(self) -> bool:
+        """Whether the loop is running one of the profiled tasks."""
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            return False
+        if task is self._task:
+            return True
+        # Task.get_context() is new in 3.12.
+        get_context = getattr(task, "get_context", None)
+        return get_context is not None and get_context().get(_SAMPLER) is self
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident == self._loop_thread and not self._profiled():
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -1,7 +1,8 @@
 from __future__ import annotations
 from datetime import datetime, timezone
+from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, LargeBinary, DateTime
+from sqlalchemy import BigInteger, ForeignKey, Integer, String, LargeBinary, DateTime
 
 from app.infra.db import Base
 
@@ -11,9 +12,23 @@ def _utcnow():
 
 
 class BlobDataModel(Base):
+    """Blob header. New blobs keep their bytes in ``blob_chunks``; ``data``
+    only holds blobs written before chunking existed (``chunk_size`` NULL)."""
+
     __tablename__ = "blob_data"
     id: Mapped[str] = mapped_column(String(512), primary_key=True)
-    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    chunk_size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=_utcnow
     )
+
+
+class BlobChunkModel(Base):
+    __tablename__ = "blob_chunks"
+    blob_id: Mapped[str] = mapped_column(
+        String(512), ForeignKey("blob_data.id", ondelete="CASCADE"), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
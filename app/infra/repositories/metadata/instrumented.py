@@ -0,0 +1,144 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.domain.ports.metadata_repo import AsyncMetadataRepository, BlobMeta
+from app.infra.metrics import STAGE_SECONDS
+from app.infra.tracing import timed
+
+
+class InstrumentedMetadataRepository:
+    """Times metadata calls as the ``meta_read`` / ``meta_write`` stages and
+    traces each as a ``meta.<method>`` span."""
+
+    def __init__(self, inner: AsyncMetadataRepository):
+        self.inner = inner
+        self._reads = STAGE_SECONDS.labels("meta_read")
+        self._writes = STAGE_SECONDS.labels("meta_write")
+
+    async def create(self, meta: BlobMeta) -> None:
+        with timed(self._writes, "meta.create"):
+            await self.inner.create(meta)
+
+    async def get(self, blob_id: str) -> Optional[BlobMeta]:
+        with timed(self._reads, "meta.get"):
+            return await self.inner.get(blob_id)
+
+    async def exists(self, blob_id: str) -> bool:
+        with timed(self._reads, "meta.exists"):
+            return await self.inner.exists(blob_id)
+
+    async def existing_ids(self, blob_ids: Sequence[str]) -> Set[str]:
+        with timed(self._reads, "meta.existing_ids"):
+            return await self.inner.existing_ids(blob_ids)
+
+    async def get_many(self, blob_ids: Sequence[str]) -> Dict[str, BlobMeta]:
+        with timed(self._reads, "meta.get_many"):
+            return await self.inner.get_many(blob_ids)
+
+    def iter_page(
+        self,
+        order_by: str,
+        limit: int,
+        after: Optional[Tuple[Any, ...]] = None,
+        prefix: Optional[str] = None,
+        backend: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+    ) -> AsyncIterator[BlobMeta]:
+        # Pages are streamed to the client; the time is mostly theirs.
+        return self.inner.iter_page(order_by, limit, after, prefix, backend, created_after)
+
+    async def create_many(self, metas: List[BlobMeta]) -> Set[str]:
+        with timed(self._writes, "meta.create_many"):
+            return await self.inner.create_many(metas)
+
+    async def delete(self, blob_id: str) -> None:
+        with timed(self._writes, "meta.delete"):
+            await self.inner.delete(blob_id)
+
+    async def find_content(
+        self, backend: str, checksum: str
+    ) -> Optional[Tuple[int, Optional[str]]]:
+        with timed(self._reads, "meta.find_content"):
+            return await self.inner.find_content(backend, checksum)
+
+    async def acquire_content(
+        self, backend: str, checksum: str, codec: Optional[str] = None
+    ) -> bool:
+        with timed(self._writes, "meta.acquire_content"):
+            return await self.inner.acquire_content(backend, checksum, codec)
+
+    async def add_content(
+        self, backend: str, checksum: str, size: int, codec: Optional[str] = None
+    ) -> bool:
+        with timed(self._writes, "meta.add_content"):
+            return await self.inner.add_content(backend, checksum, size, codec)
+
+    async def release_content(self, backend: str, checksum: str) -> bool:
+        with timed(self._writes, "meta.release_content"):
+            return await self.inner.release_content(backend, checksum)
+
+    async def drop_content(self, backend: str, checksum: str) -> None:
+        with timed(self._writes, "meta.drop_content"):
+            await self.inner.drop_content(backend, checksum)
+
+    async def record_access(self, hits: Dict[str, Tuple[datetime, int]]) -> None:
+        with timed(self._writes, "meta.record_access"):
+            await self.inner.record_access(hits)
+
+    async def idle_ids(self, backend: str, idle_since: datetime, limit: int) -> List[str]:
+        with timed(self._reads, "meta.idle_ids"):
+            return await self.inner.idle_ids(backend, idle_since, limit)
+
+    async def claim_move(
+        self, blob_id: str, backend: str, now: datetime, until: datetime
+    ) -> bool:
+        with timed(self._writes, "meta.claim_move"):
+            return await self.inner.claim_move(blob_id, backend, now, until)
+
+    async def finish_move(
+        self,
+        blob_id: str,
+        src: str,
+        dst: Optional[str],
+        accessed_at: Optional[datetime] = None,
+        purge_at: Optional[datetime] = None,
+    ) -> bool:
+        with timed(self._writes, "meta.finish_move"):
+            return await self.inner.finish_move(blob_id, src, dst, accessed_at, purge_at)
+
+    async def due_purges(self, now: datetime, limit: int) -> List[Tuple[str, str]]:
+        with timed(self._reads, "meta.due_purges"):
+            return await self.inner.due_purges(now, limit)
+
+    async def claim_purge(
+        self, backend: str, blob_id: str, now: datetime, until: datetime
+    ) -> bool:
+        with timed(self._writes, "meta.claim_purge"):
+            return await self.inner.claim_purge(backend, blob_id, now, until)
+
+    async def finish_purge(self, backend: str, blob_id: str, removed: bool) -> None:
+        with timed(self._writes, "meta.finish_purge"):
+            await self.inner.finish_purge(backend, blob_id, removed)
+
+    async def pending_ids(self, now: datetime, limit: int) -> List[str]:
+        with timed(self._reads, "meta.pending_ids"):
+            return await self.inner.pending_ids(now, limit)
+
+    async def claim_pending(self, blob_id: str, now: datetime, until: datetime) -> bool:
+        with timed(self._writes, "meta.claim_pending"):
+            return await self.inner.claim_pending(blob_id, now, until)
+
+    async def set_staged(self, meta: BlobMeta) -> bool:
+        with timed(self._writes, "meta.set_staged"):
+            return await self.inner.set_staged(meta)
+
+    async def add_attempt(self, blob_id: str) -> Optional[int]:
+        with timed(self._writes, "meta.add_attempt"):
+            return await self.inner.add_attempt(blob_id)
+
+    async def finish_ingest(
+        self, blob_id: str, status: str, lease_until: Optional[datetime] = None
+    ) -> bool:
+        with timed(self._writes, "meta.finish_ingest"):
+            return await self.inner.finish_ingest(blob_id, status, lease_until)
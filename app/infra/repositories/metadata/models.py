@@ -1,17 +1,83 @@
 from __future__ import annotations
 from datetime import datetime
+from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, DateTime, Integer
+from sqlalchemy import BigInteger, String, DateTime, Index, Integer
 
 from app.infra.db import Base
 
 
 class BlobMetaModel(Base):
     __tablename__ = "blob_metadata"
+    # Keyset pagination: (id) is served by the primary key, the rest by these.
+    __table_args__ = (
+        Index("ix_blob_metadata_created_at_id", "created_at", "id"),
+        Index("ix_blob_metadata_backend_id", "backend", "id"),
+        Index("ix_blob_metadata_backend_created_at_id", "backend", "created_at", "id"),
+        # Tier migration picks the least recently read blobs of a backend.
+        Index("ix_blob_metadata_backend_last_access_at", "backend", "last_access_at"),
+        # Write-behind uploads waiting for a worker.
+        Index("ix_blob_metadata_status_lease_until", "status", "lease_until"),
+        # Prefix listings (LIKE 'p%') under a non-C collation; PostgreSQL only.
+        Index(
+            "ix_blob_metadata_id_pattern",
+            "id",
+            postgresql_ops={"id": "varchar_pattern_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
     id: Mapped[str] = mapped_column(String(512), primary_key=True)
-    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False
     )
     backend: Mapped[str] = mapped_column(String(50), nullable=False)
-    checksum: Mapped[str] = mapped_column(String(128), nullable=False)
+    checksum: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
+    # Storage key holding the bytes when they are shared by content hash;
+    # None means the blob is stored under its own id.
+    content_ref: Mapped[Optional[str]] = mapped_column(String(160), nullable=True)
+    # Compression applied to the stored bytes; size and checksum always
+    # describe the original content.
+    codec: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    # Read tracking, written back in batches; rows from before tiering have
+    # NULL and count from created_at.
+    last_access_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    access_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # PENDING while a write-behind upload is staged locally; reads of
+    # PENDING and FAILED blobs are served from the staging area.
+    status: Mapped[str] = mapped_column(
+        String(16), nullable=False, default="COMMITTED", server_default="COMMITTED"
+    )
+    attempts: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Held by the worker copying the blob's bytes: a tier migration or a
+    # write-behind upload (whose retries wait for it to run out).
+    lease_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+# Old copies left behind by tier moves, removed once ``due_at`` has passed.
+class BlobPurgeModel(Base):
+    __tablename__ = "blob_purge"
+    backend: Mapped[str] = mapped_column(String(50), primary_key=True)
+    blob_id: Mapped[str] = mapped_column(String(512), primary_key=True)
+    due_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
+
+
+class BlobContentModel(Base):
+    __tablename__ = "blob_content"
+    backend: Mapped[str] = mapped_column(String(50), primary_key=True)
+    checksum: Mapped[str] = mapped_column(String(128), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False)
+    codec: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
@@ -1,40 +1,484 @@
 from __future__ import annotations
-from typing import Optional
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import and_, bindparam, delete, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.domain.entities.blob_metadata import BlobMeta
-from .models import BlobMetaModel
+from .models import BlobContentModel, BlobMetaModel, BlobPurgeModel
 from app.infra.errors import Conflict
 
+# Keeps IN (...) lists well under the bound-parameter limits of SQLite and asyncpg.
+_IN_BATCH = 500
 
-class SqlAlchemyMetadataRepository:
-    def __init__(self, session: Session):
+
+def _batches(ids: Sequence[str]) -> Iterable[Sequence[str]]:
+    for i in range(0, len(ids), _IN_BATCH):
+        yield ids[i : i + _IN_BATCH]
+
+
+def _to_row(meta: BlobMeta) -> BlobMetaModel:
+    return BlobMetaModel(
+        id=meta.id,
+        size=meta.size,
+        created_at=meta.created_at,
+        backend=meta.backend,
+        checksum=meta.checksum,
+        content_ref=meta.content_ref,
+        codec=meta.codec,
+        last_access_at=meta.created_at,
+        status=meta.status,
+    )
+
+
+def _values(meta: BlobMeta) -> Dict[str, Any]:
+    return {
+        "id": meta.id,
+        "size": meta.size,
+        "created_at": meta.created_at,
+        "backend": meta.backend,
+        "checksum": meta.checksum,
+        "content_ref": meta.content_ref,
+        "codec": meta.codec,
+        "last_access_at": meta.created_at,
+        "status": meta.status,
+    }
+
+
+def _prefix_upper(prefix: str) -> Optional[str]:
+    """Smallest string past every id starting with ``prefix``, in code point
+    order; None when there is none (the prefix is all U+10FFFF)."""
+    head = prefix.rstrip("\U0010ffff")
+    if not head:
+        return None
+    nxt = ord(head[-1]) + 1
+    if 0xD800 <= nxt <= 0xDFFF:
+        # Surrogates can't be encoded; nothing sorts between them anyway.
+        nxt = 0xE000
+    return head[:-1] + chr(nxt)
+
+
+def _insert_new(dialect: str, meta: BlobMeta):
+    """``INSERT ... ON CONFLICT DO NOTHING`` where the dialect has it: the
+    primary key decides existence, and a duplicate leaves the transaction
+    usable (a failed INSERT would abort it on Postgres)."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(BlobMetaModel).values(**_values(meta)).on_conflict_do_nothing()
+
+
+def _to_meta(row: BlobMetaModel) -> BlobMeta:
+    return BlobMeta(
+        id=row.id,
+        size=row.size,
+        created_at=row.created_at,
+        backend=row.backend,
+        checksum=row.checksum,
+        content_ref=row.content_ref,
+        codec=row.codec,
+        status=row.status,
+    )
+
+
+class AsyncSqlAlchemyMetadataRepository:
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def exists(self, blob_id: str) -> bool:
-        return self.session.get(BlobMetaModel, blob_id) is not None
+    async def exists(self, blob_id: str) -> bool:
+        return await self.session.get(BlobMetaModel, blob_id) is not None
 
-    def create(self, meta: BlobMeta) -> None:
-        if self.exists(meta.id):
-            raise Conflict(f"Blob '{meta.id}' already exists")
-        row = BlobMetaModel(
-            id=meta.id,
-            size=meta.size,
-            created_at=meta.created_at,
-            backend=meta.backend,
-            checksum=meta.checksum,
-        )
-        self.session.add(row)
-        self.session.flush()
+    async def create(self, meta: BlobMeta) -> None:
+        stmt = _insert_new(self.session.get_bind().dialect.name, meta)
+        if stmt is not None:
+            result = await self.session.execute(stmt)
+            if result.rowcount != 1:
+                raise Conflict(f"Blob '{meta.id}' already exists")
+            return
+        try:
+            async with self.session.begin_nested():
+                self.session.add(_to_row(meta))
+        except IntegrityError:
+            raise Conflict(f"Blob '{meta.id}' already exists") from None
 
-    def get(self, blob_id: str) -> Optional[BlobMeta]:
-        row = self.session.get(BlobMetaModel, blob_id)
+    async def get(self, blob_id: str) -> Optional[BlobMeta]:
+        row = await self.session.get(BlobMetaModel, blob_id)
         if not row:
             return None
-        return BlobMeta(
-            id=row.id,
-            size=row.size,
-            created_at=row.created_at,
-            backend=row.backend,
-            checksum=row.checksum,
+        return _to_meta(row)
+
+    async def existing_ids(self, blob_ids: Sequence[str]) -> Set[str]:
+        found: Set[str] = set()
+        for batch in _batches(blob_ids):
+            rows = await self.session.execute(
+                select(BlobMetaModel.id).where(BlobMetaModel.id.in_(batch))
+            )
+            found.update(rows.scalars())
+        return found
+
+    async def get_many(self, blob_ids: Sequence[str]) -> Dict[str, BlobMeta]:
+        found: Dict[str, BlobMeta] = {}
+        for batch in _batches(blob_ids):
+            rows = await self.session.execute(
+                select(BlobMetaModel).where(BlobMetaModel.id.in_(batch))
+            )
+            found.update((row.id, _to_meta(row)) for row in rows.scalars())
+        return found
+
+    async def iter_page(
+        self,
+        order_by: str,
+        limit: int,
+        after: Optional[Tuple[Any, ...]] = None,
+        prefix: Optional[str] = None,
+        backend: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+    ) -> AsyncIterator[BlobMeta]:
+        """Stream up to ``limit`` rows ordered by ``id`` or ``(created_at, id)``,
+        starting after the ``after`` key."""
+        if order_by == "created_at":
+            key = (BlobMetaModel.created_at, BlobMetaModel.id)
+        else:
+            key = (BlobMetaModel.id,)
+        stmt = select(BlobMetaModel).order_by(*key).limit(limit)
+        if after is not None:
+            stmt = stmt.where(tuple_(*key) > tuple_(*after))
+        if prefix:
+            stmt = stmt.where(BlobMetaModel.id.startswith(prefix, autoescape=True))
+            # SQLite compares ids by code point, so the range can be bounded
+            # as well and the scan stops where the prefix ends. Elsewhere the
+            # column collation may order ids differently from LIKE; PostgreSQL
+            # serves the LIKE from a pattern_ops index instead.
+            if order_by == "id" and self.session.get_bind().dialect.name == "sqlite":
+                stmt = stmt.where(BlobMetaModel.id >= prefix)
+                upper = _prefix_upper(prefix)
+                if upper is not None:
+                    stmt = stmt.where(BlobMetaModel.id < upper)
+        if backend:
+            stmt = stmt.where(BlobMetaModel.backend == backend)
+        if created_after is not None:
+            stmt = stmt.where(BlobMetaModel.created_at > created_after)
+
+        # The listing is streamed after the request session was closed; the
+        # rows are then read in a transaction of their own.
+        owns_tx = not self.session.in_transaction()
+        try:
+            result = await self.session.stream_scalars(
+                stmt.execution_options(yield_per=256)
+            )
+            try:
+                async for row in result:
+                    yield _to_meta(row)
+            finally:
+                await result.close()
+        finally:
+            if owns_tx:
+                await self.session.close()
+
+    async def create_many(self, metas: List[BlobMeta]) -> Set[str]:
+        """Insert rows in one flush; returns the ids that already existed."""
+        try:
+            async with self.session.begin_nested():
+                self.session.add_all([_to_row(m) for m in metas])
+            return set()
+        except IntegrityError:
+            pass
+        # Someone created some of these ids meanwhile: find out which, row by row.
+        conflicts: Set[str] = set()
+        for meta in metas:
+            try:
+                async with self.session.begin_nested():
+                    self.session.add(_to_row(meta))
+            except IntegrityError:
+                conflicts.add(meta.id)
+        return conflicts
+
+    async def delete(self, blob_id: str) -> None:
+        await self.session.execute(
+            delete(BlobMetaModel).where(BlobMetaModel.id == blob_id)
+        )
+
+    def _content(self, backend: str, checksum: str):
+        return (BlobContentModel.backend == backend) & (
+            BlobContentModel.checksum == checksum
+        )
+
+    async def find_content(
+        self, backend: str, checksum: str
+    ) -> Optional[Tuple[int, Optional[str]]]:
+        row = (
+            await self.session.execute(
+                select(BlobContentModel.refcount, BlobContentModel.codec).where(
+                    self._content(backend, checksum)
+                )
+            )
+        ).first()
+        return (row.refcount, row.codec) if row is not None else None
+
+    async def acquire_content(
+        self, backend: str, checksum: str, codec: Optional[str] = None
+    ) -> bool:
+        # A single UPDATE keeps concurrent increments from losing counts.
+        # Content at zero is being deleted and can't be referenced again.
+        result = await self.session.execute(
+            update(BlobContentModel)
+            .where(
+                self._content(backend, checksum),
+                BlobContentModel.refcount > 0,
+                BlobContentModel.codec.is_not_distinct_from(codec),
+            )
+            .values(refcount=BlobContentModel.refcount + 1)
+        )
+        return result.rowcount == 1
+
+    async def add_content(
+        self, backend: str, checksum: str, size: int, codec: Optional[str] = None
+    ) -> bool:
+        row = BlobContentModel(
+            backend=backend,
+            checksum=checksum,
+            size=size,
+            refcount=1,
+            codec=codec,
+            created_at=datetime.now(timezone.utc),
+        )
+        try:
+            async with self.session.begin_nested():
+                self.session.add(row)
+        except IntegrityError:
+            # A concurrent upload of the same content registered it first.
+            return await self.acquire_content(backend, checksum, codec)
+        return True
+
+    async def release_content(self, backend: str, checksum: str) -> bool:
+        result = await self.session.execute(
+            update(BlobContentModel)
+            .where(self._content(backend, checksum))
+            .values(refcount=BlobContentModel.refcount - 1)
+            .returning(BlobContentModel.refcount)
+        )
+        refcount = result.scalar_one_or_none()
+        return refcount is not None and refcount <= 0
+
+    async def drop_content(self, backend: str, checksum: str) -> None:
+        await self.session.execute(
+            delete(BlobContentModel).where(
+                self._content(backend, checksum), BlobContentModel.refcount <= 0
+            )
+        )
+
+    async def record_access(self, hits: Dict[str, Tuple[datetime, int]]) -> None:
+        if not hits:
+            return
+        table = BlobMetaModel.__table__
+        await self.session.execute(
+            table.update()
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                last_access_at=bindparam("b_at"),
+                access_count=table.c.access_count + bindparam("b_n"),
+            ),
+            [{"b_id": k, "b_at": at, "b_n": n} for k, (at, n) in hits.items()],
+        )
+
+    async def idle_ids(self, backend: str, idle_since: datetime, limit: int) -> List[str]:
+        """Ids on ``backend`` not read since ``idle_since``, least recent first.
+        Content shared by dedup stays where it is."""
+        m = BlobMetaModel
+        rows = await self.session.execute(
+            select(m.id)
+            .where(
+                m.backend == backend,
+                m.status == "COMMITTED",
+                m.content_ref.is_(None),
+                or_(
+                    m.last_access_at < idle_since,
+                    and_(m.last_access_at.is_(None), m.created_at < idle_since),
+                ),
+            )
+            .order_by(m.last_access_at)
+            .limit(limit)
+        )
+        return list(rows.scalars())
+
+    async def claim_move(
+        self, blob_id: str, backend: str, now: datetime, until: datetime
+    ) -> bool:
+        """Lease a blob still on ``backend`` for moving; False when it is gone,
+        already moved or leased by another migrator."""
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(
+                m.id == blob_id,
+                m.backend == backend,
+                or_(m.lease_until.is_(None), m.lease_until < now),
+            )
+            .values(lease_until=until)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def finish_move(
+        self,
+        blob_id: str,
+        src: str,
+        dst: Optional[str],
+        accessed_at: Optional[datetime] = None,
+        purge_at: Optional[datetime] = None,
+    ) -> bool:
+        """Point a leased blob at ``dst`` (or just drop the lease when None)
+        and schedule the copy on ``src`` for removal at ``purge_at``; False
+        if it was deleted meanwhile."""
+        m = BlobMetaModel
+        values: Dict[str, Any] = {"lease_until": None}
+        if dst is not None:
+            values["backend"] = dst
+        if accessed_at is not None:
+            values["last_access_at"] = accessed_at
+        result = await self.session.execute(
+            update(m)
+            .where(m.id == blob_id, m.backend == src)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        if dst is not None:
+            # The copy on ``dst`` is the live one again, if it was pending.
+            await self._unschedule_purge(dst, blob_id)
+        if dst is not None and purge_at is not None:
+            await self._unschedule_purge(src, blob_id)
+            await self.session.execute(
+                insert(BlobPurgeModel).values(backend=src, blob_id=blob_id, due_at=purge_at)
+            )
+        return True
+
+    async def _unschedule_purge(self, backend: str, blob_id: str) -> None:
+        p = BlobPurgeModel
+        await self.session.execute(
+            delete(p).where(p.backend == backend, p.blob_id == blob_id)
+        )
+
+    async def due_purges(self, now: datetime, limit: int) -> List[Tuple[str, str]]:
+        """(backend, blob id) of old copies due for removal."""
+        p = BlobPurgeModel
+        rows = await self.session.execute(
+            select(p.backend, p.blob_id)
+            .where(p.due_at <= now)
+            .order_by(p.due_at)
+            .limit(limit)
+        )
+        return [(r.backend, r.blob_id) for r in rows]
+
+    async def claim_purge(
+        self, backend: str, blob_id: str, now: datetime, until: datetime
+    ) -> bool:
+        """Lease a blob for removing its old copy on ``backend``; also True
+        when the blob is gone. False when another worker holds the lease, or
+        when the blob lives on ``backend`` again, which cancels the removal."""
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(
+                m.id == blob_id,
+                m.backend != backend,
+                or_(m.lease_until.is_(None), m.lease_until < now),
+            )
+            .values(lease_until=until)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return True
+        current = (
+            await self.session.execute(select(m.backend).where(m.id == blob_id))
+        ).scalar_one_or_none()
+        if current is None:
+            return True
+        if current == backend:
+            await self._unschedule_purge(backend, blob_id)
+        return False
+
+    async def finish_purge(self, backend: str, blob_id: str, removed: bool) -> None:
+        """Drop the lease ``claim_purge`` took, and the scheduled removal
+        once the copy is ``removed``."""
+        m = BlobMetaModel
+        if removed:
+            await self._unschedule_purge(backend, blob_id)
+        await self.session.execute(
+            update(m)
+            .where(m.id == blob_id, m.backend != backend)
+            .values(lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def pending_ids(self, now: datetime, limit: int) -> List[str]:
+        """PENDING blobs whose lease ran out: their uploader gave up or died."""
+        m = BlobMetaModel
+        rows = await self.session.execute(
+            select(m.id)
+            .where(
+                m.status == "PENDING",
+                or_(m.lease_until.is_(None), m.lease_until < now),
+            )
+            .order_by(m.lease_until)
+            .limit(limit)
+        )
+        return list(rows.scalars())
+
+    async def claim_pending(self, blob_id: str, now: datetime, until: datetime) -> bool:
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(
+                m.id == blob_id,
+                m.status == "PENDING",
+                or_(m.lease_until.is_(None), m.lease_until < now),
+            )
+            .values(lease_until=until)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def set_staged(self, meta: BlobMeta) -> bool:
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(m.id == meta.id, m.status == "PENDING")
+            .values(
+                size=meta.size,
+                created_at=meta.created_at,
+                last_access_at=meta.created_at,
+                checksum=meta.checksum,
+                codec=meta.codec,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def add_attempt(self, blob_id: str) -> Optional[int]:
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(m.id == blob_id, m.status == "PENDING")
+            .values(attempts=m.attempts + 1)
+            .returning(m.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalar_one_or_none()
+
+    async def finish_ingest(
+        self, blob_id: str, status: str, lease_until: Optional[datetime] = None
+    ) -> bool:
+        m = BlobMetaModel
+        result = await self.session.execute(
+            update(m)
+            .where(m.id == blob_id, m.status == "PENDING")
+            .values(status=status, lease_until=lease_until)
+            .execution_options(synchronize_session=False)
         )
+        return result.rowcount == 1
@@ -0,0 +1,90 @@
+"""Bring an existing database up to the current models.
+
+``create_all`` only creates missing tables. Columns and indexes added to
+existing tables later are added here, columns that became nullable lose
+their NOT NULL and integers widened to BIGINT are altered, so the upgrade
+is safe to run at every startup.
+"""
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import BigInteger, MetaData, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import Column, CreateColumn, CreateTable, Table
+
+from app.infra.db import Base
+# Imported for their tables.
+from app.infra.repositories.blob_data import models as _blob_data_models
+from app.infra.repositories.metadata import models as _metadata_models
+
+
+def upgrade_schema(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"]: c for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                _add_column(conn, table, column)
+            elif _needs_bigint(conn, column, existing[column.name]):
+                _widen_to_bigint(conn, table, column)
+        relaxed = [
+            c
+            for c in table.columns
+            if c.nullable and c.name in existing and not existing[c.name]["nullable"]
+        ]
+        if relaxed:
+            _drop_not_null(conn, table, relaxed)
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _add_column(conn: Connection, table: Table, column: Column) -> None:
+    if not column.nullable and column.server_default is None:
+        raise RuntimeError(
+            f"Can't add {table.name}.{column.name}: NOT NULL without a server default"
+        )
+    spec = CreateColumn(column).compile(dialect=conn.dialect)
+    table_name = conn.dialect.identifier_preparer.format_table(table)
+    conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {spec}")
+
+
+def _needs_bigint(conn: Connection, column: Column, found: dict) -> bool:
+    # SQLite integers are 64-bit whatever the declared type.
+    return (
+        conn.dialect.name != "sqlite"
+        and isinstance(column.type, BigInteger)
+        and not isinstance(found["type"], BigInteger)
+    )
+
+
+def _widen_to_bigint(conn: Connection, table: Table, column: Column) -> None:
+    preparer = conn.dialect.identifier_preparer
+    conn.exec_driver_sql(
+        f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN "
+        f"{preparer.format_column(column)} TYPE BIGINT"
+    )
+
+
+def _drop_not_null(conn: Connection, table: Table, columns: List[Column]) -> None:
+    preparer = conn.dialect.identifier_preparer
+    table_name = preparer.format_table(table)
+    if conn.dialect.name != "sqlite":
+        for column in columns:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {table_name} ALTER COLUMN "
+                f"{preparer.format_column(column)} DROP NOT NULL"
+            )
+        return
+    # SQLite can't alter a column: copy the rows into a table built from the
+    # model and swap it in. Its indexes are recreated by the caller.
+    new = table.to_metadata(MetaData(), name=f"_new_{table.name}")
+    conn.execute(CreateTable(new))
+    names = ", ".join(preparer.format_column(c) for c in table.columns)
+    conn.exec_driver_sql(
+        f"INSERT INTO {preparer.format_table(new)} ({names}) "
+        f"SELECT {names} FROM {table_name}"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table_name}")
+    conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(new)} RENAME TO {table_name}")
@@ -15,10 +15,62 @@ class Settings(BaseSettings):
     auth_bearer_token: str
 
     storage: str = "fs"
+    dedup: bool = False
+    batch_concurrency: int = 16
+    compression: str = ""
+    compression_level: int = 3
+
+    tier_cold: str = "s3"
+    tier_cold_after: float = 7 * 24 * 3600
+    tier_promote_reads: int = 3
+    tier_promote_window: float = 3600.0
+    tier_migrate_interval: float = 60.0
+    tier_migrate_batch: int = 100
+    tier_migrate_concurrency: int = 2
+    tier_migrate_bytes_per_sec: int = 0
+    tier_delete_grace: float = 60.0
+
+    mirror_backends: str = "fs,s3"
+    mirror_write_quorum: int = 0
+    mirror_hedge_min_delay: float = 0.01
+    mirror_hedge_max_delay: float = 1.0
+    mirror_repair_retries: int = 5
+    mirror_repair_concurrency: int = 4
+
+    ingest_async: bool = False
+    ingest_staging_dir: str = "./staging"
+    ingest_workers: int = 4
+    ingest_max_attempts: int = 5
+    ingest_retry_backoff: float = 1.0
+    ingest_lease: float = 600.0
+    ingest_poll_interval: float = 5.0
 
     fs_base_path: str = "./storage"
+    fs_executor_workers: int = 32
+    fs_group_commit: bool = False
+    fs_group_commit_window: float = 0.002
+    fs_group_commit_syncfs: bool = False
 
     database_url: str = "sqlite:///./metadata.db"
+    db_chunk_size: int = 256 * 1024
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_ping_idle: float = 30.0
+    db_statement_cache_size: int = 500
+    sqlite_wal: bool = True
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: float = 5.0
+    sqlite_cache_kb: int = 2048
+    sqlite_mmap_bytes: int = 0
+    sqlite_single_writer: bool = True
+
+    cache_max_bytes: int = 0
+    cache_max_item_bytes: int = 8 * 1024 * 1024
+    cache_dir: str = ""
+    cache_disk_max_bytes: int = 1024 * 1024 * 1024
+    http_cache_control: str = "private, max-age=31536000, immutable"
 
     s3_endpoint: str = ""
     s3_region: str = "us-north-1"
@@ -27,6 +79,16 @@ class Settings(BaseSettings):
     s3_secret_key: str = ""
     s3_session_token: str = ""
     s3_force_path_style: bool = False
+    s3_multipart_threshold: int = 64 * 1024 * 1024
+    s3_part_size: int = 16 * 1024 * 1024
+    s3_max_concurrency: int = 8
+    s3_max_retries: int = 3
+    s3_conditional_writes: bool = True
+    s3_timeout: float = 10.0
+    s3_max_connections: int = 64
+    s3_max_keepalive_connections: int = 32
+    s3_keepalive_expiry: float = 15.0
+    s3_http2: bool = False
 
     ftp_host: str = "ftp.drivehq.com"
     ftp_port: int = 21
@@ -35,6 +97,17 @@ class Settings(BaseSettings):
     ftp_tls: bool = True
     ftp_base_dir: str = "/"
     ftp_timeout: float = 10.0
+    ftp_pool_min_size: int = 1
+    ftp_pool_max_size: int = 8
+    ftp_pool_keepalive: float = 30.0
+    ftp_executor_workers: int = 8
+
+    trace_export: str = ""
+    trace_sample_rate: float = 1.0
+    trace_service_name: str = "rekaz-drive"
+    profile_token: str = ""
+    profile_dir: str = "./profiles"
+    profile_interval: float = 0.002
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
@@ -0,0 +1,320 @@
+"""Request tracing with OpenTelemetry-compatible export.
+
+Spans only exist inside a sampled trace: outside one, ``span()`` and
+``traced`` cost a context-variable lookup. Finished traces are exported as
+OTLP/JSON ``ExportTraceServiceRequest`` documents from a background thread,
+either appended to a file (one document per line, as the OpenTelemetry
+Collector's file exporter writes them) or POSTed to an OTLP/HTTP endpoint.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_TRACEPARENT = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_STATUS_ERROR = 2
+
+
+class Trace:
+    def __init__(self, trace_id: str, exporter: "Exporter"):
+        self.trace_id = trace_id
+        self.exporter = exporter
+        self.spans: List["Span"] = []
+        self.exported = False
+
+
+class Span:
+    __slots__ = (
+        "trace", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "error",
+    )
+
+    def __init__(self, trace: Trace, name: str, parent_id: str, kind: int, attributes):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = attributes
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        out = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()
+            ],
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            out["status"] = {"code": _STATUS_ERROR, "message": self.error}
+        return out
+
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _Scope:
+    """Opens a child span of the current one for the ``with`` block."""
+
+    __slots__ = ("name", "attributes", "kind", "span", "token")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], kind: int = _SPAN_KIND_INTERNAL):
+        self.name = name
+        self.attributes = attributes
+        self.kind = kind
+
+    def __enter__(self) -> Span:
+        parent = _current.get()
+        self.span = Span(parent.trace, self.name, parent.span_id, self.kind, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self.token)
+        _finish(self.span, exc)
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NOOP = _NoopScope()
+
+
+def _finish(span: Span, exc: Optional[BaseException]) -> None:
+    span.end_ns = time.time_ns()
+    if exc is not None:
+        span.error = f"{type(exc).__name__}: {exc}"
+    trace = span.trace
+    if trace.exported:
+        # Outlived the request (e.g. a stream closed late); ship it alone.
+        trace.exporter.export([span])
+    else:
+        trace.spans.append(span)
+
+
+def span(name: str, **attributes: Any):
+    """Child span of the current span; a no-op outside a sampled trace."""
+    if _current.get() is None:
+        return _NOOP
+    return _Scope(name, attributes)
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """Span that is not made current, for hooks that can't wrap a block;
+    close it with ``end_span``."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, _SPAN_KIND_INTERNAL, attributes)
+
+
+def end_span(span: Span, exc: Optional[BaseException] = None) -> None:
+    _finish(span, exc)
+
+
+class _Timed:
+    __slots__ = ("child", "scope", "start")
+
+    def __init__(self, child, scope):
+        self.child = child
+        self.scope = scope
+
+    def __enter__(self):
+        out = self.scope.__enter__()
+        self.start = time.perf_counter()
+        return out
+
+    def __exit__(self, *exc) -> None:
+        self.child.observe(time.perf_counter() - self.start)
+        self.scope.__exit__(*exc)
+
+
+def timed(histogram, name: str, **attributes: Any) -> _Timed:
+    """Observe the block's duration on ``histogram`` and trace it as ``name``."""
+    return _Timed(histogram, span(name, **attributes))
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Trace calls of a function or coroutine function as ``name``."""
+
+    def wrap(fn: Callable[..., T]) -> Callable[..., T]:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def ainner(*args, **kwargs):
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with _Scope(name, {}):
+                    return await fn(*args, **kwargs)
+
+            return ainner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs) -> T:
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with _Scope(name, {}):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return wrap
+
+
+def current_trace_id() -> str:
+    current = _current.get()
+    return current.trace.trace_id if current is not None else ""
+
+
+class _RootScope:
+    __slots__ = ("span", "token")
+
+    def __init__(self, root: Span):
+        self.span = root
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self.token)
+        _finish(self.span, exc)
+        trace = self.span.trace
+        trace.exported = True
+        trace.exporter.export(list(trace.spans))
+
+
+def start_trace(
+    name: str,
+    exporter: Optional["Exporter"],
+    sample_rate: float,
+    traceparent: Optional[str] = None,
+    **attributes: Any,
+):
+    """Root span for a request, or a no-op when it isn't sampled.
+
+    A W3C ``traceparent`` header continues the caller's trace and its
+    sampled flag overrides ``sample_rate``.
+    """
+    if exporter is None:
+        return _NOOP
+    trace_id, parent_id, sampled = "", "", None
+    m = _TRACEPARENT.fullmatch(traceparent.strip().lower()) if traceparent else None
+    if m:
+        trace_id, parent_id = m.group(1), m.group(2)
+        sampled = bool(int(m.group(3), 16) & 1)
+    if sampled is None:
+        sampled = sample_rate >= 1 or random.random() < sample_rate
+    if not sampled:
+        return _NOOP
+    trace = Trace(trace_id or os.urandom(16).hex(), exporter)
+    return _RootScope(Span(trace, name, parent_id, _SPAN_KIND_SERVER, attributes))
+
+
+class Exporter:
+    """Ships finished traces to a file or an OTLP/HTTP endpoint off-loop."""
+
+    def __init__(self, target: str, service_name: str):
+        self.target = target
+        self.service_name = service_name
+        self._queue: "queue.SimpleQueue[List[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        self._queue.put(spans)
+
+    def _document(self, spans: List[Span]) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "rekaz-drive"}, "spans": [s.to_otlp() for s in spans]}
+                    ],
+                }
+            ]
+        }
+
+    def _run(self) -> None:
+        is_http = self.target.startswith(("http://", "https://"))
+        client = httpx.Client(timeout=5.0) if is_http else None
+        while True:
+            spans = self._queue.get()
+            # Whatever else finished meanwhile goes out in the same document.
+            while True:
+                try:
+                    spans = spans + self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            body = json.dumps(self._document(spans), separators=(",", ":"))
+            try:
+                if client is not None:
+                    client.post(
+                        self.target, content=body, headers={"content-type": "application/json"}
+                    ).raise_for_status()
+                else:
+                    with open(self.target, "a", encoding="utf-8") as f:
+                        f.write(body + "\n")
+            except Exception as exc:
+                logger.warning("Dropped %d spans: %s", len(spans), exc)
+
+
+@lru_cache(maxsize=None)
+def get_exporter(target: str, service_name: str) -> Optional[Exporter]:
+    """Process-wide exporter for ``target``; None disables tracing."""
+    if not target:
+        return None
+    return Exporter(target, service_name)
@@ -1,20 +1,26 @@
 from __future__ import annotations
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-class SqlAlchemyUnitOfWork:
+class AsyncSqlAlchemyUnitOfWork:
+    """With ``flush_only`` a commit only flushes, leaving the transaction to
+    whoever owns the session."""
 
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession, flush_only: bool = False):
         self.session = session
+        self.flush_only = flush_only
 
-    def __enter__(self):
+    async def __aenter__(self):
         return self
 
-    def __exit__(self, exc_type, exc, tb):
+    async def __aexit__(self, exc_type, exc, tb):
         return False
 
-    def commit(self) -> None:
-        self.session.flush()
+    async def commit(self) -> None:
+        if self.flush_only:
+            await self.session.flush()
+        else:
+            await self.session.commit()
 
-    def rollback(self) -> None:
-        self.session.rollback()
+    async def rollback(self) -> None:
+        await self.session.rollback()
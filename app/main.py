@@ -2,14 +2,23 @@ from __future__ import annotations
 from fastapi import FastAPI
 from app.infra.logging import configure_logging
 from app.infra.errors import AppError, app_error_handler
-from app.api.routes import blobs
+from app.api.dependencies import lifespan
+from app.api.metrics import MetricsMiddleware
+from app.api.profiling import ProfilingMiddleware
+from app.api.tracing import TracingMiddleware
+from app.api.routes import blobs, cache, metrics
 
 
 def create_app() -> FastAPI:
     configure_logging()
-    app = FastAPI(title="Rekaz Drive", version="1.0.0")
+    app = FastAPI(title="Rekaz Drive", version="1.0.0", lifespan=lifespan)
     app.add_exception_handler(AppError, app_error_handler)
     app.include_router(blobs.router)
+    app.include_router(cache.router)
+    app.include_router(metrics.router)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(ProfilingMiddleware)
     return app
 
 
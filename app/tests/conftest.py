@@ -1,16 +1,77 @@
+import asyncio
 import os
 import shutil
 import sys
+from datetime import datetime, timezone
+
 import pytest
 from fastapi.testclient import TestClient
 from dotenv import load_dotenv
 
+from app.infra.errors import Conflict, NotFound
+
+
+class MemoryStorage:
+    """Storage backend in a dict. Every call waits ``delay`` seconds, and
+    ``failures`` maps blob ids to the number of streamed uploads that fail."""
+
+    def __init__(self, delay: float = 0.0, failures=None):
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.blobs = {}
+
+    async def save(self, blob_id, data):
+        await asyncio.sleep(self.delay)
+        if blob_id in self.blobs:
+            raise Conflict(blob_id)
+        self.blobs[blob_id] = data
+        return len(data), datetime.now(timezone.utc)
+
+    async def save_stream(self, blob_id, chunks, size=None):
+        data = b"".join([c async for c in chunks])
+        if self.failures.get(blob_id, 0) > 0:
+            self.failures[blob_id] -= 1
+            raise OSError("backend unavailable")
+        return await self.save(blob_id, data)
+
+    async def get(self, blob_id):
+        await asyncio.sleep(self.delay)
+        if blob_id not in self.blobs:
+            raise NotFound(blob_id)
+        data = self.blobs[blob_id]
+        return data, len(data), datetime.now(timezone.utc)
+
+    async def get_stream(self, blob_id, offset=0, length=None):
+        data, size, created_at = await self.get(blob_id)
+
+        async def chunks():
+            yield data[offset : None if length is None else offset + length]
+
+        return chunks(), size, created_at
+
+    async def delete(self, blob_id):
+        await asyncio.sleep(self.delay)
+        if self.blobs.pop(blob_id, None) is None:
+            raise NotFound(blob_id)
+
+
+@pytest.fixture
+def memory_storage():
+    return MemoryStorage
+
 
 @pytest.fixture(scope="session", autouse=True)
 def cleanup_test_files():
     yield  # This runs all tests first
 
-    cleanup_paths = ["./storage", "./metadata.db", ".pytest_cache"]
+    cleanup_paths = [
+        "./storage",
+        "./staging",
+        "./metadata.db",
+        "./metadata.db-wal",
+        "./metadata.db-shm",
+        ".pytest_cache",
+    ]
 
     for path in cleanup_paths:
         try:
@@ -31,9 +92,22 @@ def load_test_env():
 
 @pytest.fixture(scope="function")
 def client_for_backend(request):
-    backend = request.param
+    # "<backend>:<option>" also sets the backend's main option, e.g.
+    # "tiered:s3" (TIER_COLD) or "mirror:fs,s3" (MIRROR_BACKENDS);
+    # "<backend>:async" turns on INGEST_ASYNC instead.
+    backend, _, option = request.param.partition(":")
 
     os.environ["STORAGE"] = backend
+    if option == "async":
+        os.environ["INGEST_ASYNC"] = "true"
+        option = ""
+    else:
+        os.environ.pop("INGEST_ASYNC", None)
+    for name, var in (("tiered", "TIER_COLD"), ("mirror", "MIRROR_BACKENDS")):
+        if backend == name and option:
+            os.environ[var] = option
+        else:
+            os.environ.pop(var, None)
 
     modules_to_remove = [name for name in sys.modules.keys() if name.startswith("app.")]
     for module_name in modules_to_remove:
@@ -41,7 +115,12 @@ def client_for_backend(request):
 
     from app.infra.settings import Settings
     from fastapi import FastAPI
-    from app.api.routes import blobs
+    from app.api.dependencies import lifespan
+    from app.api.metrics import MetricsMiddleware
+    from app.api.profiling import ProfilingMiddleware
+    from app.api.tracing import TracingMiddleware
+    from app.api.routes import blobs, cache, metrics
+    from app.infra.errors import AppError, app_error_handler
 
     settings = Settings()
 
@@ -50,8 +129,14 @@ def client_for_backend(request):
     print(f"Settings storage: {settings.storage}")
     assert settings.storage == backend, f"Expected {backend}, got {settings.storage}"
 
-    app = FastAPI(title="Rekaz Drive", version="1.0.0")
+    app = FastAPI(title="Rekaz Drive", version="1.0.0", lifespan=lifespan)
+    app.add_exception_handler(AppError, app_error_handler)
     app.include_router(blobs.router)
+    app.include_router(cache.router)
+    app.include_router(metrics.router)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(ProfilingMiddleware)
     app.state.settings = settings
 
     with TestClient(app) as client:
@@ -1,5 +1,10 @@
 import base64
+import hashlib
+import json
+import os
+import time
 import uuid
+from pathlib import Path
 import pytest
 
 
@@ -51,3 +56,597 @@ def test_upload_large_file(client_for_backend):
 
     retrieved_content = base64.b64decode(retrieve_response.json()["data"])
     assert retrieved_content == large_content
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_stream_upload_download(client_for_backend):
+    client = client_for_backend
+    content = bytes(range(256)) * 8192  # 2 MiB, spans several chunks
+    blob_id = f"test-{uuid.uuid4()}"
+    auth_headers = get_auth_headers(client)
+
+    def body():
+        for i in range(0, len(content), 300_000):
+            yield content[i : i + 300_000]
+
+    upload_response = client.put(
+        f"/v1/blobs/{blob_id}",
+        content=body(),
+        headers={**auth_headers, "Content-Type": "application/octet-stream"},
+    )
+    assert upload_response.status_code == 201, upload_response.text
+    assert upload_response.json()["size"] == len(content)
+
+    retrieve_response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert retrieve_response.status_code == 200
+    assert retrieve_response.headers["content-type"] == "application/octet-stream"
+    assert retrieve_response.content == content
+
+    json_response = client.get(f"/v1/blobs/{blob_id}", headers=auth_headers)
+    assert base64.b64decode(json_response.json()["data"]) == content
+
+    # The content route would shadow the JSON one for these ids.
+    shadowed = f"{blob_id}/content"
+    response = client.put(f"/v1/blobs/{shadowed}", content=b"x", headers=auth_headers)
+    assert response.status_code == 422
+    payload = {"id": shadowed, "data": "eA=="}
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 422
+    response = client.post("/v1/blobs:batch", json={"items": [payload]}, headers=auth_headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_range_download(client_for_backend):
+    client = client_for_backend
+    content = bytes(range(256)) * 4096  # 1 MiB
+    blob_id, payload = create_test_blob(content)
+    auth_headers = get_auth_headers(client)
+
+    upload_response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert upload_response.status_code == 201, upload_response.text
+
+    url = f"/v1/blobs/{blob_id}/content"
+    cases = {
+        "bytes=0-9": (0, 9),
+        "bytes=1000-": (1000, len(content) - 1),
+        "bytes=-500": (len(content) - 500, len(content) - 1),
+        "bytes=10-99999999": (10, len(content) - 1),
+    }
+    for header, (start, end) in cases.items():
+        response = client.get(url, headers={**auth_headers, "Range": header})
+        assert response.status_code == 206, header
+        assert response.headers["content-range"] == f"bytes {start}-{end}/{len(content)}"
+        assert response.content == content[start : end + 1]
+
+    response = client.get(url, headers={**auth_headers, "Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_duplicate_create_keeps_original(client_for_backend):
+    client = client_for_backend
+    blob_id, payload = create_test_blob(b"original")
+    auth_headers = get_auth_headers(client)
+
+    response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert response.status_code == 201, response.text
+
+    _, other = create_test_blob(b"replacement")
+    other["id"] = blob_id
+    assert client.post("/v1/blobs", json=other, headers=auth_headers).status_code == 409
+    put = client.put(
+        f"/v1/blobs/{blob_id}",
+        content=b"replacement",
+        headers={**auth_headers, "Content-Type": "application/octet-stream"},
+    )
+    assert put.status_code == 409
+
+    content = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert content.content == b"original"
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_json_upload_is_parsed_incrementally(client_for_backend):
+    client = client_for_backend
+    auth_headers = {**get_auth_headers(client), "Content-Type": "application/json"}
+    content = os.urandom(3 * 1024 * 1024 + 5)
+    b64 = base64.b64encode(content).decode()
+
+    # "data" before "id", an escaped "/" and an unknown member.
+    blob_id = f"test-{uuid.uuid4()}"
+    body = '{"data": "%s", "extra": [1, {"a": null}], "id": "%s"}' % (
+        b64.replace("/", "\\/"),
+        blob_id,
+    )
+    response = client.post("/v1/blobs", content=body, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    assert response.json() == {
+        "id": blob_id,
+        "data": b64,
+        "size": len(content),
+        "created_at": response.json()["created_at"],
+    }
+    stored = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert stored.content == content
+
+    # A bad block deep into the payload fails the upload and leaves nothing behind.
+    bad_id = f"test-{uuid.uuid4()}"
+    bad = b64[: 2 * 1024 * 1024] + "!!!!" + b64[2 * 1024 * 1024 :]
+    body = '{"id": "%s", "data": "%s"}' % (bad_id, bad)
+    response = client.post("/v1/blobs", content=body, headers=auth_headers)
+    assert response.status_code == 400, response.text
+    assert client.get(f"/v1/blobs/{bad_id}", headers=auth_headers).status_code == 404
+
+    body = '{"id": "%s", "data": "%s"} trailing' % (bad_id, b64)
+    response = client.post("/v1/blobs", content=body, headers=auth_headers)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+    response = client.post("/v1/blobs", json={"data": "QQ=="}, headers=auth_headers)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "id"]
+
+    payload = {"id": bad_id, "data": base64.b64encode(b"retry").decode()}
+    response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert response.status_code == 201, response.text
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_conditional_get(client_for_backend):
+    client = client_for_backend
+    content = b"conditional content"
+    blob_id, payload = create_test_blob(content)
+    auth_headers = get_auth_headers(client)
+
+    response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert response.status_code == 201, response.text
+
+    for path in (f"/v1/blobs/{blob_id}", f"/v1/blobs/{blob_id}/content"):
+        first = client.get(path, headers=auth_headers)
+        assert first.status_code == 200, first.text
+        etag = first.headers["etag"]
+        assert etag == f'"{hashlib.sha256(content).hexdigest()}"'
+        assert "immutable" in first.headers["cache-control"]
+
+        revalidated = client.get(
+            path, headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+        since = first.headers["last-modified"]
+        by_date = client.get(
+            path, headers={**auth_headers, "If-Modified-Since": since}
+        )
+        assert by_date.status_code == 304
+
+        changed = client.get(
+            path, headers={**auth_headers, "If-None-Match": '"other"'}
+        )
+        assert changed.status_code == 200
+
+    stale_range = client.get(
+        f"/v1/blobs/{blob_id}/content",
+        headers={**auth_headers, "Range": "bytes=0-3", "If-Range": '"other"'},
+    )
+    assert stale_range.status_code == 200
+    assert stale_range.content == content
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_dedup_shares_content(client_for_backend, monkeypatch):
+    monkeypatch.setenv("DEDUP", "true")
+    from app.infra.settings import get_settings
+
+    get_settings.cache_clear()
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    content = f"shared attachment {uuid.uuid4()}".encode()
+
+    first_id, first = create_test_blob(content)
+    second_id, second = create_test_blob(content)
+    assert client.post("/v1/blobs", json=first, headers=auth_headers).status_code == 201
+    upload_response = client.put(
+        f"/v1/blobs/{second_id}", content=content, headers=auth_headers
+    )
+    assert upload_response.status_code == 201, upload_response.text
+
+    assert client.delete(f"/v1/blobs/{first_id}", headers=auth_headers).status_code == 204
+    assert client.get(f"/v1/blobs/{first_id}", headers=auth_headers).status_code == 404
+    response = client.get(f"/v1/blobs/{second_id}/content", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == content
+
+    assert client.delete(f"/v1/blobs/{second_id}", headers=auth_headers).status_code == 204
+    assert client.get(f"/v1/blobs/{second_id}", headers=auth_headers).status_code == 404
+    assert client.delete(f"/v1/blobs/{second_id}", headers=auth_headers).status_code == 404
+
+    # The last delete removed the content, so saving it again uploads it anew.
+    assert client.post("/v1/blobs", json=first, headers=auth_headers).status_code == 201
+    response = client.get(f"/v1/blobs/{first_id}/content", headers=auth_headers)
+    assert response.content == content
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_compression_is_transparent(client_for_backend, monkeypatch):
+    monkeypatch.setenv("COMPRESSION", "zlib")
+    from app.infra.settings import get_settings
+
+    get_settings.cache_clear()
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    text = b'{"level": "info", "msg": "request served"}\n' * 50000  # ~2 MiB
+    noise = os.urandom(256 * 1024)
+
+    blob_id, payload = create_test_blob(text)
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 201
+    stream_id = f"test-{uuid.uuid4()}"
+    put = client.put(
+        f"/v1/blobs/{stream_id}",
+        content=text,
+        headers={**auth_headers, "Content-Type": "application/octet-stream"},
+    )
+    assert put.status_code == 201, put.text
+    noise_id, noise_payload = create_test_blob(noise)
+    response = client.post("/v1/blobs", json=noise_payload, headers=auth_headers)
+    assert response.status_code == 201
+
+    for bid, content in ((blob_id, text), (stream_id, text), (noise_id, noise)):
+        response = client.get(f"/v1/blobs/{bid}", headers=auth_headers)
+        assert response.json()["size"] == len(content)
+        assert base64.b64decode(response.json()["data"]) == content
+        response = client.get(f"/v1/blobs/{bid}/content", headers=auth_headers)
+        assert response.content == content
+        assert response.headers["etag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+        response = client.get(
+            f"/v1/blobs/{bid}/content",
+            headers={**auth_headers, "Range": "bytes=100000-100099"},
+        )
+        assert response.status_code == 206
+        assert response.content == content[100000:100100]
+
+    if client.app.state.settings.storage == "fs":
+        from app.adapters.storage.local_fs import shard_path
+
+        root = Path(client.app.state.settings.fs_base_path)
+        assert shard_path(root, blob_id).stat().st_size < len(text) // 10
+        assert shard_path(root, noise_id).stat().st_size == len(noise)
+
+
+# fs content is served straight from the file and never enters the cache.
+@pytest.mark.parametrize("client_for_backend", ["s3", "ftp", "db"], indirect=True)
+def test_read_cache(client_for_backend, monkeypatch):
+    monkeypatch.setenv("CACHE_MAX_BYTES", str(4 * 1024 * 1024))
+    from app.infra.settings import get_settings
+
+    get_settings.cache_clear()
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    content = bytes(range(256)) * 1024
+    blob_id, payload = create_test_blob(content)
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 201
+
+    for _ in range(3):
+        response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+        assert response.content == content
+    response = client.get(
+        f"/v1/blobs/{blob_id}/content", headers={**auth_headers, "Range": "bytes=10-19"}
+    )
+    assert response.content == content[10:20]
+
+    stats = client.get("/v1/cache/stats", headers=auth_headers).json()
+    assert stats["enabled"] and stats["misses"] == 1 and stats["hits"] == 3
+
+    assert client.delete(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 204
+    assert client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers).status_code == 404
+    assert client.get("/v1/cache/stats", headers=auth_headers).json()["items"] == 0
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_batch_create_and_get(client_for_backend):
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    blobs = [create_test_blob(f"item {i}".encode()) for i in range(20)]
+    existing_id, existing = blobs[0]
+    assert client.post("/v1/blobs", json=existing, headers=auth_headers).status_code == 201
+
+    items = [payload for _, payload in blobs] + [{"id": f"bad-{uuid.uuid4()}", "data": "@@"}]
+    response = client.post("/v1/blobs:batch", json={"items": items}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    statuses = [r["status"] for r in response.json()["results"]]
+    assert statuses == [409] + [201] * 19 + [400]
+
+    ids = [blob_id for blob_id, _ in blobs] + ["missing-" + str(uuid.uuid4())]
+    response = client.post("/v1/blobs:get", json={"ids": ids}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [r["id"] for r in results] == ids
+    assert results[-1]["status"] == 404
+    for i, result in enumerate(results[:-1]):
+        assert result["status"] == 200
+        assert base64.b64decode(result["data"]) == f"item {i}".encode()
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "db"], indirect=True)
+def test_list_blobs_paginates(client_for_backend):
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    prefix = f"list-{uuid.uuid4()}/"
+    ids = sorted(f"{prefix}{i:02d}" for i in range(7))
+    items = [{"id": blob_id, "data": "eA=="} for blob_id in ids]
+    client.post("/v1/blobs:batch", json={"items": items}, headers=auth_headers)
+
+    for order_by in ("id", "created_at"):
+        seen, after = [], None
+        while True:
+            params = {"prefix": prefix, "limit": 3, "order_by": order_by}
+            if after:
+                params["after"] = after
+            response = client.get("/v1/blobs", params=params, headers=auth_headers)
+            assert response.status_code == 200, response.text
+            page = response.json()
+            assert len(page["items"]) <= 3
+            seen += [item["id"] for item in page["items"]]
+            after = page["next"]
+            if after is None:
+                break
+        assert sorted(seen) == ids and len(seen) == len(ids)
+
+    response = client.get("/v1/blobs", params={"after": "garbage"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_metrics(client_for_backend):
+    client = client_for_backend
+    backend = client.app.state.settings.storage
+    blob_id, payload = create_test_blob(b"x" * 1000)
+    auth_headers = get_auth_headers(client)
+
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 201
+    assert client.get(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 200
+    assert client.get("/v1/blobs/missing-blob", headers=auth_headers).status_code == 404
+
+    response = client.get("/metrics", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    route = '{method="POST",route="/v1/blobs",status="201"}'
+    assert samples[f"http_request_duration_seconds_count{route}"] == 1
+    assert samples['http_bytes_total{route="/v1/blobs",direction="in"}'] > 1000
+    assert samples['app_errors_total{code="not_found"}'] == 1
+    for stage in ("decode", "hash", "encode", "meta_read", "meta_write"):
+        assert samples[f'blob_stage_duration_seconds_count{{stage="{stage}"}}'] >= 1
+    labels = f'{{backend="{backend}",operation="get"}}'
+    assert samples[f"storage_call_duration_seconds_count{labels}"] == 1
+    assert samples[f'storage_bytes_total{{backend="{backend}",direction="written"}}'] == 1000
+    assert samples[f'storage_bytes_total{{backend="{backend}",direction="read"}}'] == 1000
+
+
+def _exported_spans(path: Path, trace_id: str, timeout: float = 5.0) -> list:
+    # Traces are written by a background thread once the response is done.
+    deadline = time.monotonic() + timeout
+    while True:
+        spans = []
+        if path.exists():
+            for line in path.read_text().splitlines():
+                for resource in json.loads(line)["resourceSpans"]:
+                    for scope in resource["scopeSpans"]:
+                        spans += [s for s in scope["spans"] if s["traceId"] == trace_id]
+        if any("parentSpanId" not in s for s in spans) or time.monotonic() > deadline:
+            return spans
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "s3", "ftp", "db"], indirect=True)
+def test_tracing(client_for_backend, monkeypatch, tmp_path):
+    export = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("TRACE_EXPORT", str(export))
+    from app.infra.settings import get_settings
+
+    get_settings.cache_clear()
+    client = client_for_backend
+    backend = client.app.state.settings.storage
+    auth_headers = get_auth_headers(client)
+    blob_id, payload = create_test_blob(b"traced " * 100)
+
+    response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    spans = _exported_spans(export, response.headers["x-trace-id"])
+    names = {s["name"] for s in spans}
+    assert {"POST /v1/blobs", "BlobService.save_stream", "storage.save_stream"} <= names
+    assert {"meta.create", "db.query"} <= names
+    ids = {s["spanId"] for s in spans}
+    assert all(s["parentSpanId"] in ids for s in spans if "parentSpanId" in s)
+    if backend == "s3":
+        assert "s3.sign_v4_streaming" in names or "s3.sign_v4" in names
+    if backend == "ftp":
+        assert "ftp.ensure_dirs" in names
+
+    parent = "0af7651916cd43dd8448eb211c80319c"
+    traceparent = f"00-{parent}-b7ad6b7169203331-01"
+    response = client.get(
+        f"/v1/blobs/{blob_id}", headers={**auth_headers, "traceparent": traceparent}
+    )
+    assert response.headers["x-trace-id"] == parent
+    spans = _exported_spans(export, parent)
+    root = next(s for s in spans if s["name"] == "GET /v1/blobs/{blob_id}")
+    assert root["parentSpanId"] == "b7ad6b7169203331"
+    assert {"BlobService.get", "storage.get", "encode"} <= {s["name"] for s in spans}
+
+    unsampled = f"00-{parent[::-1]}-b7ad6b7169203331-00"
+    response = client.get(
+        f"/v1/blobs/{blob_id}", headers={**auth_headers, "traceparent": unsampled}
+    )
+    assert response.status_code == 200
+    assert "x-trace-id" not in response.headers
+
+
+@pytest.mark.parametrize("client_for_backend", ["fs", "db"], indirect=True)
+def test_profile_on_demand(client_for_backend, monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_TOKEN", "profile-secret")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    from app.infra.settings import get_settings
+
+    get_settings.cache_clear()
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    blob_id, payload = create_test_blob(b"x" * 4 * 1024 * 1024)
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 201
+
+    response = client.get(
+        f"/v1/blobs/{blob_id}", headers={**auth_headers, "X-Profile": "wrong"}
+    )
+    assert "x-profile-id" not in response.headers
+
+    response = client.get(
+        f"/v1/blobs/{blob_id}?profile=profile-secret", headers=auth_headers
+    )
+    assert response.status_code == 200
+    profile = tmp_path / f"{response.headers['x-profile-id']}.folded"
+    stacks = profile.read_text().splitlines()
+    assert stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+
+@pytest.mark.parametrize("client_for_backend", ["tiered:s3", "tiered:ftp"], indirect=True)
+def test_tiered_storage(client_for_backend):
+    from app.api import dependencies
+
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    cold = os.environ["TIER_COLD"]
+    content = b"tiered" * 1000
+    blob_id, payload = create_test_blob(content)
+    assert client.post("/v1/blobs", json=payload, headers=auth_headers).status_code == 201
+
+    def tier():
+        for backend in ("fs", cold):
+            params = {"prefix": blob_id, "backend": backend}
+            page = client.get("/v1/blobs", params=params, headers=auth_headers).json()
+            if page["items"]:
+                return backend
+
+    migrator = dependencies._migrator
+    migrator.delete_grace = 0
+    assert tier() == "fs"
+    assert client.portal.call(migrator.move, blob_id, "fs", cold)
+    assert tier() == cold
+
+    # Reads follow the blob; repeated ones bring it back to the hot tier.
+    for _ in range(3):
+        response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.content == content
+    client.portal.call(migrator.run_once)
+    assert tier() == "fs"
+    assert base64.b64decode(
+        client.get(f"/v1/blobs/{blob_id}", headers=auth_headers).json()["data"]
+    ) == content
+
+    assert client.delete(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 204
+    assert client.get(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 404
+
+
+@pytest.mark.parametrize("client_for_backend", ["mirror:fs,s3", "mirror:s3,ftp"], indirect=True)
+def test_mirrored_storage(client_for_backend):
+    from app.api import dependencies
+    from app.infra.errors import NotFound
+
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    content = b"mirrored" * 1000
+    blob_id = f"test-{uuid.uuid4()}"
+    response = client.put(
+        f"/v1/blobs/{blob_id}",
+        content=content,
+        headers={**auth_headers, "Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 201, response.text
+
+    mirror = dependencies._storages["mirror"].inner
+    client.portal.call(mirror.settle)
+    for replica in mirror.replicas:
+        assert client.portal.call(replica.get, blob_id)[0] == content
+
+    # A lost replica is served around and then repaired.
+    lost = mirror.replicas[0]
+    client.portal.call(lost.delete, blob_id)
+    response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == content
+    client.portal.call(mirror.settle)
+    assert client.portal.call(lost.get, blob_id)[0] == content
+
+    assert client.delete(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 204
+    for replica in mirror.replicas:
+        with pytest.raises(NotFound):
+            client.portal.call(replica.get, blob_id)
+
+
+@pytest.mark.parametrize("client_for_backend", ["s3:async", "ftp:async"], indirect=True)
+def test_async_ingest(client_for_backend):
+    from app.api import dependencies
+    from app.infra.errors import NotFound
+
+    client = client_for_backend
+    auth_headers = get_auth_headers(client)
+    ingest = dependencies._ingest
+    backend = os.environ["STORAGE"]
+
+    def status(blob_id):
+        page = client.get("/v1/blobs", params={"prefix": blob_id}, headers=auth_headers)
+        return page.json()["items"][0]["status"]
+
+    # With the uploaders stopped, blobs stay staged and are read from there.
+    client.portal.call(ingest.aclose)
+    content = b"write-behind" * 1000
+    blob_id = f"test-{uuid.uuid4()}"
+    response = client.put(
+        f"/v1/blobs/{blob_id}",
+        content=content,
+        headers={**auth_headers, "Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 202, response.text
+    assert response.json()["status"] == "PENDING"
+    other_id, payload = create_test_blob(b"posted")
+    response = client.post("/v1/blobs", json=payload, headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "PENDING"
+
+    assert status(blob_id) == "PENDING"
+    with pytest.raises(NotFound):
+        client.portal.call(ingest.storage.get, blob_id)
+    response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert response.content == content
+    assert client.put(
+        f"/v1/blobs/{blob_id}", content=b"x", headers=auth_headers
+    ).status_code == 409
+
+    # A restart releases the journaled uploads and the sweep resumes them.
+    client.portal.call(ingest.aclose)
+    ingest.poll_interval = 0.05
+    client.portal.call(ingest.start)
+    deadline = time.monotonic() + 10
+    while status(blob_id) == "PENDING" or status(other_id) == "PENDING":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert status(blob_id) == status(other_id) == "COMMITTED"
+    assert client.portal.call(ingest.storage.get, blob_id)[0] == content
+    with pytest.raises(NotFound):
+        client.portal.call(ingest.staging.get, blob_id)
+
+    page = client.get("/v1/blobs", params={"prefix": blob_id}, headers=auth_headers)
+    assert page.json()["items"][0]["backend"] == backend
+    response = client.get(f"/v1/blobs/{blob_id}/content", headers=auth_headers)
+    assert response.content == content
+    assert client.delete(f"/v1/blobs/{blob_id}", headers=auth_headers).status_code == 204
+    with pytest.raises(NotFound):
+        client.portal.call(ingest.storage.get, blob_id)
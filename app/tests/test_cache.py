@@ -0,0 +1,65 @@
+import asyncio
+import base64
+
+from app.adapters.storage.cached import CachedStorage
+from app.api import dependencies
+from app.domain.services.blob_service import BlobService
+from app.infra.cache.blob_cache import BlobCache
+from app.infra.db import Base, make_async_engine, make_async_session_factory
+from app.infra.repositories.metadata.repository import AsyncSqlAlchemyMetadataRepository
+from app.infra.settings import Settings
+from app.infra.uow.sqlalchemy_uow import AsyncSqlAlchemyUnitOfWork
+
+
+def test_recreated_id_is_not_served_from_cache(tmp_path, memory_storage):
+    settings = Settings(auth_bearer_token="t")
+    backend = memory_storage()
+    cache_dir = str(tmp_path / "cache")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = make_async_session_factory(engine)
+
+        async def request(storage, call):
+            async with sessions() as session:
+                service = BlobService(
+                    storage,
+                    AsyncSqlAlchemyMetadataRepository(session),
+                    "s3",
+                    uow=AsyncSqlAlchemyUnitOfWork(session),
+                )
+                result = await call(service)
+                await session.commit()
+            return result
+
+        def read(service):
+            return service.get("a")
+
+        cache = BlobCache(1 << 20, 1 << 20, cache_dir, 1 << 20)
+        cached = CachedStorage(backend, cache, "s3")
+        await request(cached, lambda s: s.save("a", base64.b64encode(b"one").decode()))
+        first = (await request(cached, read))["data"]
+        assert cache.stats()["disk_items"] == 1
+
+        # Another worker, whose delete never reaches this cache.
+        await request(backend, lambda s: s.delete("a"))
+        await request(backend, lambda s: s.save("a", base64.b64encode(b"two").decode()))
+
+        running = (await request(cached, read))["data"]
+        restarted = CachedStorage(backend, BlobCache(1 << 20, 1 << 20, cache_dir, 1 << 20), "s3")
+        fresh = (await request(restarted, read))["data"]
+        await engine.dispose()
+        return [base64.b64decode(d) for d in (first, running, fresh)]
+
+    assert asyncio.run(run()) == [b"one", b"two", b"two"]
+
+
+def test_shutdown_drops_the_cache():
+    settings = Settings(auth_bearer_token="t", cache_max_bytes=1 << 20)
+    first = dependencies.get_blob_cache(settings)
+    asyncio.run(dependencies._shutdown())
+    # The next lifespan starts empty, with a fresh epoch.
+    assert dependencies.get_blob_cache(settings) is not first
+    asyncio.run(dependencies._shutdown())
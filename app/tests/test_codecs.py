@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from app.infra.codecs import get_codec
+
+
+@pytest.mark.parametrize("name", ["zlib", "zstd"])
+def test_round_trip_and_bounded_decode(name):
+    if name == "zstd":
+        pytest.importorskip("zstandard")
+    codec = get_codec(name)
+    data = b"\0" * (64 * 1024 * 1024)
+    packed = codec.compress(data)
+    assert len(packed) < 1024 * 1024
+
+    decoder = codec.decoder()
+    pieces = list(decoder.feed(packed)) + [decoder.flush()]
+    assert max(len(p) for p in pieces) <= 32 * 1024 * 1024
+    assert b"".join(pieces) == data
+
+
+def test_sampling_skips_incompressible_data():
+    codec = get_codec("zlib")
+    assert codec.compresses(b"abc" * 10000)
+    assert not codec.compresses(os.urandom(64 * 1024))
+    assert not codec.compresses(b"tiny")
+    assert get_codec("") is None
+    with pytest.raises(ValueError):
+        get_codec("lz4")
@@ -0,0 +1,271 @@
+import asyncio
+import base64
+import sqlite3
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.domain.services.blob_service import BlobService
+from app.infra.db import Base, make_async_engine, make_async_session_factory
+from app.infra.repositories.metadata.repository import AsyncSqlAlchemyMetadataRepository
+from app.infra.settings import Settings
+from app.infra.uow.sqlalchemy_uow import AsyncSqlAlchemyUnitOfWork
+
+
+def test_sqlite_concurrent_writers(tmp_path):
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE counter (n INTEGER)"))
+            await conn.execute(text("INSERT INTO counter VALUES (0)"))
+
+        async def bump():
+            # Read, yield to the other writers, then write in the same transaction.
+            async with engine.begin() as conn:
+                await conn.execute(text("SELECT n FROM counter"))
+                await asyncio.sleep(0)
+                await conn.execute(text("UPDATE counter SET n = n + 1"))
+
+        await asyncio.gather(*(bump() for _ in range(32)))
+        async with engine.connect() as conn:
+            mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar_one()
+            n = (await conn.execute(text("SELECT n FROM counter"))).scalar_one()
+        await engine.dispose()
+        return mode, n
+
+    assert asyncio.run(run()) == ("wal", 32)
+
+
+# blob_metadata as the first release created it.
+_BASELINE_SCHEMA = """
+CREATE TABLE blob_metadata (
+    id VARCHAR(512) NOT NULL,
+    size INTEGER NOT NULL,
+    created_at DATETIME NOT NULL,
+    backend VARCHAR(50) NOT NULL,
+    checksum VARCHAR(128) NOT NULL,
+    PRIMARY KEY (id)
+);
+INSERT INTO blob_metadata VALUES ('old', 5, '2024-01-01 00:00:00.000000', 'fs', 'abc');
+"""
+
+
+def test_upgrade_from_baseline_schema(tmp_path):
+    from datetime import datetime, timezone
+
+    from app.domain.entities.blob_metadata import BlobMeta
+    from app.infra.schema import upgrade_schema
+
+    path = tmp_path / "meta.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(_BASELINE_SCHEMA)
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{path}", settings)
+        for _ in range(2):
+            async with engine.begin() as conn:
+                await conn.run_sync(upgrade_schema)
+        async with AsyncSession(engine) as session:
+            repo = AsyncSqlAlchemyMetadataRepository(session)
+            await repo.create(
+                BlobMeta("new", 3, datetime.now(timezone.utc), "fs", "def", codec="zstd")
+            )
+            old, new = await repo.get("old"), await repo.get("new")
+            await session.commit()
+        async with engine.connect() as conn:
+            row = (
+                await conn.execute(
+                    text("SELECT access_count, attempts FROM blob_metadata WHERE id = 'old'")
+                )
+            ).one()
+            indexes = {
+                r[1]
+                for r in await conn.exec_driver_sql("PRAGMA index_list(blob_metadata)")
+            }
+        await engine.dispose()
+        return old, new, tuple(row), indexes
+
+    old, new, counters, indexes = asyncio.run(run())
+    assert (old.status, old.content_ref, old.codec) == ("COMMITTED", None, None)
+    assert counters == (0, 0)
+    assert new.codec == "zstd"
+    assert {"ix_blob_metadata_created_at_id", "ix_blob_metadata_status_lease_until"} <= indexes
+
+
+def test_sizes_past_int32_round_trip(tmp_path):
+    from datetime import datetime, timezone
+
+    from sqlalchemy import BIGINT, INTEGER
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+
+    from app.domain.entities.blob_metadata import BlobMeta
+    from app.infra.repositories.blob_data.models import BlobDataModel
+    from app.infra.repositories.metadata.models import BlobContentModel, BlobMetaModel
+    from app.infra.schema import _needs_bigint, _widen_to_bigint
+
+    size = 5 * 2**30
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine) as session:
+            repo = AsyncSqlAlchemyMetadataRepository(session)
+            await repo.create(BlobMeta("big", size, datetime.now(timezone.utc), "s3", "abc"))
+            await session.commit()
+        async with AsyncSession(engine) as session:
+            meta = await AsyncSqlAlchemyMetadataRepository(session).get("big")
+        await engine.dispose()
+        return meta.size
+
+    assert asyncio.run(run()) == size
+    # int4 on PostgreSQL would overflow.
+    for model in (BlobMetaModel, BlobContentModel, BlobDataModel):
+        ddl = str(CreateTable(model.__table__).compile(dialect=postgresql.dialect()))
+        assert "size BIGINT" in ddl
+
+    class _PgConn:
+        dialect = postgresql.dialect()
+        sql = []
+
+        def exec_driver_sql(self, statement):
+            self.sql.append(statement)
+
+    conn, size_col = _PgConn(), BlobMetaModel.__table__.c.size
+    assert _needs_bigint(conn, size_col, {"type": INTEGER()})
+    assert not _needs_bigint(conn, size_col, {"type": BIGINT()})
+    _widen_to_bigint(conn, BlobMetaModel.__table__, size_col)
+    assert conn.sql == ["ALTER TABLE blob_metadata ALTER COLUMN size TYPE BIGINT"]
+
+
+def test_prefix_listing(tmp_path):
+    from datetime import datetime, timezone
+
+    from app.domain.entities.blob_metadata import BlobMeta
+
+    ids = [
+        "a-b", "a.b/c", "a.b/d", "a.b0", "a.c", "50%_off", "500",
+        "x\U0010ffff", "x\U0010ffff\U0010ffff", "x\U0010ffffy", "y", "\ud7ff!", "\ue000",
+    ]
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine) as session:
+            repo = AsyncSqlAlchemyMetadataRepository(session)
+            for blob_id in ids:
+                await repo.create(BlobMeta(blob_id, 1, datetime.now(timezone.utc), "fs", "c"))
+            await session.commit()
+        pages = {}
+        for prefix in ("a.b", "a.b/", "50%", "x\U0010ffff", "\U0010ffff", "\ud7ff"):
+            for order_by in ("id", "created_at"):
+                async with AsyncSession(engine) as session:
+                    repo = AsyncSqlAlchemyMetadataRepository(session)
+                    pages[prefix, order_by] = sorted(
+                        [m.id async for m in repo.iter_page(order_by, 100, prefix=prefix)]
+                    )
+        await engine.dispose()
+        return pages
+
+    expected = {
+        "a.b": ["a.b/c", "a.b/d", "a.b0"],
+        "a.b/": ["a.b/c", "a.b/d"],
+        "50%": ["50%_off"],
+        "x\U0010ffff": ["x\U0010ffff", "x\U0010ffff\U0010ffff", "x\U0010ffffy"],
+        "\U0010ffff": [],
+        "\ud7ff": ["\ud7ff!"],
+    }
+    pages = asyncio.run(run())
+    for (prefix, _order_by), page in pages.items():
+        assert page == sorted(expected[prefix])
+
+
+# blob_data as the first release created it, with one blob stored inline.
+_BASELINE_BLOB_DATA = """
+CREATE TABLE blob_data (
+    id VARCHAR(512) NOT NULL,
+    data BLOB NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+INSERT INTO blob_data VALUES ('old', X'68656C6C6F20776F726C64', '2024-01-01 00:00:00.000000');
+"""
+
+
+def test_upgrade_blob_data_keeps_inline_rows(tmp_path):
+    from app.adapters.storage.db import DbBlobStorage
+    from app.infra.schema import upgrade_schema
+
+    path = tmp_path / "meta.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(_BASELINE_BLOB_DATA)
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{path}", settings)
+        for _ in range(2):
+            async with engine.begin() as conn:
+                await conn.run_sync(upgrade_schema)
+        async with AsyncSession(engine) as session:
+            storage = DbBlobStorage(session, chunk_size=4)
+            await storage.save("new", b"chunked blob")
+            await session.commit()
+            old, old_size, _ = await storage.get("old")
+            chunks, _, _ = await storage.get_stream("old", offset=6, length=3)
+            part = b"".join([c async for c in chunks])
+            new, new_size, _ = await storage.get("new")
+        await engine.dispose()
+        return old, old_size, part, new, new_size
+
+    assert asyncio.run(run()) == (b"hello world", 11, b"wor", b"chunked blob", 12)
+
+
+def test_dedup_saves_hold_no_lock_across_uploads(tmp_path, memory_storage):
+    # Every upload outlasts the wait for SQLite's write lock.
+    settings = Settings(auth_bearer_token="t", sqlite_busy_timeout=0.2)
+    backend = memory_storage(delay=0.5)
+    payloads = [base64.b64encode(b"shared" if i % 2 else b"%d" % i).decode() for i in range(8)]
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = make_async_session_factory(engine)
+
+        async def save(i: int) -> None:
+            # One request: its own session and service, committed at the end.
+            async with sessions() as session:
+                service = BlobService(
+                    backend,
+                    AsyncSqlAlchemyMetadataRepository(session),
+                    "s3",
+                    uow=AsyncSqlAlchemyUnitOfWork(session),
+                    dedup=True,
+                )
+                await service.save(f"blob-{i}", payloads[i])
+                await session.commit()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(save(i) for i in range(len(payloads))))
+        elapsed = time.perf_counter() - started
+        async with engine.connect() as conn:
+            refcounts = sorted(
+                r[0] for r in await conn.exec_driver_sql("SELECT refcount FROM blob_content")
+            )
+        await engine.dispose()
+        return elapsed, refcounts
+
+    elapsed, refcounts = asyncio.run(run())
+    # Four distinct payloads and one shared by the other four; the shared
+    # one is stored once.
+    assert refcounts == [1, 1, 1, 1, 4]
+    assert len(backend.blobs) == 5
+    assert elapsed < 2.0
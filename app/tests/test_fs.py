@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from app.adapters.storage.local_fs import LocalFsStorage, shard_path
+from app.infra.errors import Conflict
+from app.infra.fs.group_commit import GroupCommitter
+from app.infra.fs.migrate import _DATA_ASIDE, migrate
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_migrate_flat_tree(tmp_path):
+    storage = LocalFsStorage(str(tmp_path))
+    storage.save("sharded", b"s")
+    legacy = {
+        "a": b"1",
+        "nested/dir/b": b"2",
+        # Ids under data/ live next to the sharded tree.
+        "data/c": b"3",
+        "data/ab/cd/e": b"4",
+        # Not a temp file: those end in .tmp.<32 hex digits>.
+        "report.tmp.v2": b"5",
+    }
+    for blob_id, data in legacy.items():
+        _write(tmp_path / blob_id, data)
+    leftover = tmp_path / "nested" / f"f.tmp.{'0123' * 8}"
+    _write(leftover, b"partial")
+
+    assert migrate(tmp_path, dry_run=True) == 5
+    assert (tmp_path / "a").is_file()
+
+    assert migrate(tmp_path) == 5
+    for blob_id, data in {**legacy, "sharded": b"s"}.items():
+        assert shard_path(tmp_path, blob_id).read_bytes() == data
+        assert storage.get(blob_id)[0] == data
+    assert not (tmp_path / "a").exists() and not (tmp_path / "data" / "c").exists()
+    assert not (tmp_path / "nested" / "dir").exists()
+    assert not (tmp_path / "data" / "ab" / "cd" / "e").exists()
+    assert leftover.read_bytes() == b"partial"
+
+    assert migrate(tmp_path) == 0
+    assert storage.get("a")[0] == b"1"
+
+
+def test_migrate_blob_named_data(tmp_path):
+    _write(tmp_path / "data", b"x")
+    _write(tmp_path / "other", b"y")
+    storage = LocalFsStorage(str(tmp_path))
+    assert storage.get("data")[0] == b"x"
+
+    assert migrate(tmp_path) == 2
+    assert storage.get("data")[0] == b"x"
+    assert storage.get("other")[0] == b"y"
+    storage.save("new", b"z")
+    assert storage.get("new")[0] == b"z"
+
+    # Interrupted after the blob was moved aside: the re-run finishes it.
+    _write(tmp_path / _DATA_ASIDE, b"w")
+    storage.delete("data")
+    assert migrate(tmp_path) == 1
+    assert storage.get("data")[0] == b"w"
+    assert not (tmp_path / _DATA_ASIDE).exists()
+
+
+@pytest.mark.parametrize("use_syncfs", [False, True])
+def test_group_commit_concurrent_saves(tmp_path, use_syncfs):
+    committer = GroupCommitter(window=0.05, use_syncfs=use_syncfs)
+    storage = LocalFsStorage(str(tmp_path), committer)
+    start = threading.Barrier(9)
+    errors = []
+
+    def save(blob_id, data):
+        start.wait()
+        try:
+            storage.save(blob_id, data)
+        except Conflict as exc:
+            errors.append(exc)
+
+    threads = [
+        threading.Thread(target=save, args=(f"b{i}", bytes([i]) * 100)) for i in range(7)
+    ]
+    threads += [threading.Thread(target=save, args=("same", d)) for d in (b"1", b"2")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i in range(7):
+        assert storage.get(f"b{i}")[0] == bytes([i]) * 100
+    # Both writers of one id can't win.
+    assert len(errors) == 1
+    assert storage.get("same")[0] in (b"1", b"2")
+    assert committer.batches < 9
+    assert not list(tmp_path.rglob("*.tmp.*"))
@@ -0,0 +1,177 @@
+import socket
+import threading
+import uuid
+from ftplib import error_temp
+
+import pytest
+
+from app.adapters.storage.ftp import FtpStorage, close_pools
+from app.infra.errors import NotFound
+from app.infra.ftp.pool import FtpConnectionPool, PoolExhausted
+from app.infra.settings import Settings
+
+
+@pytest.fixture
+def ftp(monkeypatch):
+    monkeypatch.setenv("FTP_POOL_MIN_SIZE", "1")
+    monkeypatch.setenv("FTP_POOL_MAX_SIZE", "2")
+    # Keepalive pings stay out of the way; checkout checks are opted into.
+    monkeypatch.setenv("FTP_POOL_KEEPALIVE", "30")
+    monkeypatch.setenv("FTP_TIMEOUT", "2")
+    close_pools()
+    storage = FtpStorage(Settings())
+    yield storage
+    close_pools()
+
+
+def _kill(conn):
+    # The server side of a dropped session: the next command hits EOF.
+    conn.sock.shutdown(socket.SHUT_RDWR)
+
+
+def test_pool_sizing_and_checkout_health(ftp):
+    pool = ftp.pool
+    pool.checkout_timeout = 0.2
+    a, b = pool.acquire(), pool.acquire()
+    assert pool.size == 2
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert pool.idle == 2
+
+    # Idle sessions past min_size are closed on the keepalive tick.
+    pool.ping_idle()
+    assert (pool.size, pool.idle) == (1, 1)
+
+    # Checked before reuse once idle for longer than the keepalive.
+    pool.keepalive = 0
+    stale = pool.acquire()
+    pool.release(stale)
+    _kill(stale)
+    fresh = pool.acquire()
+    assert fresh is not stale and stale.sock is None
+    fresh.voidcmd("NOOP")
+    pool.release(fresh)
+    assert pool.size == 1
+
+
+def test_dropped_sessions_are_discarded(ftp):
+    pool, blob_id = ftp.pool, f"pool-{uuid.uuid4().hex}"
+    ftp.save(blob_id, b"payload")
+
+    # Broken pipe: the call is retried on a new session.
+    with pool.connection() as conn:
+        pass
+    _kill(conn)
+    assert ftp.get(blob_id)[0] == b"payload"
+    assert conn.sock is None and pool.size == 1
+
+    # 421: the server is closing the session.
+    with pool.connection() as conn:
+        pass
+
+    def closing(cmd):
+        raise error_temp("421 Service not available, closing control connection")
+
+    conn.sendcmd = closing
+    assert ftp.get(blob_id)[0] == b"payload"
+    assert conn.sock is None and pool.size == 1
+
+    # A 550 leaves the session usable.
+    with pool.connection() as conn:
+        pass
+    with pytest.raises(NotFound):
+        ftp.get(f"{blob_id}-missing")
+    with pool.connection() as again:
+        assert again is conn
+    ftp.delete(blob_id)
+
+
+def test_known_dirs_survive_removed_directories_and_dead_sessions(ftp):
+    pool, blob_id = ftp.pool, f"pool-{uuid.uuid4().hex}"
+    key = ftp._final_path(blob_id)
+    dirs = key.split("/")[:-1]
+    ftp.save(blob_id, b"one")
+    assert "/".join(dirs) in pool.known_dirs
+
+    # The shard directory goes away while it is still cached.
+    ftp.delete(blob_id)
+    with pool.connection() as conn:
+        for i in range(len(dirs), 0, -1):
+            try:
+                conn.rmd("/".join(dirs[:i]))
+            except Exception:
+                break
+    ftp.save(blob_id, b"two")
+    assert ftp.get(blob_id)[0] == b"two"
+
+    _kill(conn)
+    ftp.delete(blob_id)
+    ftp.save(blob_id, b"three")
+    assert ftp.get(blob_id)[0] == b"three"
+    ftp.delete(blob_id)
+    assert pool.size == 1
+
+
+class _FakeFtp:
+    """Answers NOOP once ``answer`` is set; records when it is closed."""
+
+    def __init__(self):
+        self.pinging = threading.Event()
+        self.answer = threading.Event()
+        self.answer.set()
+        self.closed = False
+
+    def voidcmd(self, cmd):
+        self.pinging.set()
+        self.answer.wait(5)
+        return "200 OK"
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def _pinging(pool, slow):
+    slow.answer.clear()
+    pinger = threading.Thread(target=pool.ping_idle)
+    pinger.start()
+    assert slow.pinging.wait(5)
+    return pinger
+
+
+def test_close_during_ping_closes_the_pinged_session():
+    slow = _FakeFtp()
+    pool = FtpConnectionPool(lambda: slow, min_size=1, keepalive=0)
+    pool.release(pool.acquire())
+
+    pinger = _pinging(pool, slow)
+    pool.close()
+    slow.answer.set()
+    pinger.join(5)
+    assert slow.closed
+    assert (pool.size, pool.idle) == (0, 0)
+
+
+def test_ping_leaves_other_sessions_available():
+    dialed = []
+
+    def connect():
+        dialed.append(_FakeFtp())
+        return dialed[-1]
+
+    pool = FtpConnectionPool(connect, min_size=2, keepalive=0)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(b)
+    pool.release(a)
+
+    # The oldest idle session is pinged first; the other is handed out.
+    pinger = _pinging(pool, b)
+    assert pool.acquire() is a
+    b.answer.set()
+    pinger.join(5)
+    assert len(dialed) == 2 and pool.idle == 1
+    pool.close()
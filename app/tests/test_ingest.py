@@ -0,0 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from app.domain.entities.blob_metadata import BlobMeta
+from app.domain.services.ingest import IngestQueue
+from app.infra.db import Base, make_async_engine, make_async_session_factory
+from app.infra.repositories.metadata.repository import AsyncSqlAlchemyMetadataRepository
+from app.infra.settings import Settings
+
+
+def test_uploads_are_retried_then_failed(tmp_path, memory_storage):
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = make_async_session_factory(engine)
+
+        @asynccontextmanager
+        async def scope():
+            async with sessions() as session:
+                yield AsyncSqlAlchemyMetadataRepository(session)
+                await session.commit()
+
+        staging, backend = memory_storage(), memory_storage(failures={"flaky": 1, "down": 99})
+        queue = IngestQueue(
+            staging, backend, scope, "s3",
+            max_attempts=3, retry_backoff=0, lease=0, poll_interval=0.01,
+        )
+        for blob_id in ("flaky", "down"):
+            await queue.begin(blob_id)
+            await staging.save(blob_id, b"payload")
+            await queue.staged(
+                BlobMeta(blob_id, 7, datetime.now(timezone.utc), "s3", "c", status="PENDING")
+            )
+        # Journaled, but the process died before it was staged.
+        await queue.begin("lost")
+
+        queue.start()
+        for _ in range(500):
+            async with scope() as repo:
+                metas = await repo.get_many(["flaky", "down", "lost"])
+            if all(m.status != "PENDING" for m in metas.values()) and "lost" not in metas:
+                break
+            await asyncio.sleep(0.01)
+        await queue.aclose()
+        await engine.dispose()
+        return {k: m.status for k, m in metas.items()}, staging.blobs, backend.blobs
+
+    statuses, staged, stored = asyncio.run(run())
+    assert statuses == {"flaky": "COMMITTED", "down": "FAILED"}
+    # Failed uploads keep their staged copy.
+    assert staged == {"down": b"payload"}
+    assert stored == {"flaky": b"payload"}
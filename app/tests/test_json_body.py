@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from fastapi.exceptions import RequestValidationError
+
+from app.api.json_body import BlobBody
+
+
+def _parse(body: bytes, size: int):
+    async def chunks():
+        for i in range(0, len(body), size):
+            yield body[i : i + size]
+
+    async def run():
+        parsed = BlobBody(chunks())
+        assert await parsed.read_until_stream()
+        data = b"".join([piece async for piece in parsed.stream()])
+        await parsed.finish()
+        return parsed.fields, data
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_escaped_control_characters_are_allowed(size):
+    fields, data = _parse(b'{"id": "a\\tb\\u0001", "data": "aGk=", "x": "\\n"}', size)
+    assert fields == {"id": "a\tb\x01", "x": "\n"}
+    assert data == b"aGk="
+
+
+@pytest.mark.parametrize("size", [1, 3, 1024])
+def test_raw_control_characters_are_rejected(size):
+    with pytest.raises(RequestValidationError):
+        _parse(b'{"id": "a\tb", "data": "aGk="}', size)
@@ -0,0 +1,31 @@
+from app.infra.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_text_exposition():
+    registry = Registry()
+    hist = Histogram(
+        "op_seconds", "Op latency.", ("op",), buckets=(0.1, 1.0), registry=registry
+    )
+    counter = Counter("errors_total", "Errors.", ("code",), registry=registry)
+    gauge = Gauge("pool", "Pool size.", ("state",), registry=registry)
+
+    for value in (0.05, 0.5, 5.0):
+        hist.labels("save").observe(value)
+    counter.labels('a"b').inc(2)
+    gauge.labels("idle").set_function(lambda: 3)
+
+    assert registry.render().splitlines() == [
+        "# HELP op_seconds Op latency.",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{op="save",le="0.1"} 1',
+        'op_seconds_bucket{op="save",le="1"} 2',
+        'op_seconds_bucket{op="save",le="+Inf"} 3',
+        'op_seconds_sum{op="save"} 5.55',
+        'op_seconds_count{op="save"} 3',
+        "# HELP errors_total Errors.",
+        "# TYPE errors_total counter",
+        'errors_total{code="a\\"b"} 2',
+        "# HELP pool Pool size.",
+        "# TYPE pool gauge",
+        'pool{state="idle"} 3',
+    ]
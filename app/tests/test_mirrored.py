@@ -0,0 +1,103 @@
+import asyncio
+
+from app.adapters.storage.mirrored import MirroredStorage
+from app.infra.errors import Conflict, NotFound
+
+
+async def _stream(data):
+    for i in range(0, len(data), 3):
+        yield data[i : i + 3]
+
+
+def test_quorum_write_and_hedged_read(memory_storage):
+    async def run():
+        fast, slow = memory_storage(), memory_storage(delay=0.3)
+        mirror = MirroredStorage([slow, fast], ["slow", "fast"], quorum=1, hedge_max_delay=0.02)
+
+        started = asyncio.get_running_loop().time()
+        await mirror.save_stream("a", _stream(b"payload"), 7)
+        acked = asyncio.get_running_loop().time() - started
+        assert "a" in fast.blobs and "a" not in slow.blobs
+        await mirror.settle()
+        assert slow.blobs["a"] == b"payload"
+
+        # The slow replica is tried first while unmeasured, then hedged around.
+        started = asyncio.get_running_loop().time()
+        data, _size, _created_at = await mirror.get("a")
+        first_read = asyncio.get_running_loop().time() - started
+        assert data == b"payload"
+        assert mirror.ranked("get") == [1, 0]
+        await mirror.aclose()
+        return acked, first_read
+
+    acked, first_read = asyncio.run(run())
+    assert acked < 0.2 and first_read < 0.2
+
+
+def test_missing_replica_is_repaired(memory_storage):
+    async def run():
+        a, b = memory_storage(), memory_storage()
+        mirror = MirroredStorage([a, b], ["a", "b"], repair_backoff=0)
+        await mirror.save("k", b"data")
+        del a.blobs["k"]
+        chunks, _size, _created_at = await mirror.get_stream("k", 1, 2)
+        assert b"".join([c async for c in chunks]) == b"at"
+        await mirror.settle()
+        assert a.blobs["k"] == b"data"
+
+        await mirror.delete("k")
+        assert not a.blobs and not b.blobs
+        try:
+            await mirror.get("k")
+        except NotFound:
+            return
+        raise AssertionError("expected NotFound")
+
+    asyncio.run(run())
+
+
+def test_write_without_quorum_is_undone(memory_storage):
+    async def run():
+        a, b, c = memory_storage(), memory_storage(), memory_storage()
+        b.blobs["k"] = c.blobs["k"] = b"old"
+        mirror = MirroredStorage([a, b, c], ["a", "b", "c"])
+        try:
+            await mirror.save("k", b"new")
+        except Conflict:
+            pass
+        else:
+            raise AssertionError("expected Conflict")
+        await mirror.settle()
+        return a.blobs
+
+    assert asyncio.run(run()) == {}
+
+
+def test_failed_replica_delete_is_retried(memory_storage):
+    async def run():
+        a, b = memory_storage(), memory_storage()
+        mirror = MirroredStorage([a, b], ["a", "b"], repair_backoff=0)
+        await mirror.save("k", b"data")
+
+        failing = [1]
+        delete = b.delete
+
+        async def flaky_delete(blob_id):
+            if failing[0]:
+                failing[0] -= 1
+                raise OSError("replica unavailable")
+            await delete(blob_id)
+
+        b.delete = flaky_delete
+        # The metadata is already gone: the delete succeeds regardless.
+        await mirror.delete("k")
+        assert not a.blobs
+        await mirror.settle()
+        assert not b.blobs
+        try:
+            await mirror.delete("k")
+        except NotFound:
+            return
+        raise AssertionError("expected NotFound")
+
+    asyncio.run(run())
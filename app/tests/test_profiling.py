@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from app.infra.profiling import Sampler
+
+
+def _spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def _profiled_work() -> None:
+    for _ in range(5):
+        _spin(0.02)
+        await asyncio.sleep(0)
+
+
+async def _other_work() -> None:
+    for _ in range(5):
+        _spin(0.02)
+        await asyncio.sleep(0)
+
+
+def test_only_the_profiled_tasks_are_sampled():
+    async def run():
+        other = asyncio.create_task(_other_work())
+        async with Sampler(0.001) as sampler:
+            await _profiled_work()
+        await other
+        return sampler.folded()
+
+    folded = asyncio.run(run())
+    assert "_profiled_work" in folded
+    assert "_other_work" not in folded
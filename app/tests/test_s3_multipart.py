@@ -0,0 +1,86 @@
+import asyncio
+import os
+
+import pytest
+
+from app.adapters.storage.s3 import S3HttpStorage
+from app.infra.errors import NotFound
+from app.infra.settings import Settings
+
+MiB = 1024 * 1024
+
+
+async def _stream(data, fail_after=None):
+    for i in range(0, len(data), MiB):
+        if fail_after is not None and i >= fail_after:
+            # Lets the parts already cut reach the store first.
+            await asyncio.sleep(0.5)
+            raise IOError("client went away")
+        yield data[i : i + MiB]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    # The part size is raised to S3's 5 MiB minimum; anything past 1 MiB
+    # goes multipart.
+    monkeypatch.setenv("S3_MULTIPART_THRESHOLD", str(MiB))
+    monkeypatch.setenv("S3_PART_SIZE", str(MiB))
+    storage = S3HttpStorage(Settings())
+    sent = []
+    request = storage._request
+
+    async def recording(method, url, headers=None, content=None):
+        sent.append((method, url.partition("?")[2], (headers or {}).get("range")))
+        return await request(method, url, headers, content)
+
+    storage._request = recording
+    return storage, sent
+
+
+def test_multipart_upload_and_parallel_download(s3):
+    storage, sent = s3
+    data = os.urandom(12 * MiB + 123)
+
+    async def run():
+        await storage.save_stream("mp", _stream(data))
+        parts = [q for m, q, _ in sent if m == "PUT" and "partNumber=" in q]
+        del sent[:]
+
+        chunks, size, _created_at = await storage.get_stream("mp")
+        whole = b"".join([c async for c in chunks])
+        ranges = [r for m, _, r in sent if m == "GET"]
+        del sent[:]
+
+        chunks, _size, _created_at = await storage.get_stream("mp", MiB, 11 * MiB)
+        span = b"".join([c async for c in chunks])
+        await storage.delete("mp")
+        await storage.aclose()
+        return parts, size, whole, ranges, span
+
+    parts, size, whole, ranges, span = asyncio.run(run())
+    assert len(parts) == 3
+    assert size == len(data) and whole == data
+    # The first part comes from the open GET, the rest as ranged GETs.
+    assert ranges == [f"bytes={5 * MiB}-{10 * MiB - 1}", f"bytes={10 * MiB}-{len(data) - 1}"]
+    assert span == data[MiB : 12 * MiB]
+
+
+def test_failed_multipart_upload_is_aborted(s3):
+    storage, sent = s3
+    data = os.urandom(12 * MiB)
+
+    async def run():
+        with pytest.raises(IOError):
+            await storage.save_stream("broken", _stream(data, fail_after=8 * MiB))
+        try:
+            await storage.get("broken")
+        except NotFound:
+            found = False
+        else:
+            found = True
+        await storage.aclose()
+        return found
+
+    assert not asyncio.run(run())
+    assert any(m == "PUT" and "partNumber=1&" in q for m, q, _ in sent)
+    assert [m for m, q, _ in sent if "uploadId=" in q and "partNumber=" not in q] == ["DELETE"]
@@ -0,0 +1,79 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.domain.entities.blob_metadata import BlobMeta
+from app.domain.services.tiering import AccessTracker, TierMigrator
+from app.infra.db import Base, make_async_engine, make_async_session_factory
+from app.infra.repositories.metadata.repository import AsyncSqlAlchemyMetadataRepository
+from app.infra.settings import Settings
+
+
+def test_old_copies_are_removed_after_a_restart(tmp_path, memory_storage):
+    settings = Settings(auth_bearer_token="t")
+
+    async def run():
+        engine = make_async_engine(f"sqlite:///{tmp_path}/meta.db", settings)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = make_async_session_factory(engine)
+
+        @asynccontextmanager
+        async def scope():
+            async with sessions() as session:
+                yield AsyncSqlAlchemyMetadataRepository(session)
+                await session.commit()
+
+        async def make_due():
+            async with engine.begin() as conn:
+                await conn.execute(text("UPDATE blob_purge SET due_at = '2000-01-01'"))
+
+        hot, cold = memory_storage(), memory_storage()
+
+        def migrator():
+            return TierMigrator(
+                {"fs": hot, "s3": cold},
+                scope,
+                AccessTracker("fs", 0, 60),
+                "fs",
+                "s3",
+                cold_after=3600,
+                delete_grace=60,
+            )
+
+        day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        async with scope() as repo:
+            await repo.create(BlobMeta("a", 4, day_ago, "fs", "c"))
+        await hot.save("a", b"data")
+
+        await migrator().run_once()
+        demoted = set(hot.blobs), set(cold.blobs)
+
+        # The process restarts within the grace period; the next one removes
+        # the old copy once it is due.
+        restarted = migrator()
+        await restarted.run_once()
+        kept = set(hot.blobs)
+        await make_due()
+        await restarted.run_once()
+        purged = set(hot.blobs), set(cold.blobs)
+
+        # Promoted before the removal of the cold copy is due, and demoted
+        # again: the copy it was moved back to is never removed.
+        assert await restarted.move("a", "s3", "fs")
+        assert await restarted.move("a", "fs", "s3")
+        await make_due()
+        await restarted.close()
+        async with scope() as repo:
+            meta = await repo.get("a")
+        await engine.dispose()
+        return demoted, kept, purged, (set(hot.blobs), set(cold.blobs)), meta.backend
+
+    demoted, kept, purged, final, backend = asyncio.run(run())
+    assert demoted == ({"a"}, {"a"})
+    assert kept == {"a"}
+    assert purged == (set(), {"a"})
+    assert final == (set(), {"a"})
+    assert backend == "s3"
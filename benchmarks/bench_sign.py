@@ -0,0 +1,58 @@
+"""Micro-benchmark for SigV4 signing.
+
+    python -m benchmarks.bench_sign [-n ITERATIONS]
+
+Compares header signing with a cold and a cached signing key, and measures
+aws-chunked framing throughput.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.infra.http.s3_sign import _signing_key, sign_v4, sign_v4_streaming
+
+URL = "https://bucket.s3.us-east-1.amazonaws.com/data/ab/cd/abcd__blob?partNumber=1&uploadId=x"
+ARGS = ("PUT", URL, "us-east-1", "AKIDEXAMPLE", "secret")
+
+
+def _per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def _cold() -> None:
+    _signing_key.cache_clear()
+    sign_v4(*ARGS)
+
+
+def _warm() -> None:
+    sign_v4(*ARGS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    parser.add_argument("--mib", type=int, default=256)
+    args = parser.parse_args()
+
+    cold = _per_call(_cold, args.n)
+    warm = _per_call(_warm, args.n)
+    print(f"sign_v4 cold key   {cold:8.2f} us/call")
+    print(f"sign_v4 cached key {warm:8.2f} us/call  ({cold / warm:.2f}x)")
+
+    total = args.mib * 1024 * 1024
+    chunk = b"\0" * args.chunk_size
+    _, signer = sign_v4_streaming(*ARGS, total, args.chunk_size)
+    start = time.perf_counter()
+    for _ in range(total // args.chunk_size):
+        signer.frame(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"aws-chunked framing {args.mib / elapsed:8.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Load benchmark for the blob API across storage backends.
+
+    python -m benchmarks.bench_storage [--backends fs,db,s3,ftp]
+        [--sizes 1KiB,64KiB,1MiB,16MiB] [--concurrency 1,8,32]
+        [--ops put,post,get] [--output results.json] [--baseline FILE]
+
+Every backend runs against a local stand-in: a temp directory for fs, a temp
+SQLite file for db (or ``--database-url``, e.g. a Postgres instance), the
+in-process S3 stub, and a local pyftpdlib server for ftp (skipped when
+pyftpdlib is not installed). Each backend/size cell starts a fresh uvicorn
+server, so the reported peak RSS is the server's own for that cell.
+
+Reports ops/s, MB/s and p50/p95/p99 latency per backend, operation, size and
+concurrency. ``--output`` writes the results as JSON; ``--baseline`` compares
+them against an earlier run (see ``benchmarks.compare``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.compare import compare, print_report
+from benchmarks.stubs import FtpStub, S3Stub
+
+BACKENDS = ("fs", "db", "s3", "ftp")
+# Not benchmarked by default; configured through MIRROR_* / TIER_* variables.
+COMPOSITE_BACKENDS = ("mirror", "tiered")
+OPS = ("put", "post", "get")
+_UNITS = {"kib": 1024, "mib": 1024**2, "gib": 1024**3, "b": 1}
+TOKEN = "bench-token"
+
+
+def parse_size(text: str) -> int:
+    t = text.strip().lower()
+    for unit, mult in _UNITS.items():
+        if t.endswith(unit):
+            return int(float(t[: -len(unit)]) * mult)
+    return int(t)
+
+
+def _rss_mb(maxrss: int) -> float:
+    # Linux reports KiB, macOS bytes.
+    return maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _vm_hwm_mb(pid: int) -> Optional[float]:
+    # On Linux a child's ru_maxrss starts from the parent's peak at fork and
+    # survives exec; VmHWM belongs to the server process alone.
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if len(samples) < 2:
+        v = samples[0] * 1000 if samples else 0.0
+        return {"p50_ms": v, "p95_ms": v, "p99_ms": v}
+    q = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": q[49] * 1000, "p95_ms": q[94] * 1000, "p99_ms": q[98] * 1000}
+
+
+def _payload(size: int, kind: str) -> bytes:
+    if kind == "text":
+        line = b"2024-01-01T00:00:00Z INFO request handled path=/v1/blobs status=200\n"
+        return (line * (size // len(line) + 1))[:size]
+    return os.urandom(size)
+
+
+async def _run_cell(client, op: str, size: int, concurrency: int, count: int, payload: bytes, tag: str):
+    b64 = base64.b64encode(payload)
+    ids = [f"{tag}-{op}-c{concurrency}-{i}" for i in range(count)]
+    if op == "get":
+        # Reads go to blobs written by the put pass of the same level.
+        ids = [f"{tag}-put-c{concurrency}-{i}" for i in range(count)]
+
+    async def one(blob_id: str):
+        if op == "put":
+            r = await client.put(
+                f"/v1/blobs/{blob_id}",
+                content=payload,
+                headers={"content-type": "application/octet-stream"},
+            )
+            return r.status_code == 201
+        if op == "post":
+            body = b'{"id":"' + blob_id.encode() + b'","data":"' + b64 + b'"}'
+            r = await client.post(
+                "/v1/blobs", content=body, headers={"content-type": "application/json"}
+            )
+            return r.status_code == 201
+        r = await client.get(f"/v1/blobs/{blob_id}/content")
+        return r.status_code == 200 and len(r.content) == size
+
+    latencies: List[float] = []
+    errors = 0
+    queue = iter(ids)
+
+    async def worker():
+        nonlocal errors
+        for blob_id in queue:
+            start = time.perf_counter()
+            try:
+                ok = await one(blob_id)
+            except httpx.TransportError:
+                # The server drops the connection when it fails mid-upload.
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "op": op,
+        "size": size,
+        "concurrency": concurrency,
+        "ops": count,
+        "errors": errors,
+        "seconds": elapsed,
+        "ops_per_s": count / elapsed,
+        "mb_per_s": count * size / elapsed / 1e6,
+        **_percentiles(latencies),
+    }
+
+
+@contextmanager
+def _server(backend: str, env: Dict[str, str], database_url: str):
+    """Run the app under uvicorn with ``backend``; yields its base URL and,
+    once stopped, a dict holding the server's peak RSS."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp, socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--log-level", "warning", "--no-access-log",
+            ],
+            env={
+                **os.environ,
+                **env,
+                "STORAGE": backend,
+                "AUTH_BEARER_TOKEN": TOKEN,
+                "FS_BASE_PATH": os.path.join(tmp, "storage"),
+                "DATABASE_URL": database_url or f"sqlite:///{tmp}/bench.db",
+            },
+            stdout=subprocess.DEVNULL,
+        )
+        stats: Dict[str, float] = {}
+        try:
+            url = f"http://127.0.0.1:{port}"
+            _wait_ready(proc, url)
+            yield url, stats
+        finally:
+            hwm = _vm_hwm_mb(proc.pid)
+            proc.terminate()
+            _, _, usage = os.wait4(proc.pid, 0)
+            proc.returncode = 0
+            stats["peak_rss_mb"] = hwm if hwm is not None else _rss_mb(usage.ru_maxrss)
+
+
+def _wait_ready(proc: subprocess.Popen, url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with status {proc.returncode}")
+        try:
+            httpx.get(f"{url}/docs", timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise SystemExit("server did not start")
+
+
+async def _run_levels(url: str, size: int, args) -> List[dict]:
+    payload = _payload(size, args.payload)
+    count = _ops_count(size, args)
+    ops = list(args.ops)
+    if "get" in ops and "put" not in ops:
+        ops.insert(0, "put")
+    # The s3 and ftp stand-ins outlive a cell, so ids carry the size and
+    # every level deletes what it wrote.
+    tag = f"s{size}"
+    results = []
+    async with httpx.AsyncClient(
+        base_url=url,
+        headers={"authorization": f"Bearer {TOKEN}"},
+        timeout=None,
+        limits=httpx.Limits(max_connections=max(args.concurrency)),
+    ) as client:
+        await _run_cell(client, "put", size, 1, args.warmup, payload, f"{tag}-warmup")
+        for concurrency in args.concurrency:
+            n = max(count, concurrency)
+            for op in ops:
+                r = await _run_cell(client, op, size, concurrency, n, payload, tag)
+                if op in args.ops:
+                    results.append(r)
+            for op in {"put", "post"} & set(ops):
+                for i in range(n):
+                    await client.delete(f"/v1/blobs/{tag}-{op}-c{concurrency}-{i}")
+        for i in range(args.warmup):
+            await client.delete(f"/v1/blobs/{tag}-warmup-put-c1-{i}")
+    return results
+
+
+def _members(backend: str) -> List[str]:
+    if backend == "mirror":
+        return [b.strip() for b in os.environ.get("MIRROR_BACKENDS", "fs,s3").split(",")]
+    if backend == "tiered":
+        return ["fs", os.environ.get("TIER_COLD", "s3")]
+    return [backend]
+
+
+def _ops_count(size: int, args) -> int:
+    if args.count:
+        return args.count
+    return max(args.min_ops, min(args.max_ops, args.bytes_per_cell // size))
+
+
+def _run_backend_cell(backend: str, size: int, env: Dict[str, str], args) -> List[dict]:
+    with _server(backend, env, args.database_url) as (url, stats):
+        results = asyncio.run(_run_levels(url, size, args))
+    for r in results:
+        r["backend"] = backend
+        r.update(stats)
+    return results
+
+
+def _print_results(results: List[dict]) -> None:
+    header = f"{'backend':<7} {'op':<5} {'size':>9} {'conc':>4} {'ops/s':>9} {'MB/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'err':>4}"
+    print(header)
+    for r in results:
+        print(
+            f"{r['backend']:<7} {r['op']:<5} {r['size']:>9} {r['concurrency']:>4} "
+            f"{r['ops_per_s']:>9.1f} {r['mb_per_s']:>9.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['peak_rss_mb']:>7.0f} {r['errors']:>4}"
+        )
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--sizes", default="1KiB,64KiB,1MiB,16MiB")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--ops", default=",".join(OPS))
+    parser.add_argument("--count", type=int, default=0, help="operations per cell (default: scaled by size)")
+    parser.add_argument("--bytes-per-cell", type=parse_size, default=parse_size("64MiB"))
+    parser.add_argument("--min-ops", type=int, default=16)
+    parser.add_argument("--max-ops", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--payload", choices=("random", "text"), default="random")
+    parser.add_argument("--database-url", default="", help="db/metadata URL (default: a temp SQLite file)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    backends = [b for b in args.backends.split(",") if b]
+    args.ops = [o for o in args.ops.split(",") if o]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    unknown = set(backends) - set(BACKENDS + COMPOSITE_BACKENDS) or set(args.ops) - set(OPS)
+    if unknown:
+        parser.error(f"unknown backend or op: {', '.join(sorted(unknown))}")
+
+    results: List[dict] = []
+    with ExitStack() as stack:
+        envs: Dict[str, Dict[str, str]] = {"fs": {}, "db": {}}
+        members = {m for backend in backends for m in _members(backend)}
+        if "s3" in members:
+            envs["s3"] = stack.enter_context(S3Stub()).env()
+        if "ftp" in members:
+            if FtpStub.available():
+                envs["ftp"] = stack.enter_context(FtpStub()).env()
+            else:
+                print("skipping ftp: pyftpdlib is not installed", file=sys.stderr)
+        for backend in COMPOSITE_BACKENDS:
+            if all(m in envs for m in _members(backend)):
+                envs[backend] = {k: v for m in _members(backend) for k, v in envs[m].items()}
+        for backend in backends:
+            if backend not in envs:
+                continue
+            for size in sizes:
+                results.extend(_run_backend_cell(backend, size, envs[backend], args))
+
+    _print_results(results)
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "payload": args.payload,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.tolerance)
+        print()
+        print_report(rows)
+        if any(r["regressed"] for r in rows):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare two ``bench_storage --output`` files.
+
+    python -m benchmarks.compare BASELINE CURRENT [--tolerance 0.2]
+
+Cells are matched on backend, operation, size and concurrency. A cell
+regresses when its throughput drops, or its p95 latency or peak RSS grows, by
+more than the tolerance; the exit status is 1 if any cell does.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Dict, List, Tuple
+
+# Metric -> True when higher is better.
+METRICS = {"ops_per_s": True, "p95_ms": False, "peak_rss_mb": False}
+
+
+def _key(r: dict) -> Tuple:
+    return (r["backend"], r["op"], r["size"], r["concurrency"])
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[dict]:
+    base: Dict[Tuple, dict] = {_key(r): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        old = base.get(_key(r))
+        if old is None:
+            continue
+        changes, regressed = {}, []
+        for metric, higher_is_better in METRICS.items():
+            if not old.get(metric):
+                continue
+            change = r[metric] / old[metric] - 1
+            changes[metric] = change
+            if (-change if higher_is_better else change) > tolerance:
+                regressed.append(metric)
+        rows.append({"key": _key(r), "changes": changes, "regressed": regressed})
+    return rows
+
+
+def print_report(rows: List[dict]) -> None:
+    print(f"{'backend':<7} {'op':<5} {'size':>9} {'conc':>4} " + " ".join(f"{m:>12}" for m in METRICS))
+    for row in rows:
+        backend, op, size, concurrency = row["key"]
+        cells = " ".join(
+            f"{row['changes'][m]:>+11.1%}{'!' if m in row['regressed'] else ' '}"
+            if m in row["changes"]
+            else f"{'-':>12}"
+            for m in METRICS
+        )
+        print(f"{backend:<7} {op:<5} {size:>9} {concurrency:>4} {cells}")
+    regressed = sum(1 for r in rows if r["regressed"])
+    print(f"{len(rows)} cells compared, {regressed} regressed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.tolerance)
+    print_report(rows)
+    if any(r["regressed"] for r in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Local stand-ins for the remote backends, for benchmarks.
+
+``S3Stub`` is a small path-style S3 API (PUT incl. aws-chunked bodies and
+``If-None-Match``, ranged GET, HEAD, DELETE, multipart upload) that keeps
+objects in memory. Signatures are not checked. ``FtpStub`` serves a temp
+directory with pyftpdlib, which is optional.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import tempfile
+import threading
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class _S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "_S3Server"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("content-length") or 0))
+        if self.headers.get("x-amz-content-sha256", "").startswith("STREAMING-"):
+            body = _dechunk(body)
+        return body
+
+    def _send(self, code: int, body: bytes = b"", headers: Optional[Dict] = None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _target(self):
+        u = urlsplit(self.path)
+        return u.path, parse_qs(u.query, keep_blank_values=True)
+
+    def _exists_conflict(self, path: str) -> bool:
+        return self.headers.get("if-none-match") == "*" and path in self.server.objects
+
+    def do_PUT(self):
+        path, q = self._target()
+        body = self._read_body()
+        with self.server.lock:
+            if "partNumber" in q:
+                parts = self.server.uploads.get(q["uploadId"][0])
+                if parts is None:
+                    return self._send(404, b"<Error><Code>NoSuchUpload</Code></Error>")
+                parts[int(q["partNumber"][0])] = body
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                return self._send(200, headers={"etag": etag})
+            if self._exists_conflict(path):
+                return self._send(412, b"<Error><Code>PreconditionFailed</Code></Error>")
+            self.server.objects[path] = body
+        self._send(200)
+
+    def do_POST(self):
+        path, q = self._target()
+        body = self._read_body()
+        with self.server.lock:
+            if "uploads" in q:
+                upload_id = uuid.uuid4().hex
+                self.server.uploads[upload_id] = {}
+                xml = f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                return self._send(200, xml.encode())
+            parts = self.server.uploads.pop(q["uploadId"][0], None)
+            if parts is None:
+                return self._send(404, b"<Error><Code>NoSuchUpload</Code></Error>")
+            if self._exists_conflict(path):
+                return self._send(412, b"<Error><Code>PreconditionFailed</Code></Error>")
+            numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+            self.server.objects[path] = b"".join(parts[n] for n in numbers)
+        self._send(200, b"<CompleteMultipartUploadResult/>")
+
+    def do_GET(self):
+        path, _ = self._target()
+        data = self.server.objects.get(path)
+        if data is None:
+            return self._send(404, b"<Error><Code>NoSuchKey</Code></Error>")
+        headers = {"last-modified": formatdate(usegmt=True)}
+        m = _RANGE.fullmatch(self.headers.get("range", ""))
+        if m:
+            first = int(m.group(1) or 0)
+            last = min(int(m.group(2)) if m.group(2) else len(data) - 1, len(data) - 1)
+            headers["content-range"] = f"bytes {first}-{last}/{len(data)}"
+            return self._send(206, data[first : last + 1], headers)
+        self._send(200, data, headers)
+
+    def do_HEAD(self):
+        path, _ = self._target()
+        data = self.server.objects.get(path)
+        if data is None:
+            return self._send(404)
+        self.send_response(200)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+
+    def do_DELETE(self):
+        path, q = self._target()
+        with self.server.lock:
+            if "uploadId" in q:
+                self.server.uploads.pop(q["uploadId"][0], None)
+            else:
+                self.server.objects.pop(path, None)
+        self._send(204)
+
+
+def _dechunk(body: bytes) -> bytes:
+    out, pos = bytearray(), 0
+    while True:
+        eol = body.index(b"\r\n", pos)
+        size = int(body[pos:eol].split(b";", 1)[0], 16)
+        if size == 0:
+            return bytes(out)
+        out += body[eol + 2 : eol + 2 + size]
+        pos = eol + 2 + size + 2
+
+
+class _S3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr):
+        super().__init__(addr, _S3Handler)
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.lock = threading.Lock()
+
+
+class S3Stub:
+    bucket = "bench"
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self._server = _S3Server((host, 0))
+        self.endpoint = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "S3_ENDPOINT": self.endpoint,
+            "S3_BUCKET": self.bucket,
+            "S3_REGION": "us-east-1",
+            "S3_ACCESS_KEY": "bench",
+            "S3_SECRET_KEY": "bench",
+            "S3_FORCE_PATH_STYLE": "true",
+        }
+
+    def __enter__(self) -> "S3Stub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FtpStub:
+    user, password = "bench", "bench"
+
+    def __init__(self, host: str = "127.0.0.1"):
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.servers import ThreadedFTPServer
+
+        # serve_forever() installs its own stderr logging unless the logger
+        # already has a handler.
+        log = logging.getLogger("pyftpdlib")
+        log.addHandler(logging.NullHandler())
+        log.setLevel(logging.WARNING)
+        self._dir = tempfile.TemporaryDirectory(prefix="bench-ftp-")
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(self.user, self.password, self._dir.name, perm="elradfmwMT")
+        handler = type("Handler", (FTPHandler,), {"authorizer": authorizer})
+        self._server = ThreadedFTPServer((host, 0), handler)
+        self.host, self.port = self._server.address[:2]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _serve(self) -> None:
+        # The ioloop has no stop call; it is polled here so that it can be
+        # closed from the thread that runs it.
+        while not self._stop.is_set():
+            self._server.serve_forever(timeout=0.1, blocking=False, handle_exit=False)
+        self._server.close_all()
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import pyftpdlib  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "FTP_HOST": self.host,
+            "FTP_PORT": str(self.port),
+            "FTP_USER": self.user,
+            "FTP_PASSWORD": self.password,
+            "FTP_TLS": "false",
+            "FTP_BASE_DIR": "/",
+        }
+
+    def __enter__(self) -> "FtpStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._dir.cleanup()